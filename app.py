@@ -4,16 +4,46 @@
 # Ejecutar con:  streamlit run app.py
 # ─────────────────────────────────────────────────────────────────────────────
 
+import threading
+
 import streamlit as st
 
-from src.asistente import obtener_planes
-from src.ui.styles import CUSTOM_CSS
+from src.almacen import obtener_almacen
+from src.asistente import (
+    backend_inferencia,
+    buscar_en_planes,
+    calentamiento_cache,
+    indice_planes,
+    obtener_planes_stream,
+    politica_reintentos,
+    snapshot_planes,
+)
+from src.ciudades import canonizar, obtener_indice
+from src.reintentos import CircuitoAbiertoError
+from src.config import (
+    PRECALENTAR_CONEXION,
+    METRICAS_PUERTO,
+    CALENTAR_CACHE,
+    ALMACEN_MAX_BYTES,
+    COLA_TRABAJADORES,
+    COLA_MAX_POR_SESION,
+    COLA_INTERVALO_SONDEO,
+    COMPARACION_MAX_CIUDADES,
+    BUSQUEDA_MAX_RESULTADOS,
+)
+from src.cola import CANCELADO, COMPLETADO, ERROR, obtener_cola
+from src.metricas import servir_prometheus
+from src.ui.styles import CSS_MINIFICADO
 from src.ui.components import (
     render_header,
     render_sidebar,
     render_resultado,
     render_empty_state,
     render_error,
+    render_sugerencias,
+    render_trabajo,
+    render_columna,
+    render_busqueda_planes,
 )
 
 # ── Configuración de la página ───────────────────────────────────────────────
@@ -25,85 +55,397 @@ st.set_page_config(
 )
 
 # ── Inyectar CSS personalizado ───────────────────────────────────────────────
-st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
+# Solo en los reruns completos: los de un fragmento no vuelven a enviarlo.
+st.markdown(CSS_MINIFICADO, unsafe_allow_html=True)
+
+# Las interacciones de la barra lateral y del panel de búsqueda solo
+# vuelven a ejecutar su fragmento (Streamlit >= 1.37); en versiones
+# anteriores se ejecuta todo el script, como antes, y los paneles que se
+# sondean (cola y comparación) muestran un botón para actualizarlos.
+FRAGMENTOS = hasattr(st, "fragment")
+if FRAGMENTOS:
+    fragmento = st.fragment
+else:
+    def fragmento(funcion=None, **_):
+        return funcion if funcion else (lambda f: f)
+
+# ── Cliente de inferencia compartido ─────────────────────────────────────────
+@st.cache_resource(show_spinner=False)
+def iniciar_cliente():
+    """
+    Elige el backend de inferencia una sola vez por proceso (compartido por
+    todas las sesiones) y, si está activado, precalienta la conexión.
+    """
+    backend = backend_inferencia()
+    if PRECALENTAR_CONEXION:
+        backend.precalentar(en_segundo_plano=True)
+    return backend
+
+
+iniciar_cliente()
+
+
+@st.cache_resource(show_spinner=False)
+def iniciar_metricas():
+    """
+    Expone /metrics (formato Prometheus) una sola vez por proceso, si
+    METRICAS_PUERTO está configurado.
+    """
+    if METRICAS_PUERTO:
+        return servir_prometheus(METRICAS_PUERTO)
+    return None
+
+
+iniciar_metricas()
+
+
+@st.cache_resource(show_spinner=False)
+def iniciar_calentamiento():
+    """
+    Precalienta la caché con las ciudades populares una sola vez por
+    proceso, en segundo plano y cediendo el paso a las búsquedas reales.
+    """
+    if not CALENTAR_CACHE:
+        return None
+    try:
+        backend_inferencia().comprobar()
+    except EnvironmentError:
+        return None  # Sin token no hay nada que generar
+    return calentamiento_cache().iniciar()
+
+
+iniciar_calentamiento()
+
+
+@st.cache_resource(show_spinner=False)
+def iniciar_snapshot():
+    """
+    Abre (mmap) el snapshot de planes precalculados una sola vez por
+    proceso. Después se comprueba en las búsquedas si se ha exportado uno
+    nuevo y se cambia sin reiniciar la app.
+    """
+    snapshot = snapshot_planes()
+    snapshot.comprobar()
+    return snapshot
+
+
+iniciar_snapshot()
+
+
+@st.cache_resource(show_spinner=False)
+def iniciar_indice():
+    """
+    Construye en segundo plano, una sola vez por proceso, el índice de
+    búsqueda por palabras con la caché y el snapshot; después se actualiza
+    solo con cada respuesta nueva.
+    """
+    hilo = threading.Thread(target=indice_planes, name="indice-planes", daemon=True)
+    hilo.start()
+    return hilo
+
+
+iniciar_indice()
 
 # ── Inicializar estado de sesión ─────────────────────────────────────────────
+# Resultados compartidos por todas las sesiones; cada sesión guarda solo
+# sus claves: historial es {ciudad: clave} en orden de búsqueda.
+almacen = obtener_almacen(ALMACEN_MAX_BYTES)
+
 if "historial" not in st.session_state:
-    st.session_state.historial = []
+    st.session_state.historial = {}
 
-if "resultado_actual" not in st.session_state:
-    st.session_state.resultado_actual = None
+if "clave_actual" not in st.session_state:
+    st.session_state.clave_actual = None
 
 if "ciudad_actual" not in st.session_state:
     st.session_state.ciudad_actual = ""
 
+# Búsquedas de la sesión enviadas a la cola y aún no mostradas
+if "trabajos" not in st.session_state:
+    st.session_state.trabajos = []
 
-# ── Función principal de búsqueda ────────────────────────────────────────────
-def buscar_planes(ciudad: str):
-    """Ejecuta la búsqueda de planes y actualiza el estado."""
-    if not ciudad.strip():
-        render_error("Por favor, escribe el nombre de una ciudad.", tipo="warning")
-        return
+# Modo comparación: [{"ciudad", "clave", "trabajo"}], una entrada por columna
+if "comparacion" not in st.session_state:
+    st.session_state.comparacion = []
 
-    ciudad = ciudad.strip().title()
+# Cola compartida: las búsquedas se ejecutan en segundo plano y no
+# bloquean el script; si la sesión se cierra, terminan igualmente y su
+# resultado queda en la caché.
+cola = obtener_cola(obtener_planes_stream, COLA_TRABAJADORES)
 
-    # Comprobar si ya está en el historial (evitar duplicados)
-    resultado_cacheado = next(
-        (e for e in st.session_state.historial if e["ciudad"] == ciudad),
-        None,
-    )
 
-    if resultado_cacheado:
-        st.session_state.resultado_actual = resultado_cacheado["planes"]
-        st.session_state.ciudad_actual = ciudad
-        return
+# ── Búsquedas ────────────────────────────────────────────────────────────────
+def buscar_planes(ciudad: str) -> bool:
+    """
+    Muestra los planes de una ciudad ya buscada en la sesión o envía su
+    búsqueda a la cola en segundo plano.
 
-    # Buscar planes nuevos
-    try:
-        with st.spinner(f"Buscando planes para **{ciudad}**..."):
-            planes = obtener_planes(ciudad)
-
-        # Guardar en historial
-        st.session_state.historial.append({
-            "ciudad": ciudad,
-            "planes": planes,
-        })
-        st.session_state.resultado_actual = planes
+    Returns:
+        True si se ha encolado una búsqueda nueva.
+    """
+    # "malaga", "MALAGA " y "Málaga, España" → "Málaga" (una sola entrada);
+    # None si no queda ninguna ciudad (", España")
+    ciudad = canonizar(ciudad)
+    if ciudad is None:
+        render_error("Por favor, escribe el nombre de una ciudad.", tipo="warning")
+        return False
+
+    # Comprobar si ya está en el historial (evitar duplicados); si el
+    # almacén ya lo desalojó, se vuelve a pedir (vendrá de la caché)
+    clave = st.session_state.historial.get(ciudad)
+    if clave is not None and clave in almacen:
+        st.session_state.clave_actual = clave
         st.session_state.ciudad_actual = ciudad
-        st.toast("¡Planes encontrados!", icon="✅")
+        return False
 
-    except EnvironmentError:
+    activos = [t for t in st.session_state.trabajos if t.activo]
+    if any(t.ciudad == ciudad for t in activos):
+        return False
+    if len(activos) >= COLA_MAX_POR_SESION:
         render_error(
+            f"Ya hay {len(activos)} búsquedas en curso. Espera a que termine "
+            "alguna o cancélala.",
+            tipo="warning",
+        )
+        return False
+
+    st.session_state.trabajos.append(cola.enviar(ciudad))
+    return True
+
+
+def mensaje_error(error: Exception) -> tuple[str, str]:
+    """Mensaje para el usuario y tipo ('error' o 'warning') de un fallo."""
+    if isinstance(error, EnvironmentError) and not isinstance(error, ConnectionError):
+        return (
             "**Token no configurado.** Añade tu `HF_TOKEN` en el archivo "
             "`.env` o en los secrets de Streamlit.",
-            tipo="error",
+            "error",
         )
-
-    except ConnectionError:
-        render_error(
+    if isinstance(error, CircuitoAbiertoError):
+        return str(error), "warning"
+    if isinstance(error, ConnectionError):
+        backend = backend_inferencia()
+        if backend.nombre != "hf":
+            return (
+                f"No se pudo conectar con el {backend.descripcion}. "
+                "Comprueba que está arrancado y sirve el modelo.",
+                "error",
+            )
+        return (
             "No se pudo conectar con la API de Hugging Face. "
             "Comprueba tu conexión a internet y que tu token sea válido.",
-            tipo="error",
+            "error",
         )
+    if isinstance(error, ValueError):
+        return "El modelo devolvió una respuesta vacía. Inténtalo de nuevo.", "warning"
+    return f"Error inesperado: {type(error).__name__}: {error}", "error"
 
-    except ValueError:
-        render_error(
-            "El modelo devolvió una respuesta vacía. Inténtalo de nuevo.",
-            tipo="warning",
-        )
 
-    except Exception as e:
-        render_error(f"Error inesperado: {type(e).__name__}: {e}")
+def recoger_terminados() -> bool:
+    """
+    Pasa los trabajos completados al almacén y al historial (el último se
+    muestra) y retira los cancelados; los fallidos se quedan para mostrar
+    el error hasta que se quiten.
+
+    Returns:
+        True si ha cambiado el historial o el resultado mostrado.
+    """
+    cambios = False
+    pendientes = []
+    for trabajo in st.session_state.trabajos:
+        if trabajo.estado == COMPLETADO:
+            clave = almacen.guardar(trabajo.resultado)
+            st.session_state.historial.pop(trabajo.ciudad, None)
+            st.session_state.historial[trabajo.ciudad] = clave
+            st.session_state.clave_actual = clave
+            st.session_state.ciudad_actual = trabajo.ciudad
+            obtener_indice().anadir(trabajo.ciudad)  # Para sugerirla en próximas búsquedas
+            st.session_state.aviso = f"¡Planes de {trabajo.ciudad} listos!"
+            cambios = True
+        elif trabajo.estado != CANCELADO:
+            pendientes.append(trabajo)
+    st.session_state.trabajos = pendientes
+    return cambios
+
+
+# ── Comparación ──────────────────────────────────────────────────────────────
+def comparar(ciudades: list[str]):
+    """
+    Empieza a comparar varias ciudades: las que la sesión ya tiene se
+    muestran del almacén y el resto se envía a la cola a la vez, así que la
+    espera es la de la más lenta (la caché y el limitador de tasa siguen
+    aplicándose a cada una). Cancela la comparación anterior.
+    """
+    for entrada in st.session_state.comparacion:
+        if entrada["trabajo"] is not None:
+            entrada["trabajo"].cancelar()
+
+    entradas = []
+    canonicas = [canonizar(c) for c in ciudades]
+    for ciudad in list(dict.fromkeys(c for c in canonicas if c))[:COMPARACION_MAX_CIUDADES]:
+        clave = st.session_state.historial.get(ciudad)
+        if clave is not None and clave in almacen:
+            entradas.append({"ciudad": ciudad, "clave": clave, "trabajo": None})
+        else:
+            entradas.append({"ciudad": ciudad, "clave": None, "trabajo": cola.enviar(ciudad)})
+    st.session_state.comparacion = entradas
+
+
+def recoger_comparacion() -> bool:
+    """
+    Pasa al almacén y al historial las ciudades de la comparación que ya
+    han terminado.
+
+    Returns:
+        True si alguna sigue en curso.
+    """
+    en_curso = False
+    for entrada in st.session_state.comparacion:
+        trabajo = entrada["trabajo"]
+        if trabajo is None:
+            continue
+        if trabajo.estado == COMPLETADO:
+            entrada["clave"] = almacen.guardar(trabajo.resultado)
+            entrada["trabajo"] = None
+            st.session_state.historial.pop(entrada["ciudad"], None)
+            st.session_state.historial[entrada["ciudad"]] = entrada["clave"]
+            obtener_indice().anadir(entrada["ciudad"])
+        elif trabajo.activo:
+            en_curso = True
+    return en_curso
+
+
+def resultados_comparacion():
+    """Una columna por ciudad, cada una en cuanto termina."""
+    entradas = st.session_state.comparacion
+    for columna, entrada in zip(st.columns(len(entradas)), entradas):
+        with columna:
+            trabajo, clave = entrada["trabajo"], entrada["clave"]
+            if trabajo is not None and trabajo.estado == ERROR:
+                render_columna(entrada["ciudad"], error=mensaje_error(trabajo.error))
+            elif trabajo is not None:
+                render_columna(entrada["ciudad"], trabajo=trabajo)
+            else:
+                resultado = almacen.obtener(clave)
+                if resultado is None:
+                    # Desalojado del almacén: se vuelve a pedir (vendrá de la caché)
+                    entrada["clave"], entrada["trabajo"] = None, cola.enviar(entrada["ciudad"])
+                    st.rerun()  # Para sondear su progreso
+                else:
+                    render_columna(entrada["ciudad"], resultado, clave)
+
+
+# ── Autocompletado ───────────────────────────────────────────────────────────
+def sugerencias_para(texto: str) -> list[str]:
+    """
+    Ciudades conocidas parecidas a lo escrito, salvo que ya lo sea una.
+
+    st.text_input no avisa en cada tecla, así que las sugerencias se
+    actualizan al pulsar Enter o al salir de la caja.
+    """
+    canonica = canonizar(texto)
+    if canonica is None or obtener_indice().buscar(canonica):
+        return []
+    return obtener_indice().sugerir(texto)
 
 
 # ── Layout principal ─────────────────────────────────────────────────────────
-def main():
-    render_header()
+@fragmento
+def barra_lateral():
+    """Sidebar; al elegir otra ciudad del historial, se pide al panel."""
+    ciudad = render_sidebar(
+        politica_reintentos().estado(), almacen, backend_inferencia().descripcion
+    )
+    if ciudad and ciudad != st.session_state.ciudad_actual:
+        st.session_state.ciudad_pedida = ciudad
+        if FRAGMENTOS:
+            st.rerun()  # El panel está en otro fragmento
+
+
+@fragmento(run_every=COLA_INTERVALO_SONDEO)
+def panel_trabajos():
+    """
+    Progreso de las búsquedas en cola. Se vuelve a ejecutar solo cada
+    COLA_INTERVALO_SONDEO segundos mientras haya alguna; al terminar una,
+    se hace un rerun completo para mostrarla y añadirla al historial.
+    """
+    if recoger_terminados():
+        st.rerun()
+    if not st.session_state.trabajos:
+        if FRAGMENTOS:
+            st.rerun()  # Ya no hay nada que sondear
+        return
+
+    for trabajo in st.session_state.trabajos:
+        if trabajo.estado == ERROR:
+            mensaje, tipo = mensaje_error(trabajo.error)
+            quitar = render_trabajo(trabajo, error=(mensaje, tipo))
+        else:
+            quitar = render_trabajo(trabajo)
+        if quitar:
+            trabajo.cancelar()
+            st.session_state.trabajos.remove(trabajo)
+            st.rerun()
+
+    if not FRAGMENTOS:
+        st.button("🔄 Actualizar", key="actualizar_trabajos")
+
+
+@fragmento(run_every=COLA_INTERVALO_SONDEO)
+def comparacion_en_curso():
+    """Columnas de la comparación mientras alguna ciudad sigue en curso."""
+    if not recoger_comparacion():
+        st.rerun()  # Todas listas: rerun completo (historial y sin sondeo)
+    resultados_comparacion()
+    if not FRAGMENTOS:
+        st.button("🔄 Actualizar", key="actualizar_comparacion")
 
-    # Sidebar (puede devolver una ciudad del historial)
-    ciudad_del_historial = render_sidebar()
 
-    # Barra de búsqueda
+@fragmento
+def panel_comparacion():
+    """Caja con las ciudades a comparar, una por línea."""
+    texto = st.text_area(
+        "Ciudades",
+        placeholder=f"Una ciudad por línea (hasta {COMPARACION_MAX_CIUDADES})... Ej:\nGranada\nSevilla",
+        label_visibility="collapsed",
+        height=110,
+    )
+    if st.button("Comparar", type="primary"):
+        ciudades = [linea for linea in texto.splitlines() if linea.strip()]
+        if len({canonizar(c) for c in ciudades} - {None}) < 2:
+            render_error("Escribe al menos dos ciudades distintas, una por línea.", tipo="warning")
+            return
+        if len(ciudades) > COMPARACION_MAX_CIUDADES:
+            st.session_state.aviso = f"Se comparan las {COMPARACION_MAX_CIUDADES} primeras ciudades."
+        comparar(ciudades)
+        st.rerun()
+
+
+@fragmento
+def panel_planes():
+    """
+    Búsqueda por palabras en los planes ya generados de todas las ciudades,
+    sin llamar al modelo. Al elegir una ciudad se muestra en el panel.
+    """
+    consulta = st.text_input(
+        "Palabras",
+        placeholder="Busca en todos los planes... Ej: museos gratis, parques con niños",
+        label_visibility="collapsed",
+        key="consulta_planes",
+    )
+    if not consulta.strip():
+        return
+
+    ciudad = render_busqueda_planes(consulta, buscar_en_planes(consulta, BUSQUEDA_MAX_RESULTADOS))
+    if ciudad:
+        st.session_state.ciudad_pedida = ciudad
+        if FRAGMENTOS:
+            st.rerun()  # El panel de búsqueda está en otro fragmento
+
+
+@fragmento
+def panel_busqueda():
+    """Barra de búsqueda, sugerencias y resultado (o estado vacío)."""
     col_input, col_btn = st.columns([5, 1])
 
     with col_input:
@@ -120,23 +462,63 @@ def main():
             use_container_width=True,
         )
 
+    ciudad_sugerida = render_sugerencias(sugerencias_para(ciudad_input))
+    ciudad_pedida = st.session_state.pop("ciudad_pedida", None)
+
     # Manejar acciones
+    encolada = False
     if boton_buscar and ciudad_input:
-        buscar_planes(ciudad_input)
-    elif ciudad_del_historial:
-        buscar_planes(ciudad_del_historial)
+        encolada = buscar_planes(ciudad_input)
+    elif ciudad_sugerida:
+        encolada = buscar_planes(ciudad_sugerida)
+    elif ciudad_pedida:
+        encolada = buscar_planes(ciudad_pedida)
+
+    if encolada:
+        st.rerun()  # Para que aparezca el panel de búsquedas en curso
 
     st.markdown("")  # spacer
 
     # Mostrar resultado o estado vacío
-    if st.session_state.resultado_actual and st.session_state.ciudad_actual:
-        render_resultado(
-            st.session_state.ciudad_actual,
-            st.session_state.resultado_actual,
-        )
-    else:
+    clave = st.session_state.clave_actual
+    resultado_actual = almacen.obtener(clave) if clave else None
+
+    if resultado_actual is not None:
+        render_resultado(st.session_state.ciudad_actual, resultado_actual, clave)
+    elif clave:
+        # El resultado se desalojó del almacén: se vuelve a pedir (una vez)
+        st.session_state.clave_actual = None
+        if buscar_planes(st.session_state.ciudad_actual):
+            st.rerun()
+    elif not st.session_state.trabajos:
         render_empty_state()
 
 
+def main():
+    render_header()
+
+    aviso = st.session_state.pop("aviso", None)
+    if aviso:
+        st.toast(aviso, icon="✅")
+
+    with st.sidebar:
+        barra_lateral()
+
+    if st.session_state.trabajos:
+        panel_trabajos()
+
+    if st.toggle("⚖️ Comparar ciudades", key="modo_comparar"):
+        panel_comparacion()
+        st.markdown("")  # spacer
+        if recoger_comparacion():
+            comparacion_en_curso()
+        elif st.session_state.comparacion:
+            resultados_comparacion()
+    else:
+        with st.expander("🔎 Buscar en los planes de todas las ciudades"):
+            panel_planes()
+        panel_busqueda()
+
+
 if __name__ == "__main__":
     main()
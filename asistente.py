@@ -1,13 +1,42 @@
 # asistente.py
 # ─────────────────────────────────────────────────────────────────────────────
-# Módulo principal del asistente: construye el prompt y llama a la API de
-# Hugging Face usando InferenceClient (sin descargar el modelo en tu PC).
+# Módulo principal del asistente: llama a la API de Hugging Face usando
+# InferenceClient (sin descargar el modelo en tu PC), o a un servidor
+# compatible con OpenAI si INFERENCIA_BACKEND=openai. El prompt es el mismo
+# que usa la app (src/planes.py), así que las dos comparten la caché.
 # ─────────────────────────────────────────────────────────────────────────────
 
-import time
-from huggingface_hub import InferenceClient
-from huggingface_hub.errors import HfHubHTTPError
-from config import obtener_token
+from config import (
+    obtener_token,
+    CACHE_RUTA,
+    CACHE_TTL,
+    CACHE_MAX_ENTRADAS,
+    URL_BASE_INFERENCIA,
+    INFERENCIA_BACKEND,
+    INFERENCIA_URL,
+    INFERENCIA_API_KEY,
+    INFERENCIA_MODELO,
+    INFERENCIA_TIMEOUT,
+)
+from src.backends import obtener_backend
+from src.cache import clave_cache, obtener_cache
+from src.ciudades import exigir_ciudad
+from src.limitador import obtener_limitador
+from src.metricas import registrar_uso, tramo
+from src.planes import (
+    Plan,
+    construir_prompt,
+    planes_a_json,
+    planes_desde_json,
+    validar_planes,
+)
+from src.presupuesto import PARADAS, CorteDecimoPlan, obtener_presupuesto
+from src.reintentos import (
+    CircuitoAbiertoError,
+    ReintentosAgotadosError,
+    es_error_http,
+    obtener_politica,
+)
 
 # ── Modelo a utilizar ────────────────────────────────────────────────────────
 # Mistral-7B-Instruct sigue instrucciones en español con muy buenos resultados.
@@ -15,118 +44,443 @@ from config import obtener_token
 MODELO = "meta-llama/Llama-3.2-3B-Instruct"
 
 # ── Parámetros de generación ─────────────────────────────────────────────────
-MAX_TOKENS = 1024       # Suficiente para 10 planes detallados
+MAX_TOKENS = 1024       # Suficiente para 10 planes detallados (tope del presupuesto)
+PRESUPUESTO_ADAPTATIVO = True  # Ajustar max_tokens a lo que ocupan 10 planes (src/presupuesto.py)
 TEMPERATURA = 0.7       # Equilibrio entre creatividad y coherencia
 REINTENTOS = 3          # Número de intentos ante fallos de red
-ESPERA_ENTRE_REINTENTOS = 5  # Segundos entre reintento y reintento
+FORMATO_SALIDA = "json"  # Formato de obtener_planes_estructurados ("json" o "texto")
 
+# ── Política de reintentos (ver src/reintentos.py) ───────────────────────────
+ESPERA_BASE_REINTENTO = 1.0     # Segundos; se duplica en cada intento (+ jitter)
+ESPERA_MAXIMA_REINTENTO = 20.0  # Tope de espera; un Retry-After mayor no se reintenta
+UMBRAL_CIRCUITO = 5             # Fallos seguidos que pausan las llamadas a la API
+ENFRIAMIENTO_CIRCUITO = 30.0    # Segundos de pausa tras abrirse el cortocircuito
 
-def construir_prompt(ciudad: str) -> str:
+# ── Limitador de tasa (ver src/limitador.py) ─────────────────────────────────
+LIMITE_PETICIONES_SEGUNDO = 1.0  # Media de peticiones por segundo a la API
+LIMITE_RAFAGA = 4                # Peticiones seguidas permitidas sin esperar
+
+
+def _clave_cache(ciudad: str, formato: str = "texto") -> str:
     """
-    Construye el mensaje de sistema y el mensaje de usuario que se enviarán
-    al modelo de lenguaje.
+    Construye la clave de caché de una ciudad.
+
+    El prompt se hashea como plantilla (con un marcador en lugar de la
+    ciudad) y la ciudad se normaliza (src/ciudades.py) para que 'lugo',
+    'Lugo' y 'Lugo, España' compartan la misma entrada.
 
     Args:
-        ciudad (str): Nombre de la ciudad para la que se piden planes.
+        ciudad (str): Nombre de la ciudad.
+        formato (str): Formato de salida pedido en el prompt.
 
     Returns:
-        list[dict]: Lista de mensajes en formato chat (system + user).
+        str: Clave para la caché persistente.
     """
-    mensaje_sistema = (
-        "Eres un asistente de viajes familiar experto en turismo sostenible y "
-        "de bajo coste. Respondes siempre en español, de forma clara, amigable "
-        "y bien estructurada. Cada plan que sugieres debe ser apto para niños, "
-        "adecuado para toda la familia y gratuito o de muy bajo coste."
-    )
+    plantilla = construir_prompt("{ciudad}", formato)
+    return clave_cache(ciudad, plantilla, MODELO, MAX_TOKENS, TEMPERATURA)
 
-    mensaje_usuario = (
-        f"Dame exactamente 10 planes recomendados para hacer en {ciudad} "
-        f"con niños y en familia, que sean gratuitos o de muy bajo coste.\n\n"
-        f"Formato de respuesta obligatorio:\n"
-        f"1. [Nombre del plan]: [Descripción breve de 1-2 oraciones. "
-        f"Indica si es gratuito o el coste aproximado.]\n"
-        f"2. ...\n"
-        f"...\n"
-        f"10. ...\n\n"
-        f"No añadas texto introductorio ni conclusión, solo la lista numerada "
-        f"del 1 al 10."
-    )
 
-    return [
-        {"role": "system", "content": mensaje_sistema},
-        {"role": "user",   "content": mensaje_usuario},
-    ]
+def _no_mostrar(*args, **kwargs):
+    """Sustituto silencioso de print."""
 
 
-def obtener_planes(ciudad: str) -> str:
+def obtener_planes(ciudad: str, usar_cache: bool = True, mostrar_progreso: bool = True) -> str:
     """
     Consulta el LLM en Hugging Face y devuelve 10 planes familiares
     para la ciudad indicada.
 
+    Primero se busca la respuesta en la caché persistente (compartida con la
+    app de Streamlit); si no está, se consulta al modelo y se guarda.
+
     Args:
         ciudad (str): Nombre de la ciudad.
+        usar_cache (bool): Si es False, se ignora la caché.
+        mostrar_progreso (bool): Si es False, no se imprime nada por consola
+            (útil en el modo por lotes, con varios hilos a la vez).
 
     Returns:
         str: Texto con los 10 planes recomendados.
 
     Raises:
         ConnectionError: Si no se puede conectar con la API tras varios intentos.
-        ValueError: Si la respuesta del modelo está vacía o es inválida.
+        ValueError: Si el texto no contiene una ciudad o la respuesta
+            del modelo está vacía o es inválida.
     """
-    # Obtenemos el token de forma segura desde la variable de entorno
-    token = obtener_token()
+    texto, _ = _resolver(ciudad, "texto", usar_cache, mostrar_progreso)
+    return texto
 
-    # Instanciamos el cliente — la inferencia ocurre en los servidores de HF,
-    # NO en tu PC, por lo que el consumo de recursos local es mínimo.
-    cliente = InferenceClient(token=token)
 
-    mensajes = construir_prompt(ciudad)
+def obtener_planes_estructurados(
+    ciudad: str,
+    usar_cache: bool = True,
+    mostrar_progreso: bool = True,
+    formato: str = FORMATO_SALIDA,
+) -> list[Plan]:
+    """
+    Igual que obtener_planes, pero devuelve los planes ya validados. Por
+    defecto pide la respuesta en JSON (FORMATO_SALIDA).
+
+    Args:
+        ciudad (str): Nombre de la ciudad.
+        usar_cache (bool): Si es False, se ignora la caché.
+        mostrar_progreso (bool): Si es False, no se imprime nada por consola.
+        formato (str): "json" o "texto".
+
+    Returns:
+        list[Plan]: Planes recomendados.
+
+    Raises:
+        ConnectionError: Si no se puede conectar con la API tras varios intentos.
+        ValueError: Si el texto no contiene una ciudad o la respuesta
+            está vacía o no contiene planes.
+    """
+    _, planes = _resolver(ciudad, formato, usar_cache, mostrar_progreso)
+    if not planes:
+        raise ValueError("El modelo no devolvió planes reconocibles.")
+    return planes
+
+
+def _resolver(ciudad: str, formato: str, usar_cache: bool, mostrar_progreso: bool):
+    """
+    Devuelve (texto, planes) de una ciudad, de la caché o del modelo. La
+    respuesta se valida una sola vez y los planes se guardan en la caché
+    junto al texto.
+    """
+    ciudad = exigir_ciudad(ciudad)
+    with tramo("total", formato=formato) as total:
+        mensajes = construir_prompt(ciudad, formato)
+        total.etiquetas["cache"] = "fallo"
+
+        # ── Consultar primero la caché persistente ───────────────────────────
+        cache = None
+        if usar_cache:
+            clave = _clave_cache(ciudad, formato)
+            with tramo("cache") as t:
+                cache = obtener_cache(CACHE_RUTA, CACHE_TTL, CACHE_MAX_ENTRADAS)
+                entrada = cache.obtener(clave)
+                t.etiquetas["resultado"] = "acierto" if entrada else "fallo"
+            if entrada:
+                total.etiquetas["cache"] = "acierto"
+                if mostrar_progreso:
+                    print("   ⚡ Respuesta recuperada de la caché.")
+                return entrada.texto, _planes_de_entrada(entrada, formato)
+
+        texto = _generar(mensajes, mostrar_progreso, formato)
+        with tramo("validacion", formato=formato):
+            planes = validar_planes(texto, formato)
+
+        if cache is not None:
+            cache.guardar(clave, ciudad, texto, MODELO, planes_a_json(planes))
+
+        return texto, planes
+
+
+def _planes_de_entrada(entrada, formato: str) -> list[Plan]:
+    """Planes de una entrada de caché (las antiguas no los guardaban)."""
+    if entrada.planes:
+        return planes_desde_json(entrada.planes)
+    return validar_planes(entrada.texto, formato)
+
+
+def _politica():
+    """Política de reintentos compartida por todos los hilos del proceso."""
+    return obtener_politica(
+        REINTENTOS,
+        ESPERA_BASE_REINTENTO,
+        ESPERA_MAXIMA_REINTENTO,
+        UMBRAL_CIRCUITO,
+        ENFRIAMIENTO_CIRCUITO,
+    )
+
+
+def limitador_tasa():
+    """
+    Limitador de tasa compartido por todos los hilos del proceso (p. ej. los
+    del modo por lotes). Se aplica antes de cada llamada al modelo.
+    """
+    return obtener_limitador(LIMITE_PETICIONES_SEGUNDO, LIMITE_RAFAGA)
+
+
+def _max_tokens(formato: str) -> int:
+    """
+    max_tokens de la próxima llamada: el aprendido de las respuestas
+    anteriores (ver src/presupuesto.py) o MAX_TOKENS si está desactivado.
+    """
+    if not PRESUPUESTO_ADAPTATIVO:
+        return MAX_TOKENS
+    return obtener_presupuesto(MAX_TOKENS).max_tokens(MODELO, formato)
+
+
+def _ejecutar_con_reintentos(llamada, mostrar_progreso: bool = True):
+    """
+    Ejecuta `llamada(intento)` con la política de reintentos, informando por
+    consola de cada fallo y traduciendo el error final a un mensaje claro.
+
+    Args:
+        llamada: Función que recibe el número de intento y llama al modelo.
+        mostrar_progreso (bool): Si es False, no se imprime nada por consola.
+
+    Returns:
+        Lo que devuelva `llamada`.
+
+    Raises:
+        ConnectionError: Si la API no responde tras los reintentos.
+        ValueError: Si la respuesta del modelo está vacía.
+    """
+    mostrar = print if mostrar_progreso else _no_mostrar
+
+    def al_reintentar(intento, error, espera):
+        if es_error_http(error):
+            # Errores HTTP de la API de Hugging Face (ej. 429 rate limit, 503)
+            mostrar(f"   ⚠️  Error HTTP de la API (intento {intento}): {error}")
+        else:
+            # Errores de red (timeout, conexión caída, etc.)
+            mostrar(f"   ⚠️  Error de red (intento {intento}): {type(error).__name__}: {error}")
+        mostrar(f"   ⏳ Esperando {espera:.1f}s antes de reintentar...")
+
+    try:
+        return _politica().ejecutar(llamada, al_reintentar)
+
+    except CircuitoAbiertoError as e:
+        raise ConnectionError(f"❌ {e}") from e
+
+    except ReintentosAgotadosError as e:
+        if es_error_http(e.causa) and INFERENCIA_BACKEND != "hf":
+            raise ConnectionError(
+                f"❌ No se pudo conectar con el servidor de inferencia "
+                f"({INFERENCIA_URL}) tras {e.intentos} intentos.\n"
+                f"   Detalle del error: {e.causa}\n"
+                f"   Verifica que el servidor esté arrancado y sirva el modelo."
+            ) from e.causa
+        if es_error_http(e.causa):
+            raise ConnectionError(
+                f"❌ No se pudo conectar con la API de Hugging Face "
+                f"tras {e.intentos} intentos.\n"
+                f"   Detalle del error: {e.causa}\n"
+                f"   Verifica tu conexión a internet y que tu token HF_TOKEN "
+                f"sea válido y tenga permisos de lectura."
+            ) from e.causa
+        raise ConnectionError(
+            f"❌ Error inesperado al llamar a la API tras {e.intentos} intentos.\n"
+            f"   Tipo de error: {type(e.causa).__name__}\n"
+            f"   Detalle: {e.causa}"
+        ) from e.causa
+
 
-    # ── Bucle de reintentos ──────────────────────────────────────────────────
-    for intento in range(1, REINTENTOS + 1):
-        try:
-            print(f"   🔄 Consultando al modelo (intento {intento}/{REINTENTOS})...")
+def _backend():
+    """
+    Backend de inferencia (INFERENCIA_BACKEND): la API de Hugging Face, con
+    el token de HF_TOKEN, o un servidor compatible con OpenAI.
+    """
+    return obtener_backend(
+        INFERENCIA_BACKEND,
+        obtener_token,
+        base_url=URL_BASE_INFERENCIA,
+        url=INFERENCIA_URL,
+        api_key=INFERENCIA_API_KEY,
+        modelo=INFERENCIA_MODELO,
+        timeout=INFERENCIA_TIMEOUT,
+    )
+
+
+def _cliente():
+    """
+    Devuelve el cliente compartido del backend (incluida la lectura del
+    token), midiendo cuánto tarda.
+    """
+    # Cliente compartido por el proceso — con el backend "hf" la inferencia
+    # ocurre en los servidores de HF, NO en tu PC. Reutilizarlo mantiene
+    # abiertas las conexiones HTTP entre consultas (importante en el modo
+    # por lotes).
+    with tramo("cliente"):
+        return _backend().cliente()
+
+
+def _generar(mensajes: list[dict], mostrar_progreso: bool = True, formato: str = "texto") -> str:
+    """
+    Llama al modelo con reintentos y devuelve el texto generado.
+
+    Si la respuesta se queda sin presupuesto de tokens antes del décimo
+    plan, se repite una vez con MAX_TOKENS.
+
+    Args:
+        mensajes (list[dict]): Mensajes en formato chat.
+        mostrar_progreso (bool): Si es False, no se imprime nada por consola.
+        formato (str): Formato pedido en los mensajes ("texto" o "json").
+
+    Returns:
+        str: Texto generado por el modelo.
+    """
+    mostrar = print if mostrar_progreso else _no_mostrar
 
+    cliente = _cliente()
+    presupuesto = obtener_presupuesto(MAX_TOKENS)
+
+    def pedir(intento: int, max_tokens: int):
+        with tramo("limitador"):
+            limitador_tasa().adquirir()
+        with tramo("llamada", modelo=MODELO, intento=intento):
             respuesta = cliente.chat.completions.create(
                 model=MODELO,
                 messages=mensajes,
-                max_tokens=MAX_TOKENS,
+                max_tokens=max_tokens,
                 temperature=TEMPERATURA,
+                stop=PARADAS[formato] or None,
             )
+        registrar_uso(MODELO, respuesta)
 
-            # Extraemos el texto generado de la respuesta
-            texto = respuesta.choices[0].message.content.strip()
+        # Extraemos el texto generado de la respuesta
+        eleccion = respuesta.choices[0]
+        texto = (eleccion.message.content or "").strip()
 
-            if not texto:
-                raise ValueError("El modelo devolvió una respuesta vacía.")
+        if not texto:
+            raise ValueError("El modelo devolvió una respuesta vacía.")
 
-            return texto
+        truncada = eleccion.finish_reason == "length"
+        uso = getattr(respuesta, "usage", None)
+        informe = presupuesto.registrar(
+            MODELO, formato, texto, max_tokens,
+            getattr(uso, "completion_tokens", None),
+            truncada=truncada,
+        )
+        return texto, truncada and not informe.completa
+
+    def llamada(intento: int) -> str:
+        mostrar(f"   🔄 Consultando al modelo (intento {intento}/{REINTENTOS})...")
+
+        max_tokens = _max_tokens(formato)
+        texto, incompleta = pedir(intento, max_tokens)
+        if incompleta and max_tokens < MAX_TOKENS:
+            mostrar("   ✂️  La respuesta se quedó corta; repitiendo con más tokens...")
+            texto, _ = pedir(intento, MAX_TOKENS)
+        return texto
+
+    return _ejecutar_con_reintentos(llamada, mostrar_progreso)
 
-        except HfHubHTTPError as e:
-            # Errores HTTP de la API de Hugging Face (ej. 429 rate limit, 503)
-            print(f"   ⚠️  Error HTTP de la API (intento {intento}): {e}")
-            if intento < REINTENTOS:
-                print(f"   ⏳ Esperando {ESPERA_ENTRE_REINTENTOS}s antes de reintentar...")
-                time.sleep(ESPERA_ENTRE_REINTENTOS)
-            else:
-                raise ConnectionError(
-                    f"❌ No se pudo conectar con la API de Hugging Face "
-                    f"tras {REINTENTOS} intentos.\n"
-                    f"   Detalle del error: {e}\n"
-                    f"   Verifica tu conexión a internet y que tu token HF_TOKEN "
-                    f"sea válido y tenga permisos de lectura."
-                ) from e
-
-        except Exception as e:
-            # Cualquier otro error inesperado (timeout, red caída, etc.)
-            print(f"   ⚠️  Error inesperado (intento {intento}): {type(e).__name__}: {e}")
-            if intento < REINTENTOS:
-                print(f"   ⏳ Esperando {ESPERA_ENTRE_REINTENTOS}s antes de reintentar...")
-                time.sleep(ESPERA_ENTRE_REINTENTOS)
-            else:
-                raise ConnectionError(
-                    f"❌ Error inesperado al llamar a la API tras {REINTENTOS} intentos.\n"
-                    f"   Tipo de error: {type(e).__name__}\n"
-                    f"   Detalle: {e}"
-                ) from e
 
+def obtener_planes_stream(ciudad: str, usar_cache: bool = True):
+    """
+    Variante en streaming de obtener_planes: devuelve el texto a medida que
+    el modelo lo va generando, para poder mostrarlo en vivo en la consola.
+
+    Args:
+        ciudad (str): Nombre de la ciudad.
+        usar_cache (bool): Si es False, se ignora la caché.
+
+    Yields:
+        str: Fragmentos de texto en el orden en que llegan.
+
+    Raises:
+        ConnectionError: Si no se puede conectar con la API tras varios intentos.
+        ValueError: Si el texto no contiene una ciudad o la respuesta
+            del modelo está vacía o es inválida.
+    """
+    ciudad = exigir_ciudad(ciudad)
+    mensajes = construir_prompt(ciudad)
+
+    # ── Consultar primero la caché persistente ───────────────────────────────
+    cache = None
+    if usar_cache:
+        cache = obtener_cache(CACHE_RUTA, CACHE_TTL, CACHE_MAX_ENTRADAS)
+        clave = _clave_cache(ciudad)
+        entrada = cache.obtener(clave)
+        if entrada:
+            print("   ⚡ Respuesta recuperada de la caché.")
+            yield entrada.texto
+            return
+
+    partes = []
+    for fragmento in _generar_stream(mensajes):
+        partes.append(fragmento)
+        yield fragmento
+
+    texto = "".join(partes).strip()
+    if not texto:
+        raise ValueError("El modelo devolvió una respuesta vacía.")
+
+    if cache is not None:
+        cache.guardar(clave, ciudad, texto, MODELO, planes_a_json(validar_planes(texto)))
+
+
+def _generar_stream(mensajes: list[dict]):
+    """
+    Llama al modelo en modo streaming con reintentos. Solo se reintenta si
+    el fallo ocurre antes de recibir el primer fragmento. La lectura se
+    corta al terminar el décimo plan (con sus líneas de continuación).
+
+    Args:
+        mensajes (list[dict]): Mensajes en formato chat.
+
+    Yields:
+        str: Fragmentos de texto generados por el modelo.
+    """
+    cliente = _cliente()
+    max_tokens = _max_tokens("texto")
+
+    def abrir_flujo(intento: int):
+        print(f"   🔄 Consultando al modelo (intento {intento}/{REINTENTOS})...")
+
+        with tramo("limitador"):
+            limitador_tasa().adquirir()
+        # El primer fragmento se lee dentro de la política de reintentos
+        with tramo("primer_fragmento", modelo=MODELO, intento=intento):
+            flujo = _fragmentos(cliente.chat.completions.create(
+                model=MODELO,
+                messages=mensajes,
+                max_tokens=max_tokens,
+                temperature=TEMPERATURA,
+                stop=PARADAS["texto"],
+                stream=True,
+            ))
+            return next(flujo, None), flujo
+
+    primero, flujo = _ejecutar_con_reintentos(abrir_flujo)
+    if primero is None:
+        return
+
+    corte = CorteDecimoPlan()
+    partes = []
+    try:
+        fragmento = primero
+        while fragmento is not None:
+            entregado, cortar = corte.alimentar(fragmento)
+            if entregado:
+                partes.append(entregado)
+                yield entregado
+            if cortar:
+                flujo.close()  # Cierra la conexión: el modelo deja de generar
+                break
+            fragmento = next(flujo, None)
+    except Exception as e:
+        raise ConnectionError(
+            f"❌ Se cortó la respuesta de la API de inferencia.\n"
+            f"   Detalle del error: {type(e).__name__}: {e}"
+        ) from e
+    pendiente = corte.terminar()
+    if pendiente:
+        partes.append(pendiente)
+        yield pendiente
+
+    obtener_presupuesto(MAX_TOKENS).registrar(
+        MODELO, "texto", "".join(partes).strip(), max_tokens,
+        cortada=corte.cortado,
+        truncada=not corte.cortado and max_tokens < MAX_TOKENS,
+    )
+
+
+def _fragmentos(flujo):
+    """
+    Extrae el texto no vacío de los eventos de un flujo de chat. Al cerrar
+    el generador se cierra también el flujo (y su conexión).
+    """
+    try:
+        for evento in flujo:
+            if not evento.choices:
+                continue
+            fragmento = evento.choices[0].delta.content
+            if fragmento:
+                yield fragmento
+    finally:
+        cerrar = getattr(flujo, "close", None)
+        if cerrar:
+            cerrar()
@@ -0,0 +1,109 @@
+# bench/bench_arranque.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Benchmark del arranque en frío de main.py y app.py.
+# Cada medida es un intérprete nuevo que ejecuta el script (main.py --help, o
+# la primera ejecución de app.py en modo bare) y anota el tiempo, la memoria
+# máxima (RSS) y qué dependencias pesadas quedaron cargadas. huggingface_hub
+# solo debe cargarse en la primera llamada real al modelo, y Streamlit solo
+# en la app. Si alguna medida se pasa del presupuesto, termina con código 1.
+# Ejecutar desde la raíz del proyecto:
+#   python -m bench.bench_arranque --repeticiones 5
+# ─────────────────────────────────────────────────────────────────────────────
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Dependencias cuyo coste de importación se vigila
+PESADAS = ("huggingface_hub", "httpx", "requests", "streamlit", "asyncio", "http.server")
+
+# Presupuesto por script: (segundos del proceso completo, MB de RSS máximo,
+# dependencias pesadas que NO deben cargarse)
+PRESUPUESTOS = {
+    "main.py --help": (0.25, 40, ("huggingface_hub", "httpx", "requests", "streamlit", "asyncio")),
+    "app.py": (1.0, 100, ("huggingface_hub",)),
+}
+
+# Se ejecuta en el proceso hijo: corre el script y escribe la medida en stderr
+_SONDA = """
+import json, os, resource, runpy, sys, time
+inicio = time.perf_counter()
+sys.argv = {argv!r}
+sys.path.insert(0, {raiz!r})
+salida, sys.stdout = sys.stdout, open(os.devnull, "w")
+try:
+    runpy.run_path({ruta!r}, run_name="__main__")
+except SystemExit:
+    pass
+sys.stdout = salida
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+sys.stderr.write("\\n" + json.dumps({{
+    "script": time.perf_counter() - inicio,
+    "rss_mb": rss / 1024 if sys.platform != "darwin" else rss / 2**20,
+    "cargadas": [m for m in {pesadas!r} if m in sys.modules],
+}}) + "\\n")
+"""
+
+
+def medir(script: str, argumentos: list[str]) -> dict:
+    """Arranca un intérprete nuevo con el script y devuelve su medida."""
+    sonda = _SONDA.format(
+        argv=[script] + argumentos,
+        raiz=RAIZ,
+        ruta=os.path.join(RAIZ, script),
+        pesadas=PESADAS,
+    )
+    # Sin token ni precalentamiento: se mide el arranque, no la red
+    entorno = {**os.environ, "CALENTAR_CACHE": "0", "HF_TOKEN": "", "METRICAS_PUERTO": "0"}
+    inicio = time.perf_counter()
+    proceso = subprocess.run(
+        [sys.executable, "-c", sonda], cwd=RAIZ, env=entorno,
+        capture_output=True, text=True, timeout=60,
+    )
+    total = time.perf_counter() - inicio
+    lineas = [linea for linea in proceso.stderr.splitlines() if linea.startswith("{")]
+    if not lineas:
+        raise RuntimeError(f"{script} falló:\n{proceso.stderr[-2000:]}")
+    return {"proceso": total, **json.loads(lineas[-1])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del arranque en frío.")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    argumentos = parser.parse_args()
+
+    casos = {"main.py --help": ("main.py", ["--help"]), "app.py": ("app.py", [])}
+    dentro = True
+
+    print(f"{'script':<16} {'proceso':>9} {'script':>9} {'RSS':>8}   cargadas")
+    for nombre, (script, args) in casos.items():
+        medidas = [medir(script, args) for _ in range(argumentos.repeticiones)]
+        proceso = statistics.median(m["proceso"] for m in medidas)
+        ejecucion = statistics.median(m["script"] for m in medidas)
+        rss = max(m["rss_mb"] for m in medidas)
+        cargadas = medidas[-1]["cargadas"]
+        print(f"{nombre:<16} {proceso * 1000:>7.0f}ms {ejecucion * 1000:>7.0f}ms {rss:>6.0f}MB   "
+              f"{', '.join(cargadas) or '-'}")
+
+        max_segundos, max_mb, prohibidas = PRESUPUESTOS[nombre]
+        fallos = []
+        if proceso > max_segundos:
+            fallos.append(f"{proceso:.2f}s > {max_segundos}s")
+        if rss > max_mb:
+            fallos.append(f"{rss:.0f}MB > {max_mb}MB")
+        fallos += [f"carga {m}" for m in cargadas if m in prohibidas]
+        if fallos:
+            dentro = False
+            print(f"{'':<16} ❌ fuera de presupuesto: {'; '.join(fallos)}")
+
+    sys.exit(0 if dentro else 1)
+
+
+if __name__ == "__main__":
+    main()
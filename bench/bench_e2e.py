@@ -0,0 +1,235 @@
+# bench/bench_e2e.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Benchmark de extremo a extremo contra el servidor simulado
+# (bench/servidor_stub.py): consultas completas, streaming, parser y render
+# de las tarjetas. Informa de percentiles de latencia, rendimiento y memoria
+# asignada por petición, para que las regresiones se vean en números.
+# Ejecutar desde la raíz del proyecto:
+#   python -m bench.bench_e2e --peticiones 50 --concurrencia 4 --latencia 0.2
+#   python -m bench.bench_e2e --tasa-error 0.1 --json resultados.json
+# ─────────────────────────────────────────────────────────────────────────────
+
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.servidor_stub import anadir_argumentos, config_desde_argumentos, iniciar_servidor
+
+
+def percentil(valores: list[float], p: float) -> float:
+    """Percentil `p` (0-100) por el método del rango más cercano."""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+def resumen(nombre: str, latencias: list[float], duracion: float, errores: int = 0) -> dict:
+    """Estadísticas de una serie de latencias (en segundos)."""
+    return {
+        "escenario": nombre,
+        "peticiones": len(latencias) + errores,
+        "errores": errores,
+        "p50_ms": percentil(latencias, 50) * 1000,
+        "p90_ms": percentil(latencias, 90) * 1000,
+        "p99_ms": percentil(latencias, 99) * 1000,
+        "max_ms": max(latencias, default=0.0) * 1000,
+        "por_segundo": len(latencias) / duracion if duracion else 0.0,
+    }
+
+
+def _medir_concurrente(funcion, ciudades: list[str], concurrencia: int) -> tuple[list[float], int, float]:
+    """
+    Ejecuta `funcion(ciudad)` para cada ciudad con varios hilos.
+
+    Returns:
+        (latencias de las correctas, número de errores, duración total).
+    """
+
+    def una(ciudad: str):
+        inicio = time.perf_counter()
+        try:
+            funcion(ciudad)
+        except Exception:
+            return None
+        return time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as grupo:
+        resultados = list(grupo.map(una, ciudades))
+    duracion = time.perf_counter() - inicio
+
+    latencias = [r for r in resultados if r is not None]
+    return latencias, len(resultados) - len(latencias), duracion
+
+
+def escenario_completo(asistente, ciudades: list[str], concurrencia: int) -> dict:
+    """obtener_planes sin caché: llamada completa por ciudad."""
+    latencias, errores, duracion = _medir_concurrente(
+        lambda c: asistente.obtener_planes(c, usar_cache=False), ciudades, concurrencia
+    )
+    return resumen("obtener_planes", latencias, duracion, errores)
+
+
+def escenario_stream(asistente, ciudades: list[str], concurrencia: int) -> tuple[dict, dict]:
+    """obtener_planes_stream sin caché: tiempo hasta el primer fragmento y total."""
+    primeros: list[float] = []
+
+    def consumir(ciudad: str):
+        inicio = time.perf_counter()
+        flujo = asistente.obtener_planes_stream(ciudad, usar_cache=False)
+        for n, _ in enumerate(flujo):
+            if n == 0:
+                primeros.append(time.perf_counter() - inicio)
+
+    latencias, errores, duracion = _medir_concurrente(consumir, ciudades, concurrencia)
+    return (
+        resumen("stream (primer fragmento)", primeros, duracion, errores),
+        resumen("stream (completo)", latencias, duracion, errores),
+    )
+
+
+def escenario_cache(asistente, ciudades: list[str], concurrencia: int) -> dict:
+    """obtener_planes con la caché ya llena (aciertos)."""
+    for ciudad in ciudades:
+        asistente.obtener_planes(ciudad)
+    latencias, errores, duracion = _medir_concurrente(
+        asistente.obtener_planes, ciudades, concurrencia
+    )
+    return resumen("obtener_planes (caché)", latencias, duracion, errores)
+
+
+def escenario_parser_render(textos: list[str], repeticiones: int) -> tuple[dict, dict]:
+    """Parser sin memoria y render_resultado (Streamlit en modo bare)."""
+    from src.parser import ParserPlanes
+    from src.planes import Plan
+    from src.ui.components import render_resultado
+
+    # Fuera de `streamlit run` cada elemento avisa de que falta el contexto
+    for nombre in list(logging.root.manager.loggerDict):
+        if nombre.startswith("streamlit"):
+            logging.getLogger(nombre).setLevel(logging.ERROR)
+
+    tiempos_parser, tiempos_render = [], []
+    for _ in range(repeticiones):
+        for texto in textos:
+            inicio = time.perf_counter()
+            parser = ParserPlanes()
+            planes = [Plan(*fila) for fila in parser.alimentar(texto) + parser.terminar()]
+            tiempos_parser.append(time.perf_counter() - inicio)
+
+            inicio = time.perf_counter()
+            render_resultado("Ciudad", planes)
+            tiempos_render.append(time.perf_counter() - inicio)
+
+    return (
+        resumen("parser", tiempos_parser, sum(tiempos_parser)),
+        resumen("render_resultado", tiempos_render, sum(tiempos_render)),
+    )
+
+
+def memoria_por_peticion(asistente, ciudades: list[str]) -> dict:
+    """
+    Memoria asignada por petición (secuencial, con tracemalloc): el pico
+    durante cada llamada y lo que queda retenido al terminar todas.
+    """
+    tracemalloc.start()
+    try:
+        base, _ = tracemalloc.get_traced_memory()
+        picos = []
+        for ciudad in ciudades:
+            tracemalloc.reset_peak()
+            antes, _ = tracemalloc.get_traced_memory()
+            asistente.obtener_planes(ciudad, usar_cache=False)
+            _, pico = tracemalloc.get_traced_memory()
+            picos.append(pico - antes)
+        final, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "escenario": "memoria",
+        "peticiones": len(ciudades),
+        "pico_medio_kib": sum(picos) / len(picos) / 1024 if picos else 0.0,
+        "pico_max_kib": max(picos, default=0) / 1024,
+        "retenido_por_peticion_kib": (final - base) / len(ciudades) / 1024 if ciudades else 0.0,
+    }
+
+
+def imprimir(resultados: list[dict]):
+    print(f"{'escenario':<28} {'n':>5} {'err':>4} {'p50 ms':>9} {'p90 ms':>9} "
+          f"{'p99 ms':>9} {'máx ms':>9} {'pet/s':>9}")
+    for r in resultados:
+        if "p50_ms" not in r:
+            continue
+        print(f"{r['escenario']:<28} {r['peticiones']:>5} {r['errores']:>4} "
+              f"{r['p50_ms']:>9.1f} {r['p90_ms']:>9.1f} {r['p99_ms']:>9.1f} "
+              f"{r['max_ms']:>9.1f} {r['por_segundo']:>9.1f}")
+    for r in resultados:
+        if r["escenario"] == "memoria":
+            print(f"\nMemoria por petición: pico medio {r['pico_medio_kib']:.1f} KiB · "
+                  f"pico máx. {r['pico_max_kib']:.1f} KiB · "
+                  f"retenido {r['retenido_por_peticion_kib']:.2f} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de extremo a extremo contra el servidor simulado.")
+    parser.add_argument("--peticiones", type=int, default=40, help="Consultas por escenario.")
+    parser.add_argument("--concurrencia", type=int, default=4, help="Hilos simultáneos.")
+    parser.add_argument("--repeticiones-render", type=int, default=20)
+    parser.add_argument(
+        "--limite-real",
+        action="store_true",
+        help="Aplicar el limitador de tasa configurado (por defecto se levanta: "
+             "el servidor simulado no tiene cuota).",
+    )
+    parser.add_argument("--json", metavar="FICHERO", help="Guardar los resultados en JSON.")
+    anadir_argumentos(parser)
+    argumentos = parser.parse_args()
+
+    servidor, url = iniciar_servidor(config_desde_argumentos(argumentos))
+
+    # La configuración se lee al importar: el entorno va antes que src.asistente
+    os.environ["HF_BASE_URL"] = url
+    os.environ["HF_TOKEN"] = "stub"
+    os.environ.setdefault("CACHE_RUTA", os.path.join(tempfile.gettempdir(), "planes_bench.sqlite3"))
+
+    from src import asistente
+    from src.cache import obtener_cache
+    from src.config import CACHE_MAX_ENTRADAS, CACHE_RUTA, CACHE_TTL
+
+    if not argumentos.limite_real:
+        # El limitador es un singleton creado en la primera llamada
+        from src.limitador import obtener_limitador
+        obtener_limitador(1e9, 10**9)
+
+    obtener_cache(CACHE_RUTA, CACHE_TTL, CACHE_MAX_ENTRADAS).limpiar()
+
+    n = argumentos.peticiones
+    print(f"🧪 Servidor simulado en {url} · {n} peticiones · concurrencia {argumentos.concurrencia}\n")
+
+    resultados = [escenario_completo(asistente, [f"Ciudad {i}" for i in range(n)], argumentos.concurrencia)]
+    resultados += escenario_stream(asistente, [f"Stream {i}" for i in range(n)], argumentos.concurrencia)
+    resultados.append(escenario_cache(asistente, [f"Caché {i}" for i in range(n)], argumentos.concurrencia))
+
+    textos = [asistente.obtener_planes(f"Render {i}") for i in range(5)]
+    resultados += escenario_parser_render(textos, argumentos.repeticiones_render)
+    resultados.append(memoria_por_peticion(asistente, [f"Memoria {i}" for i in range(min(n, 20))]))
+
+    servidor.shutdown()
+    imprimir(resultados)
+
+    if argumentos.json:
+        with open(argumentos.json, "w", encoding="utf-8") as fichero:
+            json.dump(resultados, fichero, ensure_ascii=False, indent=2)
+        print(f"\n💾 Resultados guardados en {argumentos.json}")
+
+
+if __name__ == "__main__":
+    main()
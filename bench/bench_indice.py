@@ -0,0 +1,114 @@
+# bench/bench_indice.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Benchmark de la búsqueda por palabras en los planes (src/indice.py).
+# Indexa N ciudades con los planes del corpus y mide el tiempo de
+# construcción, la actualización incremental de una ciudad y la latencia
+# de las consultas frente a recorrer todos los planes buscando las
+# palabras (lo que haría falta sin índice). También el índice guardado
+# junto al snapshot (el de main.py --buscar): escritura, apertura y consultas.
+# Ejecutar desde la raíz del proyecto:
+#   python -m bench.bench_indice --ciudades 5000 --consultas 200
+# ─────────────────────────────────────────────────────────────────────────────
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from bench.bench_parser import cargar_corpus
+from src.ciudades import plegar
+from src.indice import IndicePlanes, IndiceSnapshot, escribir_indice_snapshot
+from src.parser import extraer_planes
+from src.planes import Plan
+from src.snapshot import Snapshot, escribir_snapshot
+
+CONSULTAS = ("museos gratis", "parques con niños", "playa", "paseo en barca", "talleres infantiles")
+
+
+def buscar_sin_indice(planes_por_ciudad: list, consulta: str) -> list:
+    """Referencia: planes que contienen alguna palabra de la consulta."""
+    palabras = [p for p in plegar(consulta).split() if len(p) > 3]
+    return [
+        (ciudad, plan)
+        for ciudad, planes in planes_por_ciudad
+        for plan in planes
+        if any(p in plegar(f"{plan.titulo} {plan.descripcion} {plan.coste or ''}") for p in palabras)
+    ]
+
+
+def percentil(valores: list[float], p: float) -> float:
+    return sorted(valores)[min(len(valores) - 1, int(p * len(valores)))]
+
+
+def medir_consultas(indice, consulta: str, repeticiones: int) -> tuple[int, list[float]]:
+    """(resultados, milisegundos de cada repetición)."""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultados = indice.buscar(consulta)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return len(resultados), tiempos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del índice de planes.")
+    parser.add_argument("--ciudades", type=int, default=5000)
+    parser.add_argument("--consultas", type=int, default=200)
+    argumentos = parser.parse_args()
+
+    # Cada ciudad recibe los planes de un fichero del corpus, por turnos
+    corpus = [
+        [Plan(*fila) for fila in extraer_planes(texto)]
+        for texto in cargar_corpus().values()
+    ]
+    planes_por_ciudad = [
+        (f"Ciudad {n:05d}", corpus[n % len(corpus)]) for n in range(argumentos.ciudades)
+    ]
+
+    indice = IndicePlanes()
+    inicio = time.perf_counter()
+    for ciudad, planes in planes_por_ciudad:
+        indice.anadir(ciudad, planes)
+    construccion = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    for ciudad, planes in planes_por_ciudad[:100]:
+        indice.anadir(ciudad, planes)
+    actualizacion = (time.perf_counter() - inicio) / 100
+
+    estadisticas = indice.estadisticas()
+    print(f"{estadisticas['ciudades']:,} ciudades · {estadisticas['planes']:,} planes · "
+          f"{estadisticas['terminos']:,} términos")
+    print(f"construcción {construccion * 1000:.0f} ms · "
+          f"actualizar una ciudad {actualizacion * 1e6:.0f} µs\n")
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "planes.snapshot")
+        escribir_snapshot(ruta, planes_por_ciudad)
+        snapshot = Snapshot(ruta)
+        inicio = time.perf_counter()
+        escribir_indice_snapshot(ruta + ".indice", snapshot)
+        escritura = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        en_disco = IndiceSnapshot(ruta + ".indice", snapshot)
+        apertura = time.perf_counter() - inicio
+        print(f"en disco: escrito en {escritura * 1000:.0f} ms · "
+              f"{os.path.getsize(ruta + '.indice') / 1024:,.0f} KB · abierto en {apertura * 1e6:.0f} µs\n")
+
+        print(f"{'consulta':<22} {'resultados':>10} {'índice p50':>11} {'p95':>8} "
+              f"{'en disco p50':>13} {'sin índice':>11}")
+        for consulta in CONSULTAS:
+            resultados, tiempos = medir_consultas(indice, consulta, argumentos.consultas)
+            _, tiempos_disco = medir_consultas(en_disco, consulta, argumentos.consultas)
+            inicio = time.perf_counter()
+            buscar_sin_indice(planes_por_ciudad, consulta)
+            lineal = (time.perf_counter() - inicio) * 1000
+            print(f"{consulta:<22} {resultados:>10} {statistics.median(tiempos):>9.2f}ms "
+                  f"{percentil(tiempos, 0.95):>6.2f}ms {statistics.median(tiempos_disco):>11.2f}ms "
+                  f"{lineal:>9.0f}ms")
+        del en_disco, snapshot  # Cierra los mapas antes de borrar el directorio
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# bench/bench_parser.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Micro-benchmark del parser de planes (src/parser.py) sobre el corpus de
+# respuestas del modelo en bench/corpus/. Compara con el parser anterior
+# (una expresión regular + detección de coste por separado) y comprueba
+# cuántos planes reconoce cada uno en cada fichero, y que el corte del
+# stream tras el décimo plan (src/presupuesto.py) no pierde nada de él.
+# Ejecutar desde la raíz del proyecto:
+#   python -m bench.bench_parser --repeticiones 2000
+# ─────────────────────────────────────────────────────────────────────────────
+
+import argparse
+import glob
+import os
+import re
+import time
+
+from src.parser import ParserPlanes, extraer_planes
+from src.presupuesto import CorteDecimoPlan
+
+DIRECTORIO_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+
+# ── Parser anterior, como referencia ─────────────────────────────────────────
+_PATRON_ANTERIOR = re.compile(
+    r"^(\d{1,2})\.\s+"
+    r"(?:\*\*)?(.+?)(?:\*\*)?"
+    r"(?::\s*|\s*[-–—]\s*)"
+    r"(.+)$",
+    re.MULTILINE,
+)
+
+
+def _coste_anterior(texto: str) -> str | None:
+    texto_lower = texto.lower()
+    if "gratuit" in texto_lower or "gratis" in texto_lower or "libre" in texto_lower:
+        return "Gratuito"
+    if "bajo coste" in texto_lower or "económic" in texto_lower:
+        return "Bajo coste"
+    precio_match = re.search(r"(\d+[\.,]?\d*)\s*€|(\d+[\.,]?\d*)\s*euros?", texto_lower)
+    if precio_match:
+        return f"~{precio_match.group(0).strip()}"
+    return None
+
+
+def parser_anterior(texto: str) -> list[tuple]:
+    planes = []
+    for match in _PATRON_ANTERIOR.finditer(texto):
+        titulo = match.group(2).strip().rstrip("*").lstrip("*").strip()
+        descripcion = match.group(3).strip()
+        planes.append((int(match.group(1)), titulo, descripcion, _coste_anterior(descripcion)))
+    return planes
+
+
+def parser_nuevo(texto: str) -> list[tuple]:
+    # Sin la memoria de extraer_planes, para medir el coste real del parseo
+    parser = ParserPlanes()
+    return parser.alimentar(texto) + parser.terminar()
+
+
+def corte_intacto(texto: str, tamano: int = 7) -> bool:
+    """
+    Si el texto que entrega CorteDecimoPlan, alimentado en fragmentos de
+    `tamano` caracteres como un stream, da los mismos planes que el texto
+    completo.
+    """
+    corte = CorteDecimoPlan()
+    partes = []
+    for inicio in range(0, len(texto), tamano):
+        entregado, cortar = corte.alimentar(texto[inicio:inicio + tamano])
+        partes.append(entregado)
+        if cortar:
+            break
+    partes.append(corte.terminar())
+    return parser_nuevo("".join(partes)) == parser_nuevo(texto)
+
+
+# ── Medición ─────────────────────────────────────────────────────────────────
+
+def cargar_corpus() -> dict[str, str]:
+    """Lee los ficheros .txt del corpus."""
+    corpus = {}
+    for ruta in sorted(glob.glob(os.path.join(DIRECTORIO_CORPUS, "*.txt"))):
+        with open(ruta, encoding="utf-8") as fichero:
+            corpus[os.path.basename(ruta)] = fichero.read()
+    return corpus
+
+
+def medir(funcion, textos: list[str], repeticiones: int) -> tuple[float, int]:
+    """
+    Returns:
+        (segundos totales, planes extraídos en total).
+    """
+    planes = 0
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for texto in textos:
+            planes += len(funcion(texto))
+    return time.perf_counter() - inicio, planes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del parser de planes.")
+    parser.add_argument("--repeticiones", type=int, default=1000)
+    argumentos = parser.parse_args()
+
+    corpus = cargar_corpus()
+    if not corpus:
+        print(f"❌ No hay ficheros en {DIRECTORIO_CORPUS}")
+        return
+
+    print(f"{'fichero':<30} {'anterior':>8} {'nuevo':>8} {'corte':>6}")
+    for nombre, texto in corpus.items():
+        print(f"{nombre:<30} {len(parser_anterior(texto)):>8} {len(parser_nuevo(texto)):>8} "
+              f"{'ok' if corte_intacto(texto) else 'MAL':>6}")
+    print()
+
+    textos = list(corpus.values())
+    for nombre, funcion in (("anterior", parser_anterior), ("nuevo", parser_nuevo)):
+        segundos, planes = medir(funcion, textos, argumentos.repeticiones)
+        print(f"{nombre:<10} {planes / segundos:>12,.0f} planes/s   "
+              f"{segundos / (argumentos.repeticiones * len(textos)) * 1e6:>8.1f} µs/respuesta")
+
+    # Con memoria: lo que cuesta volver a pedir una respuesta ya parseada
+    segundos, planes = medir(extraer_planes, textos, argumentos.repeticiones)
+    print(f"{'memoria':<10} {planes / segundos:>12,.0f} planes/s   "
+          f"{segundos / (argumentos.repeticiones * len(textos)) * 1e6:>8.1f} µs/respuesta")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# bench/bench_render.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Benchmark del render de resultados en cada rerun de la app.
+# Compara el render anterior (CSS completo + una llamada a st.markdown por
+# tarjeta, con el HTML reconstruido en cada rerun) con el actual (CSS
+# minificado + un solo elemento con el HTML memorizado). Mide el tiempo de
+# Python por rerun y los bytes que se envían al navegador; con --apptest
+# mide además reruns completos de app.py con streamlit.testing.
+# Ejecutar desde la raíz del proyecto:
+#   python -m bench.bench_render --repeticiones 2000 [--apptest 50]
+# ─────────────────────────────────────────────────────────────────────────────
+
+import argparse
+import os
+import statistics
+import time
+
+import streamlit as st
+
+from bench.bench_parser import cargar_corpus
+from src.almacen import AlmacenResultados
+from src.parser import extraer_planes
+from src.planes import Plan
+from src.ui.components import html_resultado
+from src.ui.styles import CSS_MINIFICADO, CUSTOM_CSS
+
+CIUDAD = "Granada"
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# ── Render anterior, como referencia ─────────────────────────────────────────
+def _tarjeta_anterior(plan: Plan) -> str:
+    coste_html = f'<span class="plan-cost">{plan.coste}</span>' if plan.coste else ""
+    return f"""
+        <div class="plan-card">
+            <div class="plan-number">{plan.num}</div>
+            <div class="plan-content">
+                <p class="plan-title">{plan.titulo}</p>
+                <p class="plan-desc">{plan.descripcion}</p>
+                {coste_html}
+            </div>
+        </div>
+        """
+
+
+def render_anterior(ciudad: str, planes: list[Plan]) -> int:
+    """Devuelve los bytes enviados en el rerun."""
+    cabecera = f"""
+        <div class="results-header">
+            <span class="badge">📍 {ciudad.upper()}</span>
+            <span class="count">10 planes familiares recomendados</span>
+        </div>
+        """
+    elementos = [CUSTOM_CSS, cabecera] + [_tarjeta_anterior(plan) for plan in planes]
+    for elemento in elementos:
+        st.markdown(elemento, unsafe_allow_html=True)
+    return sum(len(e.encode("utf-8")) for e in elementos)
+
+
+def render_actual(ciudad: str, planes: list[Plan], clave: str) -> int:
+    elementos = [CSS_MINIFICADO, html_resultado(ciudad, planes, clave)]
+    for elemento in elementos:
+        st.markdown(elemento, unsafe_allow_html=True)
+    return sum(len(e.encode("utf-8")) for e in elementos)
+
+
+# ── Medición ─────────────────────────────────────────────────────────────────
+def medir(funcion, repeticiones: int) -> tuple[float, int]:
+    """
+    Returns:
+        (µs por rerun, bytes por rerun).
+    """
+    enviados = funcion()
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.perf_counter() - inicio) / repeticiones * 1e6, enviados
+
+
+def medir_apptest(reruns: int, planes: list[Plan]) -> list[float]:
+    """Milisegundos de cada rerun completo de app.py con un resultado en pantalla."""
+    from streamlit.testing.v1 import AppTest
+
+    from src.almacen import obtener_almacen
+    from src.config import ALMACEN_MAX_BYTES
+
+    os.environ.setdefault("CALENTAR_CACHE", "0")
+    prueba = AppTest.from_file(os.path.join(RAIZ, "app.py"), default_timeout=30)
+    # AppTest ejecuta el script en este proceso: comparte el almacén
+    prueba.session_state["historial"] = {CIUDAD: obtener_almacen(ALMACEN_MAX_BYTES).guardar(planes)}
+    prueba.session_state["clave_actual"] = prueba.session_state["historial"][CIUDAD]
+    prueba.session_state["ciudad_actual"] = CIUDAD
+    prueba.run()
+
+    tiempos = []
+    for _ in range(reruns):
+        inicio = time.perf_counter()
+        prueba.run()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del render de resultados por rerun.")
+    parser.add_argument("--repeticiones", type=int, default=2000)
+    parser.add_argument("--apptest", type=int, default=0, metavar="RERUNS",
+                        help="Mide además RERUNS reruns completos de app.py")
+    argumentos = parser.parse_args()
+
+    corpus = cargar_corpus()
+    planes = [Plan(*fila) for fila in extraer_planes(corpus["negrita_dos_puntos.txt"])]
+    clave = AlmacenResultados(1 << 20).guardar(planes)
+
+    # Fuera de `streamlit run`, st.markdown construye el mensaje pero no lo
+    # envía: se mide el coste en Python de cada rerun.
+    print(f"{len(planes)} planes · {argumentos.repeticiones:,} reruns\n")
+    print(f"{'render':<10} {'µs/rerun':>10} {'elementos':>10} {'bytes':>8}")
+    for nombre, funcion, elementos in (
+        ("anterior", lambda: render_anterior(CIUDAD, planes), len(planes) + 2),
+        ("actual", lambda: render_actual(CIUDAD, planes, clave), 2),
+    ):
+        micros, enviados = medir(funcion, argumentos.repeticiones)
+        print(f"{nombre:<10} {micros:>10.1f} {elementos:>10} {enviados:>8,}")
+
+    if argumentos.apptest:
+        tiempos = medir_apptest(argumentos.apptest, planes)
+        print(f"\napp.py completo: mediana {statistics.median(tiempos):.1f} ms · "
+              f"p95 {sorted(tiempos)[int(0.95 * len(tiempos))]:.1f} ms "
+              f"({len(tiempos)} reruns)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# bench/bench_snapshot.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Benchmark del snapshot de planes precalculados (src/snapshot.py) frente a
+# la caché SQLite (src/cache.py) con las mismas ciudades: tiempo de
+# exportación, tamaño, apertura y µs por búsqueda (aciertos y fallos).
+# Comprueba también el cambio en caliente: mientras un hilo busca sin
+# parar, se exporta un snapshot nuevo encima y se mide cuándo lo ve.
+# Ejecutar desde la raíz del proyecto:
+#   python -m bench.bench_snapshot --ciudades 5000 --busquedas 20000
+# ─────────────────────────────────────────────────────────────────────────────
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+from bench.bench_parser import cargar_corpus
+from src.cache import CacheRespuestas
+from src.parser import extraer_planes
+from src.planes import Plan, planes_a_json
+from src.snapshot import SnapshotVigilado, escribir_snapshot
+
+
+def medir_busquedas(buscar, nombres: list[str], busquedas: int) -> float:
+    """µs por búsqueda, eligiendo ciudades al azar (semilla fija)."""
+    azar = random.Random(1)
+    consultas = [azar.choice(nombres) for _ in range(busquedas)]
+    inicio = time.perf_counter()
+    for nombre in consultas:
+        buscar(nombre)
+    return (time.perf_counter() - inicio) / busquedas * 1e6
+
+
+def medir_cambio(ruta: str, resultados: list, intervalo: float) -> float:
+    """Segundos desde que se reemplaza el fichero hasta que un lector lo usa."""
+    vigilado = SnapshotVigilado(ruta, intervalo)
+    vigilado.comprobar()
+    parar = threading.Event()
+    visto = threading.Event()
+
+    def lector():
+        while not parar.is_set():
+            if vigilado.buscar("Ciudad Nueva Bench") is not None:
+                visto.set()
+                return
+
+    hilo = threading.Thread(target=lector)
+    hilo.start()
+    time.sleep(0.05)
+    inicio = time.perf_counter()
+    escribir_snapshot(ruta, resultados + [("Ciudad Nueva Bench", resultados[0][1])])
+    visto.wait(10 * intervalo + 5)
+    parar.set()
+    hilo.join()
+    return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del snapshot de planes.")
+    parser.add_argument("--ciudades", type=int, default=5000)
+    parser.add_argument("--busquedas", type=int, default=20000)
+    parser.add_argument("--intervalo", type=float, default=0.5,
+                        help="Segundos entre comprobaciones del fichero (cambio en caliente)")
+    argumentos = parser.parse_args()
+
+    corpus = cargar_corpus()
+    planes = [Plan(*fila) for fila in extraer_planes(corpus["negrita_dos_puntos.txt"])]
+    nombres = [f"Ciudad {n:05d}" for n in range(argumentos.ciudades)]
+    resultados = [(nombre, planes) for nombre in nombres]
+    fallos = [f"Pueblo {n:05d}" for n in range(argumentos.ciudades)]
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "planes.snapshot")
+        inicio = time.perf_counter()
+        escribir_snapshot(ruta, resultados)
+        exportacion = time.perf_counter() - inicio
+
+        vigilado = SnapshotVigilado(ruta, intervalo=3600)
+        inicio = time.perf_counter()
+        vigilado.comprobar()
+        apertura = time.perf_counter() - inicio
+
+        cache = CacheRespuestas(os.path.join(directorio, "planes.sqlite3"), 3600, len(nombres))
+        texto, json_planes = corpus["negrita_dos_puntos.txt"], planes_a_json(planes)
+        for nombre in nombres:
+            cache.guardar(nombre, nombre, texto, None, json_planes)
+
+        print(f"{len(nombres):,} ciudades · {argumentos.busquedas:,} búsquedas\n")
+        print(f"snapshot: {os.path.getsize(ruta) / 1024:,.0f} KB · exportado en "
+              f"{exportacion * 1000:.0f} ms · abierto en {apertura * 1e6:.0f} µs")
+        print(f"sqlite:   {os.path.getsize(cache.ruta) / 1024:,.0f} KB\n")
+        print(f"{'búsqueda':<22} {'µs':>8}")
+        for nombre, buscar, consultas in (
+            ("snapshot (acierto)", vigilado.buscar, nombres),
+            ("snapshot (fallo)", vigilado.buscar, fallos),
+            ("sqlite (acierto)", cache.obtener, nombres),
+            ("sqlite (fallo)", cache.obtener, fallos),
+        ):
+            print(f"{nombre:<22} {medir_busquedas(buscar, consultas, argumentos.busquedas):>8.1f}")
+
+        cambio = medir_cambio(ruta, resultados, argumentos.intervalo)
+        print(f"\nCambio en caliente: visto {cambio:.2f}s después de exportar "
+              f"(intervalo {argumentos.intervalo:g}s)")
+
+
+if __name__ == "__main__":
+    main()
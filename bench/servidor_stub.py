@@ -0,0 +1,302 @@
+# bench/servidor_stub.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Servidor local que imita la API de chat completions (formato OpenAI, el
+# que usa InferenceClient) para medir el rendimiento sin gastar cuota de
+# Hugging Face ni depender de la red.
+#
+# Latencia hasta el primer token, velocidad de generación, tasa de errores
+# (503 y 429 con Retry-After) y streaming (SSE) son configurables.
+#
+#   python -m bench.servidor_stub --puerto 8089 --latencia 0.3 --tokens-segundo 200
+#   HF_BASE_URL=http://127.0.0.1:8089 HF_TOKEN=stub streamlit run app.py
+# ─────────────────────────────────────────────────────────────────────────────
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple
+
+
+class ConfigStub(NamedTuple):
+    """Comportamiento del servidor simulado."""
+
+    latencia: float = 0.2          # Segundos hasta el primer token
+    tokens_segundo: float = 0.0    # Velocidad de generación (0 = instantánea)
+    tasa_error: float = 0.0        # Probabilidad de responder 503
+    tasa_429: float = 0.0          # Probabilidad de responder 429
+    retry_after: float = 1.0       # Valor de la cabecera Retry-After en los 429
+    semilla: int | None = None     # Para errores reproducibles
+    conclusion: bool = False       # Añadir un párrafo final tras el plan 10
+
+
+_PLANES = [
+    ("Parque {c}", "Zona verde con columpios y mucho espacio para correr. Entrada gratuita."),
+    ("Museo de Ciencias", "Exposiciones interactivas para niños. Entrada de 3 € por persona."),
+    ("Casco antiguo", "Paseo por las calles históricas y sus plazas. Plan gratuito."),
+    ("Mercado central", "Productos locales y mucho ambiente. Bajo coste."),
+    ("Mirador de {c}", "Las mejores vistas de la ciudad al atardecer. Gratis."),
+    ("Biblioteca municipal", "Cuentacuentos infantiles los sábados por la mañana. Gratuito."),
+    ("Paseo del río", "Ruta llana ideal para bicis y carritos. Gratis."),
+    ("Jardín botánico", "Plantas de todo el mundo y un estanque con patos. 2 euros."),
+    ("Catedral de {c}", "Visita al templo y su entorno. Entrada libre a la nave principal."),
+    ("Planetario", "Proyecciones sobre el universo adaptadas a niños. Unos 4 €."),
+]
+
+
+def _ciudad(mensajes: list[dict]) -> str:
+    """Extrae la ciudad del prompt ('... para hacer en <ciudad> con niños')."""
+    texto = mensajes[-1].get("content", "") if mensajes else ""
+    inicio = texto.find(" en ")
+    fin = texto.find(" con niños")
+    if inicio >= 0 and fin > inicio:
+        return texto[inicio + 4:fin]
+    return "la ciudad"
+
+
+_CONCLUSION = (
+    "\n\n¡Espero que estos planes os ayuden a disfrutar de {c} en familia! "
+    "Recordad consultar los horarios antes de ir, llevar agua y crema solar "
+    "en verano y aprovechar los días de entrada gratuita de los museos. "
+    "Muchas de estas actividades se pueden combinar en una misma mañana."
+)
+
+
+def generar_respuesta(mensajes: list[dict], conclusion: bool = False) -> str:
+    """
+    Respuesta determinista con 10 planes, en JSON o en lista numerada. Con
+    `conclusion`, la lista termina con un párrafo que el prompt prohíbe,
+    como hacen a menudo los modelos reales.
+    """
+    ciudad = _ciudad(mensajes)
+    planes = [(t.format(c=ciudad), d) for t, d in _PLANES]
+    if "JSON" in (mensajes[-1].get("content", "") if mensajes else ""):
+        return json.dumps(
+            {"planes": [{"titulo": t, "descripcion": d, "coste": ""} for t, d in planes]},
+            ensure_ascii=False,
+        )
+    texto = "\n".join(f"{n}. **{t}**: {d}" for n, (t, d) in enumerate(planes, start=1))
+    return texto + _CONCLUSION.format(c=ciudad) if conclusion else texto
+
+
+def _aplicar_limites(tokens: list[str], peticion: dict) -> tuple[list[str], str]:
+    """
+    Recorta los tokens según `stop` y `max_tokens` de la petición.
+
+    Returns:
+        (tokens que se envían, finish_reason).
+    """
+    paradas = peticion.get("stop") or []
+    if isinstance(paradas, str):
+        paradas = [paradas]
+    texto = "".join(tokens)
+    posiciones = [texto.find(p) for p in paradas if p in texto]
+    if posiciones:
+        tokens = _tokens(texto[:min(posiciones)])
+    motivo = "stop"
+
+    max_tokens = peticion.get("max_tokens")
+    if max_tokens and len(tokens) > max_tokens:
+        tokens, motivo = tokens[:max_tokens], "length"
+    return tokens, motivo
+
+
+def _tokens(texto: str) -> list[str]:
+    """Trocea el texto en 'tokens' aproximados (palabras con su espacio)."""
+    tokens, actual = [], ""
+    for caracter in texto:
+        actual += caracter
+        if caracter in " \n":
+            tokens.append(actual)
+            actual = ""
+    if actual:
+        tokens.append(actual)
+    return tokens
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, como la API real
+    disable_nagle_algorithm = True  # Sin los ~40 ms de Nagle + ACK retardado
+    config: ConfigStub
+    azar: random.Random
+    lock_azar: threading.Lock
+
+    def log_message(self, *args):
+        pass  # Sin una línea por petición en la consola
+
+    def _responder(self, codigo: int, cuerpo: dict, cabeceras: dict | None = None):
+        datos = json.dumps(cuerpo).encode()
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(datos)))
+        for nombre, valor in (cabeceras or {}).items():
+            self.send_header(nombre, valor)
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        longitud = int(self.headers.get("Content-Length", 0))
+        peticion = json.loads(self.rfile.read(longitud) or b"{}")
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._responder(404, {"error": f"Ruta no soportada: {self.path}"})
+            return
+
+        config = self.config
+        with self.lock_azar:
+            sorteo = self.azar.random()
+
+        time.sleep(config.latencia)
+
+        if sorteo < config.tasa_429:
+            self._responder(
+                429,
+                {"error": "Rate limit reached"},
+                {"Retry-After": f"{config.retry_after:g}"},
+            )
+            return
+        if sorteo < config.tasa_429 + config.tasa_error:
+            self._responder(503, {"error": "Model is overloaded"})
+            return
+
+        texto = generar_respuesta(peticion.get("messages", []), config.conclusion)
+        tokens, motivo = _aplicar_limites(_tokens(texto), peticion)
+        texto = "".join(tokens)
+        modelo = peticion.get("model", "stub")
+        creado = int(time.time())
+
+        if not peticion.get("stream"):
+            if config.tokens_segundo > 0:
+                time.sleep(len(tokens) / config.tokens_segundo)
+            self._responder(200, {
+                "id": "stub",
+                "object": "chat.completion",
+                "created": creado,
+                "model": modelo,
+                "system_fingerprint": "stub",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": texto},
+                    "finish_reason": motivo,
+                }],
+                "usage": {
+                    "prompt_tokens": 0,
+                    "completion_tokens": len(tokens),
+                    "total_tokens": len(tokens),
+                },
+            })
+            return
+
+        # Streaming: un evento SSE por token, con codificación chunked
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        pausa = 1 / config.tokens_segundo if config.tokens_segundo > 0 else 0.0
+        for n, token in enumerate(tokens, start=1):
+            self._enviar_evento({
+                "id": "stub",
+                "object": "chat.completion.chunk",
+                "created": creado,
+                "model": modelo,
+                "system_fingerprint": "stub",
+                "choices": [{
+                    "index": 0,
+                    "delta": {"role": "assistant", "content": token},
+                    "finish_reason": motivo if n == len(tokens) else None,
+                }],
+            })
+            if pausa:
+                time.sleep(pausa)
+        self._enviar_trozo(b"data: [DONE]\n\n")
+        self._enviar_trozo(b"")
+
+    def _enviar_evento(self, evento: dict):
+        self._enviar_trozo(f"data: {json.dumps(evento)}\n\n".encode())
+
+    def _enviar_trozo(self, datos: bytes):
+        self.wfile.write(f"{len(datos):x}\r\n".encode() + datos + b"\r\n")
+        self.wfile.flush()
+
+
+class _Servidor(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # El cliente cierra conexiones keep-alive a su antojo (p. ej. tras
+        # un 503): no es un error del servidor.
+        pass
+
+
+def iniciar_servidor(config: ConfigStub, puerto: int = 0) -> tuple[_Servidor, str]:
+    """
+    Arranca el servidor en un hilo en segundo plano.
+
+    Args:
+        config: Comportamiento simulado.
+        puerto: Puerto local (0 = uno libre cualquiera).
+
+    Returns:
+        (servidor, url base). Llamar a servidor.shutdown() para pararlo.
+    """
+    manejador = type("Manejador", (_Manejador,), {
+        "config": config,
+        "azar": random.Random(config.semilla),
+        "lock_azar": threading.Lock(),
+    })
+    servidor = _Servidor(("127.0.0.1", puerto), manejador)
+    threading.Thread(target=servidor.serve_forever, name="servidor-stub", daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_address[1]}"
+
+
+def anadir_argumentos(parser: argparse.ArgumentParser):
+    """Argumentos de línea de comandos que configuran el servidor."""
+    parser.add_argument("--latencia", type=float, default=0.2, help="Segundos hasta el primer token.")
+    parser.add_argument("--tokens-segundo", type=float, default=0.0, help="Velocidad de generación (0 = instantánea).")
+    parser.add_argument("--tasa-error", type=float, default=0.0, help="Probabilidad de un 503.")
+    parser.add_argument("--tasa-429", type=float, default=0.0, help="Probabilidad de un 429.")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After de los 429 (segundos).")
+    parser.add_argument("--semilla", type=int, default=None, help="Semilla para los errores simulados.")
+    parser.add_argument(
+        "--conclusion",
+        action="store_true",
+        help="Terminar la lista con un párrafo de conclusión (texto que el prompt prohíbe).",
+    )
+
+
+def config_desde_argumentos(argumentos: argparse.Namespace) -> ConfigStub:
+    return ConfigStub(
+        latencia=argumentos.latencia,
+        tokens_segundo=argumentos.tokens_segundo,
+        tasa_error=argumentos.tasa_error,
+        tasa_429=argumentos.tasa_429,
+        retry_after=argumentos.retry_after,
+        semilla=argumentos.semilla,
+        conclusion=argumentos.conclusion,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor simulado de chat completions.")
+    parser.add_argument("--puerto", type=int, default=8089)
+    anadir_argumentos(parser)
+    argumentos = parser.parse_args()
+
+    servidor, url = iniciar_servidor(config_desde_argumentos(argumentos), argumentos.puerto)
+    print(f"🧪 Servidor simulado en {url}  (HF_BASE_URL={url})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        servidor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
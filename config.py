@@ -5,12 +5,44 @@
 # ─────────────────────────────────────────────────────────────────────────────
 
 import os
-from dotenv import load_dotenv
 
-# Carga el archivo .env si existe (útil en desarrollo local)
-# En producción o en PyCharm se puede definir la variable directamente
-# en la configuración de ejecución sin necesitar el archivo .env
-load_dotenv()
+from src.config import cargar_entorno
+
+# Carga el archivo .env si existe (útil en desarrollo local), una sola vez
+# aunque src/config.py también lo pida. En producción o en PyCharm se puede
+# definir la variable directamente en la configuración de ejecución sin
+# necesitar el archivo .env
+cargar_entorno()
+
+# ── Caché persistente de respuestas ──────────────────────────────────────────
+# Mismo fichero que usa la app de Streamlit, para compartir respuestas.
+CACHE_RUTA = os.getenv(
+    "CACHE_RUTA",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "planes.sqlite3"),
+)
+CACHE_TTL = 7 * 24 * 3600   # Segundos de vida de cada respuesta (7 días)
+CACHE_MAX_ENTRADAS = 5000   # Por encima se desalojan las menos usadas (LRU)
+
+# Snapshot de planes que exporta `main.py --exportar-snapshot` y que sirve
+# la app sin llamar al modelo (mismo fichero por defecto que src/config.py)
+SNAPSHOT_RUTA = os.getenv(
+    "SNAPSHOT_RUTA",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "planes.snapshot"),
+)
+
+# ── Servidor de inferencia ───────────────────────────────────────────────────
+# Si se define HF_BASE_URL, las consultas van a ese servidor compatible con
+# chat completions (p. ej. bench/servidor_stub.py) en lugar de a Hugging Face.
+URL_BASE_INFERENCIA = os.getenv("HF_BASE_URL") or None
+
+# Backend de inferencia (src/backends.py): "hf" (Hugging Face, con HF_TOKEN)
+# u "openai" (servidor compatible con la API de OpenAI en INFERENCIA_URL,
+# como llama.cpp o vLLM; sin HF_TOKEN). Mismas variables que la app.
+INFERENCIA_BACKEND = os.getenv("INFERENCIA_BACKEND", "hf")
+INFERENCIA_URL = os.getenv("INFERENCIA_URL", "http://127.0.0.1:8080/v1")
+INFERENCIA_API_KEY = os.getenv("INFERENCIA_API_KEY") or None
+INFERENCIA_MODELO = os.getenv("INFERENCIA_MODELO") or None
+INFERENCIA_TIMEOUT = float(os.getenv("INFERENCIA_TIMEOUT", "120"))
 
 
 def obtener_token() -> str:
@@ -3,9 +3,43 @@
 # Punto de entrada del asistente de planes familiares.
 # Ejecuta este archivo directamente desde PyCharm o desde la terminal:
 #   python main.py
+#
+# Modo por lotes (genera planes para muchas ciudades y los guarda en JSONL):
+#   python main.py --batch ciudades.txt --out planes.jsonl --workers 4
+#
+# Precalentar la caché de la app con las ciudades populares:
+#   python main.py --calentar [Madrid Bilbao ...]
+#
+# Empaquetar los planes generados por lotes en el snapshot que sirve la app:
+#   python main.py --exportar-snapshot [planes.snapshot] --desde planes.jsonl
+#
+# Buscar por palabras en los planes ya generados de todas las ciudades:
+#   python main.py --buscar "museos gratis"
 # ─────────────────────────────────────────────────────────────────────────────
 
-from asistente import obtener_planes
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from asistente import (
+    FORMATO_SALIDA,
+    MAX_TOKENS,
+    MODELO,
+    limitador_tasa,
+    obtener_planes_estructurados,
+    obtener_planes_stream,
+)
+from config import CACHE_MAX_ENTRADAS, CACHE_RUTA, CACHE_TTL, SNAPSHOT_RUTA
+from src.cache import normalizar_ciudad, obtener_cache
+from src.ciudades import canonizar
+from src.indice import IndicePlanes, abrir_indice_snapshot, buscar_en_indices, indexar_cache
+from src.metricas import EscritorJSONL, obtener_registro
+from src.planes import Plan, formatear_planes
+from src.presupuesto import obtener_presupuesto
+from src.snapshot import Snapshot, escribir_snapshot, obtener_snapshot
 
 
 def mostrar_bienvenida():
@@ -17,30 +51,451 @@ def mostrar_bienvenida():
     print()
 
 
-def mostrar_resultado(ciudad: str, planes: str):
+def mostrar_resultado(ciudad: str, planes):
     """
     Muestra los planes generados de forma formateada.
 
     Args:
         ciudad (str): Nombre de la ciudad consultada.
-        planes (str): Texto con los 10 planes devueltos por el modelo.
+        planes (list[Plan] | str): Planes validados (obtener_planes_estructurados)
+            o texto devuelto por el modelo.
     """
     print()
     print(f"✅ 10 planes familiares recomendados para: {ciudad.upper()}")
     print("-" * 60)
-    print(planes)
+    print(planes if isinstance(planes, str) else formatear_planes(planes))
     print("-" * 60)
     print()
 
 
+def mostrar_resultado_stream(ciudad: str, fragmentos) -> str:
+    """
+    Muestra los planes en vivo, a medida que el modelo los va generando.
+
+    Args:
+        ciudad (str): Nombre de la ciudad consultada.
+        fragmentos: Iterable de fragmentos de texto (obtener_planes_stream).
+
+    Returns:
+        str: Texto completo mostrado.
+    """
+    partes = []
+    cabecera_mostrada = False
+
+    for fragmento in fragmentos:
+        if not cabecera_mostrada:
+            print()
+            print(f"✅ 10 planes familiares recomendados para: {ciudad.upper()}")
+            print("-" * 60)
+            cabecera_mostrada = True
+        partes.append(fragmento)
+        print(fragmento, end="", flush=True)
+
+    print()
+    print("-" * 60)
+    print()
+    return "".join(partes)
+
+
+def leer_ciudades(ruta: str) -> list[str]:
+    """
+    Lee la lista de ciudades del modo por lotes (una por línea).
+
+    Se ignoran las líneas vacías, los comentarios (#), las que no
+    contienen ninguna ciudad (", España") y las ciudades repetidas.
+
+    Args:
+        ruta (str): Fichero de texto con las ciudades.
+
+    Returns:
+        list[str]: Ciudades en el orden del fichero.
+    """
+    ciudades = []
+    vistas = set()
+
+    with open(ruta, encoding="utf-8") as fichero:
+        for linea in fichero:
+            ciudad = linea.strip()
+            if not ciudad or ciudad.startswith("#") or canonizar(ciudad) is None:
+                continue
+            clave = normalizar_ciudad(ciudad)
+            if clave not in vistas:
+                vistas.add(clave)
+                ciudades.append(canonizar(ciudad))
+
+    return ciudades
+
+
+def leer_completadas(ruta_salida: str) -> set[str]:
+    """
+    Devuelve las ciudades ya generadas en un fichero JSONL de salida.
+
+    Si la ejecución anterior se interrumpió a mitad de una línea, esa línea
+    incompleta se elimina para poder seguir añadiendo resultados.
+
+    Args:
+        ruta_salida (str): Fichero JSONL de resultados.
+
+    Returns:
+        set[str]: Nombres normalizados de las ciudades completadas.
+    """
+    completadas = set()
+    if not os.path.exists(ruta_salida):
+        return completadas
+
+    with open(ruta_salida, "rb+") as fichero:
+        contenido = fichero.read()
+        fin_valido = contenido.rfind(b"\n") + 1
+        if fin_valido < len(contenido):
+            fichero.truncate(fin_valido)
+
+    for linea in contenido[:fin_valido].decode("utf-8").splitlines():
+        try:
+            completadas.add(normalizar_ciudad(json.loads(linea)["ciudad"]))
+        except (ValueError, KeyError, TypeError):
+            continue
+
+    return completadas
+
+
+def ejecutar_lote(ruta_ciudades: str, ruta_salida: str, workers: int):
+    """
+    Genera planes para todas las ciudades de un fichero usando un grupo de
+    hilos y va escribiendo cada resultado en JSONL en cuanto termina. Cada
+    línea lleva los planes ya estructurados (num, titulo, descripcion, coste).
+
+    Las ciudades ya presentes en el fichero de salida se omiten, por lo que
+    una ejecución interrumpida puede reanudarse con el mismo comando. Los
+    fallos se registran en '<salida>.errores.jsonl' y se reintentan en la
+    siguiente ejecución.
+
+    Args:
+        ruta_ciudades (str): Fichero con una ciudad por línea.
+        ruta_salida (str): Fichero JSONL de resultados.
+        workers (int): Número de hilos (consultas simultáneas).
+    """
+    ciudades = leer_ciudades(ruta_ciudades)
+    completadas = leer_completadas(ruta_salida)
+    pendientes = [c for c in ciudades if normalizar_ciudad(c) not in completadas]
+
+    print(f"📋 {len(ciudades)} ciudades · {len(ciudades) - len(pendientes)} ya generadas "
+          f"· {len(pendientes)} pendientes · {workers} hilos")
+    print()
+
+    if not pendientes:
+        return
+
+    ruta_errores = f"{os.path.splitext(ruta_salida)[0]}.errores.jsonl"
+    correctas = fallidas = 0
+
+    with open(ruta_salida, "a", encoding="utf-8") as salida, \
+            open(ruta_errores, "a", encoding="utf-8") as errores, \
+            ThreadPoolExecutor(max_workers=workers) as grupo:
+
+        futuros = {
+            grupo.submit(obtener_planes_estructurados, ciudad, mostrar_progreso=False): ciudad
+            for ciudad in pendientes
+        }
+
+        try:
+            for n, futuro in enumerate(as_completed(futuros), start=1):
+                ciudad = futuros[futuro]
+                marca = time.strftime("%Y-%m-%dT%H:%M:%S")
+
+                try:
+                    planes = [plan.a_dict() for plan in futuro.result()]
+                    registro = {"ciudad": ciudad, "planes": planes, "generado": marca}
+                    destino = salida
+                    correctas += 1
+                    print(f"   [{n}/{len(pendientes)}] ✅ {ciudad}")
+                except Exception as e:
+                    registro = {"ciudad": ciudad, "error": f"{type(e).__name__}: {e}", "generado": marca}
+                    destino = errores
+                    fallidas += 1
+                    print(f"   [{n}/{len(pendientes)}] ❌ {ciudad}: {type(e).__name__}")
+
+                # Solo escribe el hilo principal: cada línea queda completa
+                destino.write(json.dumps(registro, ensure_ascii=False) + "\n")
+                destino.flush()
+
+        except KeyboardInterrupt:
+            print("\n\n👋 Lote interrumpido. Vuelve a ejecutar el mismo comando para reanudarlo.")
+            grupo.shutdown(wait=False, cancel_futures=True)
+
+    limitador = limitador_tasa().estadisticas()
+    print()
+    print(f"✅ {correctas} generadas · ❌ {fallidas} con error (ver {ruta_errores})")
+    print(f"⏱️  Limitador ({limitador['tasa']:g} pet/s, ráfaga {limitador['rafaga']}): "
+          f"{limitador['esperas']}/{limitador['adquisiciones']} peticiones esperaron · "
+          f"media {limitador['espera_media']:.2f}s · máx. {limitador['espera_maxima']:.2f}s")
+    presupuesto = obtener_presupuesto(MAX_TOKENS).estadisticas(MODELO, FORMATO_SALIDA)
+    print(f"✂️  Presupuesto de salida: max_tokens {presupuesto['max_tokens']} "
+          f"(tope {presupuesto['tope']}) tras {presupuesto['muestras']} respuestas completas")
+
+
+def leer_resultados(rutas: list[str]):
+    """
+    Lee los planes de uno o varios ficheros JSONL del modo por lotes.
+
+    Las líneas incompletas o sin planes se ignoran.
+
+    Args:
+        rutas (list[str]): Ficheros JSONL de resultados (--out de --batch).
+
+    Yields:
+        tuple[str, list[Plan]]: Ciudad y sus planes, en el orden del fichero.
+    """
+    for ruta in rutas:
+        with open(ruta, encoding="utf-8") as fichero:
+            for linea in fichero:
+                try:
+                    registro = json.loads(linea)
+                    planes = [Plan(**plan) for plan in registro["planes"]]
+                    ciudad = canonizar(registro["ciudad"])
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if ciudad is None:
+                    continue
+                yield ciudad, planes
+
+
+def exportar_snapshot(ruta_snapshot: str, rutas_resultados: list[str]):
+    """
+    Empaqueta los planes generados por lotes en un snapshot de solo lectura
+    (src/snapshot.py) que la app sirve sin llamar al modelo.
+
+    El fichero se sustituye de forma atómica: una app en marcha pasa al
+    nuevo snapshot sin reiniciarse.
+
+    Args:
+        ruta_snapshot (str): Fichero de destino.
+        rutas_resultados (list[str]): Ficheros JSONL del modo por lotes.
+    """
+    inicio = time.perf_counter()
+    ciudades = escribir_snapshot(ruta_snapshot, leer_resultados(rutas_resultados))
+    tamano = os.path.getsize(ruta_snapshot)
+    print(f"📦 Snapshot con {ciudades} ciudades en {ruta_snapshot} "
+          f"({tamano / 1024:.0f} KB, {time.perf_counter() - inicio:.2f}s)")
+
+    # Su índice de búsqueda por palabras, para que --buscar no lo construya
+    inicio = time.perf_counter()
+    indice, _ = abrir_indice_snapshot(Snapshot(ruta_snapshot))
+    print(f"🔎 Índice de búsqueda con {len(indice)} planes en {indice.ruta} "
+          f"({time.perf_counter() - inicio:.2f}s)")
+
+
+def buscar_en_planes(consulta: str, limite: int = 10):
+    """
+    Busca por palabras en los planes ya generados de todas las ciudades (la
+    caché compartida con la app y el snapshot), sin llamar al modelo.
+
+    El índice del snapshot se guarda junto a él (lo escribe
+    --exportar-snapshot) y se abre con mmap; solo las ciudades de la caché
+    que no están en el snapshot se indexan en cada llamada.
+
+    Args:
+        consulta (str): Palabras a buscar ("museos gratis").
+        limite (int): Número máximo de planes que se muestran.
+    """
+    indices = []
+    snapshot = obtener_snapshot(SNAPSHOT_RUTA).actual()
+    if snapshot is not None:
+        inicio = time.perf_counter()
+        indice_snapshot, construido = abrir_indice_snapshot(snapshot)
+        indices.append(indice_snapshot)
+        accion = "construido y guardado" if construido else "abierto"
+        print(f"   Índice del snapshot ({indice_snapshot.ciudades()} ciudades): {accion} "
+              f"en {(time.perf_counter() - inicio) * 1000:.1f} ms")
+
+    inicio = time.perf_counter()
+    indice_cache = IndicePlanes()
+    indexar_cache(indice_cache, obtener_cache(CACHE_RUTA, CACHE_TTL, CACHE_MAX_ENTRADAS), omitir=snapshot)
+    indices.append(indice_cache)
+    print(f"   Caché fuera del snapshot ({indice_cache.ciudades()} ciudades): indexada "
+          f"en {(time.perf_counter() - inicio) * 1000:.1f} ms")
+
+    inicio = time.perf_counter()
+    resultados = buscar_en_indices(indices, consulta, limite)
+    busqueda = time.perf_counter() - inicio
+
+    print(f"🔎 '{consulta}': {len(resultados)} planes · búsqueda en {busqueda * 1000:.1f} ms")
+    print("-" * 60)
+    if not resultados:
+        print("No hay planes con esas palabras. Genera más ciudades con --batch.")
+    for n, resultado in enumerate(resultados, start=1):
+        plan = resultado.plan
+        coste = f" [{plan.coste}]" if plan.coste else ""
+        print(f"{n:>2}. 📍 {resultado.ciudad} · {plan.titulo}{coste}")
+        print(f"    {plan.descripcion}")
+    print("-" * 60)
+
+
+def calentar_cache(ciudades: list[str]):
+    """
+    Genera en primer plano las ciudades populares (o las indicadas) que no
+    estén en la caché, con el mismo prompt que la app de Streamlit, para que
+    sus primeras búsquedas se respondan desde la caché.
+
+    Args:
+        ciudades (list[str]): Ciudades a generar; vacía = las populares.
+    """
+    # Importación diferida: src.asistente trae todo lo de la app (asyncio,
+    # coalescencia, cobertura, índice, snapshot) y solo lo usa --calentar;
+    # importarlo arriba alargaría cada arranque de main.py (bench_arranque)
+    from src.asistente import calentamiento_cache
+
+    iconos = {"generada": "✅", "en_cache": "⚡", "error": "❌"}
+
+    def al_calentar(ciudad, resultado):
+        print(f"   {iconos[resultado]} {ciudad} ({resultado.replace('_', ' ')})")
+
+    calentamiento = calentamiento_cache(ciudades or None, al_calentar)
+    print(f"🔥 Precalentando la caché con {len(calentamiento.ciudades)} ciudades...\n")
+    calentamiento.ejecutar()
+
+    estado = calentamiento.estadisticas()
+    print()
+    print(f"✅ {estado['generadas']} generadas · ⚡ {estado['en_cache']} ya en caché · "
+          f"❌ {estado['errores']} con error")
+
+
+def parsear_argumentos(argumentos=None) -> argparse.Namespace:
+    """Define y lee los argumentos de la línea de comandos."""
+    parser = argparse.ArgumentParser(
+        description="Asistente de planes familiares con IA.",
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="CIUDADES",
+        help="Fichero con una ciudad por línea para generar planes en lote.",
+    )
+    parser.add_argument(
+        "--out",
+        metavar="SALIDA",
+        default="planes.jsonl",
+        help="Fichero JSONL de resultados del modo por lotes (por defecto: planes.jsonl).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Número de consultas simultáneas en el modo por lotes (por defecto: 4).",
+    )
+    parser.add_argument(
+        "--calentar",
+        nargs="*",
+        metavar="CIUDAD",
+        help="Precalienta la caché de la app con estas ciudades "
+             "(sin ciudades: las populares de src/config.py).",
+    )
+    parser.add_argument(
+        "--exportar-snapshot",
+        nargs="?",
+        const=SNAPSHOT_RUTA,
+        metavar="FICHERO",
+        help="Empaqueta los planes de --desde en el snapshot que sirve la app "
+             "(por defecto: el de config.py).",
+    )
+    parser.add_argument(
+        "--desde",
+        nargs="+",
+        metavar="JSONL",
+        default=["planes.jsonl"],
+        help="Ficheros de resultados del modo por lotes para --exportar-snapshot "
+             "(por defecto: planes.jsonl).",
+    )
+    parser.add_argument(
+        "--buscar",
+        metavar="CONSULTA",
+        help="Busca por palabras en los planes ya generados de todas las ciudades "
+             "(caché y snapshot), sin llamar al modelo.",
+    )
+    parser.add_argument(
+        "--metricas",
+        metavar="FICHERO",
+        help="Añade a este fichero la duración de cada fase (token, caché, llamada, "
+             "validación...) como líneas JSON, y un resumen al terminar.",
+    )
+    return parser.parse_args(argumentos)
+
+
+def abrir_metricas(ruta: str):
+    """
+    Empieza a escribir las métricas de cada fase en un fichero JSONL.
+
+    Returns:
+        Función que escribe el resumen final y cierra el fichero.
+    """
+    fichero = open(ruta, "a", encoding="utf-8")
+    escritor = EscritorJSONL(fichero)
+    registro = obtener_registro()
+    registro.suscribir(escritor)
+
+    def cerrar():
+        registro.cancelar_suscripcion(escritor)
+        resumen = {"resumen": registro.instantanea(), "ts": time.time()}
+        fichero.write(json.dumps(resumen, ensure_ascii=False) + "\n")
+        fichero.close()
+
+    return cerrar
+
+
 def main():
     """Función principal: gestiona el flujo completo de la aplicación."""
+    argumentos = parsear_argumentos()
     mostrar_bienvenida()
 
+    cerrar_metricas = None
+    if argumentos.metricas:
+        try:
+            cerrar_metricas = abrir_metricas(argumentos.metricas)
+        except OSError as e:
+            print(f"❌ No se pudo abrir el fichero de métricas: {e}")
+            sys.exit(1)
+
+    try:
+        ejecutar(argumentos)
+    finally:
+        if cerrar_metricas:
+            cerrar_metricas()
+
+
+def ejecutar(argumentos: argparse.Namespace):
+    """
+    Ejecuta el modo por lotes, el precalentamiento, la exportación del
+    snapshot, la búsqueda por palabras o el modo interactivo.
+    """
+    if argumentos.calentar is not None:
+        calentar_cache(argumentos.calentar)
+        return
+
+    if argumentos.buscar:
+        buscar_en_planes(argumentos.buscar)
+        return
+
+    if argumentos.exportar_snapshot:
+        try:
+            exportar_snapshot(argumentos.exportar_snapshot, argumentos.desde)
+        except OSError as e:
+            print(f"❌ No se pudo leer o escribir el fichero: {e}")
+            sys.exit(1)
+        return
+
+    if argumentos.batch:
+        if argumentos.workers < 1:
+            print("❌ --workers debe ser al menos 1.")
+            sys.exit(2)
+        try:
+            ejecutar_lote(argumentos.batch, argumentos.out, argumentos.workers)
+        except OSError as e:
+            print(f"❌ No se pudo leer o escribir el fichero: {e}")
+            sys.exit(1)
+        return
+
     # ── Solicitar la ciudad al usuario ───────────────────────────────────────
     ciudad = input("📍 Ingresa el nombre de una ciudad: ").strip()
 
-    if not ciudad:
+    if canonizar(ciudad) is None:
         print("❌ No ingresaste ninguna ciudad. Por favor, vuelve a ejecutar el programa.")
         return
 
@@ -50,8 +505,7 @@ def main():
 
     # ── Llamar al asistente y manejar errores ────────────────────────────────
     try:
-        planes = obtener_planes(ciudad)
-        mostrar_resultado(ciudad, planes)
+        mostrar_resultado_stream(ciudad, obtener_planes_stream(ciudad))
 
     except EnvironmentError as e:
         # El token HF_TOKEN no está configurado
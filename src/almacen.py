@@ -0,0 +1,114 @@
+# src/almacen.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Almacén de resultados compartido por todas las sesiones de la app.
+# Antes, cada sesión guardaba en st.session_state.historial su propia copia
+# de cada respuesta: con cientos de sesiones, los planes de Madrid estaban en
+# memoria cientos de veces. Aquí cada resultado se guarda una sola vez,
+# direccionado por el hash de su contenido, con un límite de memoria y
+# desalojo LRU; las sesiones solo guardan las claves.
+# Sin dependencias de Streamlit.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+from src.planes import Plan, planes_a_json
+
+# Bytes que se suman a cada entrada por los objetos de Python que la rodean
+_SOBRECARGA_ENTRADA = 200
+
+
+def _serializar(valor: list[Plan] | str) -> str:
+    return valor if isinstance(valor, str) else planes_a_json(valor)
+
+
+class AlmacenResultados:
+    """
+    Diccionario LRU de resultados (lista de Plan o texto plano) por el hash
+    de su contenido, con un tope aproximado de bytes.
+
+    El tamaño de cada entrada se estima con su serialización en UTF-8; los
+    objetos se comparten entre sesiones, así que no se deben modificar.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entradas: OrderedDict[str, tuple[list[Plan] | str, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._contadores = {"aciertos": 0, "fallos": 0, "desalojos": 0}
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+    def __contains__(self, clave: str) -> bool:
+        return clave in self._entradas
+
+    def guardar(self, valor: list[Plan] | str) -> str:
+        """
+        Guarda un resultado (si no estaba ya) y lo marca como el más reciente.
+
+        Returns:
+            Clave del resultado: la misma para contenidos iguales.
+        """
+        datos = _serializar(valor).encode("utf-8")
+        prefijo = "t" if isinstance(valor, str) else "p"
+        clave = f"{prefijo}:{hashlib.sha256(datos).hexdigest()[:24]}"
+
+        with self._lock:
+            if clave in self._entradas:
+                self._entradas.move_to_end(clave)
+                return clave
+            tamano = len(datos) + _SOBRECARGA_ENTRADA
+            self._entradas[clave] = (valor, tamano)
+            self._bytes += tamano
+            # Se desaloja lo menos usado, pero nunca la entrada recién guardada
+            while self._bytes > self.max_bytes and len(self._entradas) > 1:
+                _, (_, liberado) = self._entradas.popitem(last=False)
+                self._bytes -= liberado
+                self._contadores["desalojos"] += 1
+        return clave
+
+    def obtener(self, clave: str) -> list[Plan] | str | None:
+        """
+        Devuelve el resultado de una clave y lo marca como el más reciente.
+
+        Returns:
+            El resultado, o None si nunca se guardó o ya se desalojó.
+        """
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self._contadores["fallos"] += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self._contadores["aciertos"] += 1
+            return entrada[0]
+
+    def estadisticas(self) -> dict:
+        """Entradas, bytes ocupados, tope y contadores de aciertos y desalojos."""
+        with self._lock:
+            return {
+                "entradas": len(self._entradas),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                **self._contadores,
+            }
+
+
+# ── Instancia compartida por proceso ─────────────────────────────────────────
+_almacen: AlmacenResultados | None = None
+_lock_almacen = threading.Lock()
+
+
+def obtener_almacen(max_bytes: int) -> AlmacenResultados:
+    """
+    Devuelve el almacén del proceso, creándolo la primera vez (max_bytes
+    solo se usa entonces).
+    """
+    global _almacen
+    with _lock_almacen:
+        if _almacen is None:
+            _almacen = AlmacenResultados(max_bytes)
+        return _almacen
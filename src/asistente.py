@@ -1,124 +1,990 @@
 # src/asistente.py
 # ─────────────────────────────────────────────────────────────────────────────
-# Lógica del asistente: construye el prompt y llama a la API de Hugging Face.
+# Lógica del asistente: construye el prompt y llama al modelo a través del
+# backend de inferencia configurado (src/backends.py).
 # Adaptado para Streamlit (sin prints, devuelve resultados/errores limpios).
 # ─────────────────────────────────────────────────────────────────────────────
 
+import asyncio
+import threading
 import time
-from huggingface_hub import InferenceClient
-from huggingface_hub.errors import HfHubHTTPError
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
+from src.backends import obtener_backend
+from src.cache import clave_cache, obtener_cache
+from src.calentamiento import Calentamiento
+from src.ciudades import exigir_ciudad
+from src.coalescencia import GrupoVuelo, VueloAbandonadoError
+from src.hedging import RegistroLatencias, ejecutar_con_cobertura
+from src.indice import IndicePlanes, cambiar_snapshot, cargar_indice, obtener_indice_planes
+from src.limitador import obtener_limitador
+from src.metricas import registrar_uso, tramo
+from src.planes import (
+    Plan,
+    construir_prompt,
+    formatear_planes,
+    planes_a_json,
+    planes_desde_json,
+    validar_planes,
+)
+from src.presupuesto import PARADAS, CorteDecimoPlan, obtener_presupuesto
+from src.reintentos import ReintentosAgotadosError, obtener_politica
+from src.snapshot import obtener_snapshot
 from src.config import (
     obtener_token,
     MODELO,
     MAX_TOKENS,
     TEMPERATURA,
     REINTENTOS,
-    ESPERA_ENTRE_REINTENTOS,
+    ESPERA_BASE_REINTENTO,
+    ESPERA_MAXIMA_REINTENTO,
+    UMBRAL_CIRCUITO,
+    ENFRIAMIENTO_CIRCUITO,
+    LIMITE_PETICIONES_SEGUNDO,
+    LIMITE_RAFAGA,
+    MODELOS_RESPALDO,
+    HEDGING_ACTIVO,
+    HEDGING_PERCENTIL,
+    HEDGING_RETRASO_INICIAL,
+    CACHE_RUTA,
+    CACHE_TTL,
+    CACHE_TTL_SUAVE,
+    CACHE_MAX_ENTRADAS,
+    SNAPSHOT_RUTA,
+    SNAPSHOT_INTERVALO,
+    REVALIDACION_CONCURRENCIA,
+    MAX_CONCURRENCIA,
+    FORMATO_SALIDA,
+    URL_BASE_INFERENCIA,
+    INFERENCIA_BACKEND,
+    INFERENCIA_URL,
+    INFERENCIA_API_KEY,
+    INFERENCIA_MODELO,
+    INFERENCIA_TIMEOUT,
+    PRESUPUESTO_ADAPTATIVO,
+    PRESUPUESTO_MARGEN,
+    PRESUPUESTO_MINIMO,
+    PRESUPUESTO_MUESTRAS_ARRANQUE,
+    PRESUPUESTO_MUESTREO_COLA,
+    CIUDADES_POPULARES,
+    CALENTAMIENTO_CONCURRENCIA,
+    CALENTAMIENTO_FICHAS_MINIMAS,
+    CALENTAMIENTO_INTERVALO,
 )
 
 
-def construir_prompt(ciudad: str) -> list[dict]:
+def _clave_cache(ciudad: str, formato: str = "texto") -> str:
+    """
+    Clave de caché de una ciudad.
+
+    El prompt se hashea como plantilla (con un marcador en lugar de la
+    ciudad) y la ciudad se normaliza (src/ciudades.py) para que 'lugo',
+    'Lugo' y 'Lugo, España' compartan la misma entrada. Cada
+    formato de salida tiene su propia entrada.
+    """
+    plantilla = construir_prompt("{ciudad}", formato)
+    return clave_cache(ciudad, plantilla, MODELO, MAX_TOKENS, TEMPERATURA)
+
+
+# Generaciones en curso, compartidas por todas las sesiones del proceso
+_vuelos = GrupoVuelo()
+
+
+def estadisticas_coalescencia() -> dict:
+    """Contadores de la coalescencia de peticiones (ver GrupoVuelo.estadisticas)."""
+    return _vuelos.estadisticas()
+
+
+def snapshot_planes():
+    """
+    Snapshot de planes precalculados del proceso (src/snapshot.py); se
+    recarga solo cuando se exporta uno nuevo.
+    """
+    return obtener_snapshot(SNAPSHOT_RUTA, SNAPSHOT_INTERVALO)
+
+
+def _consultar_snapshot(ciudad: str, usar_cache: bool) -> list[Plan] | None:
+    """
+    Planes de una ciudad en el snapshot precalculado, antes que la caché:
+    sin llamada al modelo ni consulta a SQLite.
+    """
+    if not usar_cache:
+        return None
+    with tramo("snapshot") as t:
+        encontrado = snapshot_planes().buscar(ciudad)
+        t.etiquetas["resultado"] = "fallo" if encontrado is None else "acierto"
+    return encontrado[1] if encontrado else None
+
+
+def _consultar_cache(clave: str, usar_cache: bool):
+    """
+    Busca una clave en la caché persistente.
+
+    Returns:
+        (cache, entrada): la caché (None si usar_cache es False) y la
+        entrada encontrada (o None).
+    """
+    if not usar_cache:
+        return None, None
+    with tramo("cache") as t:
+        cache = obtener_cache(CACHE_RUTA, CACHE_TTL, CACHE_MAX_ENTRADAS)
+        entrada = cache.obtener(clave)
+        if entrada is None:
+            t.etiquetas["resultado"] = "fallo"
+        else:
+            t.etiquetas["resultado"] = "obsoleta" if _obsoleta(entrada) else "acierto"
+    return cache, entrada
+
+
+def _guardar_respuesta(cache, clave: str, ciudad: str, texto: str, modelo: str, planes: list[Plan]):
+    """
+    Guarda una respuesta nueva en la caché (si se usa) y actualiza con sus
+    planes el índice de búsqueda por palabras.
+    """
+    if cache is not None:
+        cache.guardar(clave, ciudad, texto, modelo, planes_a_json(planes))
+    if planes:
+        obtener_indice_planes().anadir(ciudad, planes)
+
+
+# ── Índice de búsqueda por palabras (src/indice.py) ──────────────────────────
+_lock_indice = threading.Lock()
+_indice_cargado = False
+_snapshot_indexado = None
+
+
+def indice_planes() -> IndicePlanes:
+    """
+    Índice invertido de los planes ya generados, compartido por el proceso.
+
+    La primera vez se llena con la caché persistente y el snapshot; después
+    se actualiza con cada respuesta nueva (_guardar_respuesta) y, si se
+    exporta un snapshot nuevo, con sus ciudades (quitando las que ya no
+    trae).
+    """
+    global _indice_cargado, _snapshot_indexado
+    indice = obtener_indice_planes()
+    snapshot = snapshot_planes().actual()
+    if _indice_cargado and snapshot is _snapshot_indexado:
+        return indice
+
+    with _lock_indice:
+        if not _indice_cargado:
+            with tramo("indexado", fuente="cache"):
+                cargar_indice(indice, cache=obtener_cache(CACHE_RUTA, CACHE_TTL, CACHE_MAX_ENTRADAS))
+            _indice_cargado = True
+        if snapshot is not _snapshot_indexado:
+            # Las ciudades que el snapshot nuevo ya no trae salen del índice
+            with tramo("indexado", fuente="snapshot"):
+                cambiar_snapshot(
+                    indice, _snapshot_indexado, snapshot,
+                    cache=obtener_cache(CACHE_RUTA, CACHE_TTL, CACHE_MAX_ENTRADAS),
+                )
+            _snapshot_indexado = snapshot
+    return indice
+
+
+def buscar_en_planes(consulta: str, limite: int = 20, ciudad: str | None = None):
     """
-    Construye el prompt con sistema + usuario para el chat del modelo.
+    Busca por palabras en los planes de todas las ciudades ya generadas,
+    sin llamar al modelo.
 
     Args:
-        ciudad: Nombre de la ciudad objetivo.
+        consulta: Palabras a buscar ("museos gratis", "parques con niños").
+        limite: Número máximo de resultados.
+        ciudad: Si se indica, solo en los planes de esa ciudad.
 
     Returns:
-        Lista de mensajes en formato chat.
+        list[ResultadoBusqueda]: Planes ordenados por relevancia (BM25).
     """
-    mensaje_sistema = (
-        "Eres un asistente de viajes familiar experto en turismo sostenible y "
-        "de bajo coste. Respondes siempre en español, de forma clara, amigable "
-        "y bien estructurada. Cada plan que sugieres debe ser apto para niños, "
-        "adecuado para toda la familia y gratuito o de muy bajo coste."
-    )
+    indice = indice_planes()
+    with tramo("busqueda_planes"):
+        return indice.buscar(consulta, limite, ciudad)
 
-    mensaje_usuario = (
-        f"Dame exactamente 10 planes recomendados para hacer en {ciudad} "
-        f"con niños y en familia, que sean gratuitos o de muy bajo coste.\n\n"
-        f"Formato de respuesta obligatorio:\n"
-        f"1. **[Nombre del plan]**: [Descripción breve de 1-2 oraciones. "
-        f"Indica si es gratuito o el coste aproximado.]\n"
-        f"2. ...\n"
-        f"...\n"
-        f"10. ...\n\n"
-        f"No añadas texto introductorio ni conclusión, solo la lista numerada "
-        f"del 1 al 10."
-    )
 
-    return [
-        {"role": "system", "content": mensaje_sistema},
-        {"role": "user", "content": mensaje_usuario},
-    ]
+# ── Stale-while-revalidate ───────────────────────────────────────────────────
+# Una entrada con más de CACHE_TTL_SUAVE segundos se sigue sirviendo al
+# momento, pero se regenera en segundo plano para la próxima consulta.
+# Pasado CACHE_TTL la caché ya no la devuelve y la consulta espera al modelo.
+_revalidaciones = ThreadPoolExecutor(
+    max_workers=REVALIDACION_CONCURRENCIA, thread_name_prefix="revalidacion"
+)
+
+
+def _obsoleta(entrada) -> bool:
+    """Si una entrada de caché ha pasado su TTL suave."""
+    return time.time() - entrada.creado > CACHE_TTL_SUAVE
+
+
+def _revalidar_si_obsoleta(entrada, ciudad: str, formato: str, clave: str, cache):
+    """
+    Si la entrada está obsoleta, lanza su regeneración en segundo plano
+    (una sola vez aunque la pidan varias sesiones a la vez).
+    """
+    if not _obsoleta(entrada):
+        return
+    # El vuelo deduplica la regeneración y hace que una sesión que pida la
+    # ciudad sin caché (usar_cache=False) espere a este resultado
+    vuelo = _vuelos.liderar(clave)
+    if vuelo is not None:
+        _revalidaciones.submit(_revalidar, ciudad, formato, clave, cache, vuelo)
+
+
+def _revalidar(ciudad: str, formato: str, clave: str, cache, vuelo):
+    """Regenera una ciudad fuera de la petición y reemplaza su entrada."""
+    try:
+        with tramo("revalidacion", formato=formato):
+            texto, modelo = _generar(construir_prompt(ciudad, formato), None, formato)
+            planes = validar_planes(texto, formato)
+            _guardar_respuesta(cache, clave, ciudad, texto, modelo, planes)
+    except BaseException as e:
+        # La entrada antigua sigue sirviéndose hasta que caduque del todo
+        _vuelos.completar(clave, vuelo, error=e)
+        return
+    _vuelos.completar(clave, vuelo, resultado=(texto, planes))
+
+
+def _planes_de_entrada(entrada, formato: str) -> list[Plan]:
+    """Planes de una entrada de caché (las antiguas no los guardaban)."""
+    if entrada.planes:
+        return planes_desde_json(entrada.planes)
+    return validar_planes(entrada.texto, formato)
+
+
+def _resolver(
+    ciudad: str,
+    formato: str,
+    callback_estado=None,
+    usar_cache: bool = True,
+) -> tuple[str, list[Plan]]:
+    """
+    Devuelve el texto y los planes de una ciudad: de la caché, de otra
+    sesión que ya la esté generando o llamando al modelo.
+
+    Returns:
+        (texto de la respuesta, planes validados).
+    """
+    ciudad = exigir_ciudad(ciudad)
+    with tramo("total", formato=formato) as total:
+        planes = _consultar_snapshot(ciudad, usar_cache)
+        if planes:
+            total.etiquetas["cache"] = "snapshot"
+            return formatear_planes(planes), planes
+
+        mensajes = construir_prompt(ciudad, formato)
+        clave = _clave_cache(ciudad, formato)
+
+        cache, entrada = _consultar_cache(clave, usar_cache)
+        total.etiquetas["cache"] = "acierto" if entrada else "fallo"
+        if entrada:
+            _revalidar_si_obsoleta(entrada, ciudad, formato, clave, cache)
+            return entrada.texto, _planes_de_entrada(entrada, formato)
+
+        def generar() -> tuple[str, list[Plan]]:
+            texto, modelo = _generar(mensajes, callback_estado, formato)
+            with tramo("validacion", formato=formato):
+                planes = validar_planes(texto, formato)
+            _guardar_respuesta(cache, clave, ciudad, texto, modelo, planes)
+            return texto, planes
+
+        return _vuelos.ejecutar(clave, generar)
 
 
-def obtener_planes(ciudad: str, callback_estado=None) -> str:
+def obtener_planes(ciudad: str, callback_estado=None, usar_cache: bool = True) -> str:
     """
     Consulta el LLM en Hugging Face y devuelve 10 planes familiares.
 
+    Antes de llamar al modelo se consultan el snapshot de planes
+    precalculados (src/snapshot.py) y la caché persistente compartida;
+    las respuestas nuevas se guardan en ella. Si otra sesión ya está
+    generando la misma ciudad, se espera a su resultado en lugar de lanzar
+    una segunda llamada al modelo. Una respuesta con más de CACHE_TTL_SUAVE
+    segundos se devuelve igualmente y se regenera en segundo plano.
+
     Args:
         ciudad: Nombre de la ciudad.
         callback_estado: Función opcional para reportar estado (ej. st.status).
+        usar_cache: Si es False, se ignora la caché y se consulta al modelo.
 
     Returns:
         Texto con los 10 planes recomendados.
 
     Raises:
         ConnectionError: Si falla la API tras los reintentos.
-        ValueError: Si la respuesta está vacía.
+        ValueError: Si el texto no contiene una ciudad o la respuesta
+            está vacía.
         EnvironmentError: Si falta el token.
     """
-    token = obtener_token()
-    cliente = InferenceClient(token=token)
-    mensajes = construir_prompt(ciudad)
+    texto, _ = _resolver(ciudad, "texto", callback_estado, usar_cache)
+    return texto
 
-    for intento in range(1, REINTENTOS + 1):
-        try:
-            if callback_estado:
-                callback_estado(f"Consultando al modelo (intento {intento}/{REINTENTOS})...")
 
+def obtener_planes_estructurados(
+    ciudad: str,
+    callback_estado=None,
+    usar_cache: bool = True,
+    formato: str = FORMATO_SALIDA,
+) -> list[Plan]:
+    """
+    Igual que obtener_planes, pero devuelve los planes ya validados.
+
+    Por defecto pide la respuesta en JSON (FORMATO_SALIDA), de modo que no
+    depende de que el modelo respete el formato de la lista numerada.
+
+    Args:
+        ciudad: Nombre de la ciudad.
+        callback_estado: Función opcional para reportar estado (ej. st.status).
+        usar_cache: Si es False, se ignora la caché y se consulta al modelo.
+        formato: "json" o "texto".
+
+    Returns:
+        Lista de Plan.
+
+    Raises:
+        ConnectionError: Si falla la API tras los reintentos.
+        ValueError: Si el texto no contiene una ciudad o la respuesta
+            está vacía o no contiene planes.
+        EnvironmentError: Si falta el token.
+    """
+    _, planes = _resolver(ciudad, formato, callback_estado, usar_cache)
+    if not planes:
+        raise ValueError("El modelo no devolvió planes reconocibles.")
+    return planes
+
+
+def esta_en_cache(ciudad: str, formato: str = "texto") -> bool:
+    """
+    Si la respuesta de una ciudad está en el snapshot, o en la caché
+    persistente sin haber pasado su TTL suave (una obsoleta se regenera al
+    pedirla).
+    """
+    if _consultar_snapshot(ciudad, True):
+        return True
+    _, entrada = _consultar_cache(_clave_cache(ciudad, formato), True)
+    return entrada is not None and not _obsoleta(entrada)
+
+
+def calentamiento_cache(ciudades: list[str] | None = None, al_calentar=None) -> Calentamiento:
+    """
+    Prepara (sin arrancarlo) el precalentamiento de la caché con las
+    ciudades populares, en el formato que usa la búsqueda en streaming.
+
+    Args:
+        ciudades: Ciudades a generar (por defecto CIUDADES_POPULARES).
+        al_calentar: Función opcional (ciudad, resultado) tras cada ciudad.
+
+    Returns:
+        Calentamiento: iniciar() lo lanza en segundo plano y ejecutar()
+        hace una pasada en el hilo actual.
+    """
+    return Calentamiento(
+        CIUDADES_POPULARES if ciudades is None else ciudades,
+        obtener_planes,
+        en_cache=esta_en_cache,
+        limitador=limitador_tasa(),
+        concurrencia=CALENTAMIENTO_CONCURRENCIA,
+        fichas_minimas=CALENTAMIENTO_FICHAS_MINIMAS,
+        intervalo=CALENTAMIENTO_INTERVALO,
+        al_calentar=al_calentar,
+    )
+
+
+def politica_reintentos():
+    """
+    Política de reintentos compartida por el proceso. Su estado (p. ej. si
+    el cortocircuito está abierto) se puede mostrar en la interfaz.
+    """
+    return obtener_politica(
+        REINTENTOS,
+        ESPERA_BASE_REINTENTO,
+        ESPERA_MAXIMA_REINTENTO,
+        UMBRAL_CIRCUITO,
+        ENFRIAMIENTO_CIRCUITO,
+    )
+
+
+def limitador_tasa():
+    """
+    Limitador de tasa compartido por el proceso, aplicado antes de cada
+    llamada al modelo. Sus estadísticas (cola, esperas) sirven para ajustar
+    LIMITE_PETICIONES_SEGUNDO y LIMITE_RAFAGA.
+    """
+    return obtener_limitador(LIMITE_PETICIONES_SEGUNDO, LIMITE_RAFAGA)
+
+
+def backend_inferencia():
+    """
+    Backend de inferencia del proceso (INFERENCIA_BACKEND): de él sale el
+    cliente de todas las llamadas al modelo.
+    """
+    return obtener_backend(
+        INFERENCIA_BACKEND,
+        obtener_token,
+        base_url=URL_BASE_INFERENCIA,
+        url=INFERENCIA_URL,
+        api_key=INFERENCIA_API_KEY,
+        modelo=INFERENCIA_MODELO,
+        timeout=INFERENCIA_TIMEOUT,
+    )
+
+
+def presupuesto_salida():
+    """
+    Presupuesto de tokens de salida compartido por el proceso: aprende de
+    cada respuesta cuántos tokens hacen falta para los 10 planes.
+    """
+    return obtener_presupuesto(
+        MAX_TOKENS, PRESUPUESTO_MARGEN, PRESUPUESTO_MINIMO, PRESUPUESTO_MUESTREO_COLA,
+        PRESUPUESTO_MUESTRAS_ARRANQUE,
+    )
+
+
+def _max_tokens(modelo: str, formato: str) -> int:
+    """max_tokens de la próxima llamada (MAX_TOKENS si el presupuesto está desactivado)."""
+    if not PRESUPUESTO_ADAPTATIVO:
+        return MAX_TOKENS
+    return presupuesto_salida().max_tokens(modelo, formato)
+
+
+def _anotar_salida(modelo: str, formato: str, texto: str, max_tokens: int, respuesta=None, **kwargs):
+    """Registra una respuesta en el presupuesto (con su `usage`, si lo trae)."""
+    uso = getattr(respuesta, "usage", None)
+    return presupuesto_salida().registrar(
+        modelo, formato, texto, max_tokens, getattr(uso, "completion_tokens", None), **kwargs
+    )
+
+
+def _informar_reintento(callback_estado):
+    """Adapta callback_estado a la firma al_reintentar de la política."""
+    if not callback_estado:
+        return None
+
+    def al_reintentar(intento, error, espera):
+        callback_estado(
+            f"Error en intento {intento} ({type(error).__name__}). "
+            f"Reintentando en {espera:.1f}s..."
+        )
+
+    return al_reintentar
+
+
+# Latencias recientes del modelo principal, para decidir cuándo cubrirlo:
+# la respuesta completa (_generar) y el primer fragmento del stream
+_latencias = RegistroLatencias()
+_latencias_primer_fragmento = RegistroLatencias()
+
+
+def _generar(mensajes: list[dict], callback_estado=None, formato: str = "texto") -> tuple[str, str]:
+    """
+    Genera la respuesta con el modelo principal y, si HEDGING_ACTIVO, con
+    cobertura: cuando el principal tarda más que el percentil
+    HEDGING_PERCENTIL de sus latencias recientes (o falla), se lanza el
+    mismo prompt contra los modelos de MODELOS_RESPALDO y se devuelve la
+    primera respuesta que llegue.
+
+    Args:
+        mensajes: Mensajes en formato chat.
+        callback_estado: Función opcional para reportar estado.
+        formato: Formato pedido en los mensajes ("texto" o "json").
+
+    Returns:
+        (texto, modelo que lo generó).
+    """
+
+    def principal(callback=None) -> str:
+        inicio = time.monotonic()
+        texto = _generar_con_modelo(MODELO, mensajes, callback, formato)
+        _latencias.registrar(time.monotonic() - inicio)
+        return texto
+
+    if not HEDGING_ACTIVO or not MODELOS_RESPALDO:
+        return principal(callback_estado), MODELO
+
+    # Las llamadas corren en otros hilos: no reciben callback_estado porque
+    # Streamlit solo permite actualizar la interfaz desde el hilo del script.
+    llamadas = [(MODELO, principal)] + [
+        (modelo, partial(_generar_con_modelo, modelo, mensajes, formato=formato))
+        for modelo in MODELOS_RESPALDO
+    ]
+    retraso = _latencias.retraso_cobertura(HEDGING_PERCENTIL, HEDGING_RETRASO_INICIAL)
+
+    def al_cubrir(modelo):
+        callback_estado(f"El modelo tarda más de lo habitual; probando también con {modelo}...")
+
+    return ejecutar_con_cobertura(llamadas, retraso, al_cubrir if callback_estado else None)
+
+
+def _cliente():
+    """Cliente compartido del backend (incluida la lectura del token)."""
+    with tramo("cliente"):
+        return backend_inferencia().cliente()
+
+
+def _generar_con_modelo(
+    modelo: str,
+    mensajes: list[dict],
+    callback_estado=None,
+    formato: str = "texto",
+) -> str:
+    """
+    Llama a un modelo concreto con reintentos y devuelve el texto generado.
+
+    max_tokens sale del presupuesto aprendido; si la respuesta se queda sin
+    presupuesto antes del décimo plan, se repite una vez con MAX_TOKENS.
+
+    Args:
+        modelo: Identificador del modelo en Hugging Face.
+        mensajes: Mensajes en formato chat.
+        callback_estado: Función opcional para reportar estado.
+        formato: Formato pedido en los mensajes ("texto" o "json").
+
+    Returns:
+        Texto generado por el modelo.
+    """
+    cliente = _cliente()
+
+    def pedir(intento: int, max_tokens: int) -> tuple[str, bool]:
+        with tramo("limitador"):
+            limitador_tasa().adquirir()
+        with tramo("llamada", modelo=modelo, intento=intento):
             respuesta = cliente.chat.completions.create(
-                model=MODELO,
+                model=modelo,
                 messages=mensajes,
-                max_tokens=MAX_TOKENS,
+                max_tokens=max_tokens,
                 temperature=TEMPERATURA,
+                stop=PARADAS[formato] or None,
             )
+        registrar_uso(modelo, respuesta)
+
+        eleccion = respuesta.choices[0]
+        texto = (eleccion.message.content or "").strip()
+
+        if not texto:
+            raise ValueError("El modelo devolvió una respuesta vacía.")
+
+        truncada = eleccion.finish_reason == "length"
+        informe = _anotar_salida(modelo, formato, texto, max_tokens, respuesta, truncada=truncada)
+        return texto, truncada and not informe.completa
+
+    def llamada(intento: int) -> str:
+        if callback_estado:
+            callback_estado(f"Consultando al modelo (intento {intento}/{REINTENTOS})...")
+
+        max_tokens = _max_tokens(modelo, formato)
+        texto, incompleta = pedir(intento, max_tokens)
+        if incompleta and max_tokens < MAX_TOKENS:
+            texto, _ = pedir(intento, MAX_TOKENS)
+        return texto
+
+    return politica_reintentos().ejecutar(llamada, _informar_reintento(callback_estado))
+
+
+class FlujoPlanes:
+    """
+    Fragmentos de texto de una generación en streaming.
+
+    Se itera como un generador normal; al agotarlo, `texto` y `planes`
+    contienen la respuesta completa y sus planes validados, para que quien
+    consume el stream no tenga que volver a parsearla.
+    """
+
+    def __init__(self, generador):
+        self._generador = generador
+        self.texto: str | None = None
+        self.planes: list[Plan] | None = None
+
+    def __iter__(self):
+        self.texto, self.planes = yield from self._generador
+
+    def close(self):
+        self._generador.close()
+
+
+def obtener_planes_stream(ciudad: str, callback_estado=None, usar_cache: bool = True) -> FlujoPlanes:
+    """
+    Variante en streaming de obtener_planes: va devolviendo el texto a
+    medida que el modelo lo genera.
+
+    Si la ciudad está en el snapshot precalculado o en la caché (aunque
+    esté obsoleta: entonces se regenera en segundo plano), o si otra sesión
+    ya la está generando, se
+    devuelve la respuesta completa en un único fragmento. Al terminar la
+    generación, el texto completo y sus planes se guardan en la caché.
+
+    El streaming usa siempre el formato de lista numerada: se puede mostrar
+    plan a plan según llega, cosa que no ocurre con un JSON a medias.
+
+    Args:
+        ciudad: Nombre de la ciudad.
+        callback_estado: Función opcional para reportar estado (ej. st.status).
+        usar_cache: Si es False, se ignora la caché y se consulta al modelo.
+
+    Returns:
+        FlujoPlanes que produce los fragmentos de texto en el orden en que
+        llegan y, al agotarse, expone `texto` y `planes`.
+
+    Raises:
+        ConnectionError: Si falla la API tras los reintentos.
+        ValueError: Si el texto no contiene una ciudad o la respuesta
+            está vacía.
+        EnvironmentError: Si falta el token.
+    """
+    return FlujoPlanes(_flujo(ciudad, callback_estado, usar_cache))
+
+
+def _flujo(ciudad: str, callback_estado, usar_cache: bool):
+    """Generador de obtener_planes_stream; devuelve (texto, planes) al final."""
+    ciudad = exigir_ciudad(ciudad)
+    planes = _consultar_snapshot(ciudad, usar_cache)
+    if planes:
+        texto = formatear_planes(planes)
+        yield texto
+        return texto, planes
+
+    mensajes = construir_prompt(ciudad)
+    clave = _clave_cache(ciudad)
+
+    cache, entrada = _consultar_cache(clave, usar_cache)
+    if entrada:
+        _revalidar_si_obsoleta(entrada, ciudad, "texto", clave, cache)
+        yield entrada.texto
+        return entrada.texto, _planes_de_entrada(entrada, "texto")
+
+    while True:
+        vuelo, es_lider = _vuelos.unirse(clave)
+        if es_lider:
+            break
+        try:
+            texto, planes = vuelo.esperar()
+        except VueloAbandonadoError:
+            continue  # El líder cerró su stream: esta llamada toma el relevo
+        yield texto
+        return texto, planes
+
+    try:
+        texto, modelo = yield from _generar_stream(mensajes, callback_estado)
+        texto = texto.strip()
+        if not texto:
+            raise ValueError("El modelo devolvió una respuesta vacía.")
+
+        with tramo("validacion", formato="texto"):
+            planes = validar_planes(texto)
+        _guardar_respuesta(cache, clave, ciudad, texto, modelo, planes)
+
+    except GeneratorExit:
+        _vuelos.completar(clave, vuelo, error=VueloAbandonadoError())
+        raise
+    except BaseException as e:
+        _vuelos.completar(clave, vuelo, error=e)
+        raise
+
+    _vuelos.completar(clave, vuelo, resultado=(texto, planes))
+    return texto, planes
+
+
+def _generar_stream(mensajes: list[dict], callback_estado=None):
+    """
+    Llama al modelo en modo streaming con reintentos.
+
+    Solo se reintenta si el fallo ocurre antes de recibir el primer
+    fragmento; una vez empezada la respuesta, un error se propaga como
+    ConnectionError para no duplicar texto ya entregado.
+
+    Con HEDGING_ACTIVO, la cobertura se aplica a ese primer fragmento: si
+    el principal tarda en empezar más que el percentil HEDGING_PERCENTIL
+    de sus tiempos recientes, se abre el mismo stream con los modelos de
+    MODELOS_RESPALDO, se sigue el primero que empiece y se cierran los
+    demás.
+
+    La lectura se corta al terminar el décimo plan (con sus líneas de
+    continuación y viñetas): lo que el modelo escribiría después
+    (conclusiones) no se llega a generar.
+
+    Args:
+        mensajes: Mensajes en formato chat.
+        callback_estado: Función opcional para reportar estado.
+
+    Yields:
+        Fragmentos de texto generados por el modelo.
+
+    Returns:
+        (texto entregado, modelo que lo generó), al agotar el generador.
+    """
+    cliente = _cliente()
+
+    def abrir(modelo: str, callback=None):
+        """Abre el stream de `modelo`: (primer fragmento, flujo, max_tokens)."""
+        max_tokens = _max_tokens(modelo, "texto")
+
+        def abrir_flujo(intento: int):
+            if callback:
+                callback(f"Consultando al modelo (intento {intento}/{REINTENTOS})...")
 
-            texto = respuesta.choices[0].message.content.strip()
+            with tramo("limitador"):
+                limitador_tasa().adquirir()
+            # El primer fragmento se lee dentro de la política de reintentos
+            with tramo("primer_fragmento", modelo=modelo, intento=intento):
+                flujo = _fragmentos(cliente.chat.completions.create(
+                    model=modelo,
+                    messages=mensajes,
+                    max_tokens=max_tokens,
+                    temperature=TEMPERATURA,
+                    stop=PARADAS["texto"],
+                    stream=True,
+                ))
+                return next(flujo, None), flujo
+
+        primero, flujo = politica_reintentos().ejecutar(abrir_flujo, _informar_reintento(callback))
+        return primero, flujo, max_tokens
+
+    def principal(callback=None):
+        inicio = time.monotonic()
+        abierto = abrir(MODELO, callback)
+        _latencias_primer_fragmento.registrar(time.monotonic() - inicio)
+        return abierto
+
+    if not HEDGING_ACTIVO or not MODELOS_RESPALDO:
+        (primero, flujo, max_tokens), modelo = principal(callback_estado), MODELO
+    else:
+        # Como en _generar, las llamadas en otros hilos no reciben callback_estado
+        llamadas = [(MODELO, principal)] + [
+            (respaldo, partial(abrir, respaldo)) for respaldo in MODELOS_RESPALDO
+        ]
+        retraso = _latencias_primer_fragmento.retraso_cobertura(
+            HEDGING_PERCENTIL, HEDGING_RETRASO_INICIAL
+        )
+
+        def al_cubrir(respaldo):
+            callback_estado(f"El modelo tarda más de lo habitual; probando también con {respaldo}...")
+
+        (primero, flujo, max_tokens), modelo = ejecutar_con_cobertura(
+            llamadas, retraso,
+            al_cubrir if callback_estado else None,
+            al_descartar=lambda abierto: abierto[1].close(),
+        )
+    if primero is None:
+        return "", modelo
+
+    corte = CorteDecimoPlan()
+    partes = []
+    # Incluye el tiempo que tarda quien consume el stream (p. ej. el render)
+    with tramo("generacion", modelo=modelo):
+        try:
+            fragmento = primero
+            while fragmento is not None:
+                entregado, cortar = corte.alimentar(fragmento)
+                if entregado:
+                    partes.append(entregado)
+                    yield entregado
+                if cortar:
+                    break
+                fragmento = next(flujo, None)
+        except Exception as e:
+            raise ReintentosAgotadosError(1, e) from e
+        pendiente = corte.terminar()
+        if pendiente:
+            partes.append(pendiente)
+            yield pendiente
+
+    texto = "".join(partes)
+    if corte.cortado and presupuesto_salida().muestrear_cola(modelo, "texto"):
+        # Alguna vez se deja terminar la respuesta en segundo plano, para
+        # saber cuántos tokens se ahorran al cortar
+        threading.Thread(
+            target=_medir_cola,
+            args=(flujo, modelo, texto + corte.resto, max_tokens),
+            name="medir-cola",
+            daemon=True,
+        ).start()
+        return texto, modelo
+
+    if corte.cortado:
+        flujo.close()  # Cierra la conexión: el modelo deja de generar
+    # Si no hubo corte con un presupuesto reducido, pudo quedarse corto
+    _anotar_salida(
+        modelo, "texto", texto.strip(), max_tokens,
+        cortada=corte.cortado,
+        truncada=not corte.cortado and max_tokens < MAX_TOKENS,
+    )
+    return texto, modelo
+
+
+def _medir_cola(flujo, modelo: str, leido: str, max_tokens: int):
+    """Lee el resto de un stream ya entregado y lo anota sin cortar."""
+    try:
+        texto = leido + "".join(flujo)
+    except Exception:
+        return  # Solo era una medición
+    _anotar_salida(modelo, "texto", texto.strip(), max_tokens)
+
+
+def _fragmentos(flujo):
+    """
+    Extrae el texto no vacío de los eventos de un flujo de chat. Al cerrar
+    el generador se cierra también el flujo (y su conexión).
+    """
+    try:
+        for evento in flujo:
+            if not evento.choices:
+                continue
+            fragmento = evento.choices[0].delta.content
+            if fragmento:
+                yield fragmento
+    finally:
+        cerrar = getattr(flujo, "close", None)
+        if cerrar:
+            cerrar()
+
+
+async def obtener_planes_async(
+    ciudad: str,
+    callback_estado=None,
+    usar_cache: bool = True,
+) -> str:
+    """
+    Versión asíncrona de obtener_planes basada en AsyncInferenceClient.
+
+    Las esperas entre reintentos usan asyncio.sleep, de modo que un mismo
+    proceso puede tener muchas consultas en curso a la vez.
+
+    Args:
+        ciudad: Nombre de la ciudad.
+        callback_estado: Función opcional para reportar estado.
+        usar_cache: Si es False, se ignora la caché y se consulta al modelo.
+
+    Returns:
+        Texto con los 10 planes recomendados.
+
+    Raises:
+        ConnectionError: Si falla la API tras los reintentos.
+        ValueError: Si el texto no contiene una ciudad o la respuesta
+            está vacía.
+        EnvironmentError: Si falta el token.
+    """
+    ciudad = exigir_ciudad(ciudad)
+    planes = _consultar_snapshot(ciudad, usar_cache)
+    if planes:
+        return formatear_planes(planes)
+
+    mensajes = construir_prompt(ciudad)
+    clave = _clave_cache(ciudad)
+
+    cache, entrada = _consultar_cache(clave, usar_cache)
+    if entrada:
+        _revalidar_si_obsoleta(entrada, ciudad, "texto", clave, cache)
+        return entrada.texto
+
+    # Coalescencia compartida con las llamadas síncronas: la espera se hace
+    # en un hilo aparte para no bloquear el bucle de eventos.
+    while True:
+        vuelo, es_lider = _vuelos.unirse(clave)
+        if es_lider:
+            break
+        try:
+            texto, _ = await asyncio.to_thread(vuelo.esperar)
+            return texto
+        except VueloAbandonadoError:
+            continue
+
+    try:
+        texto = await _generar_async(mensajes, callback_estado)
+        planes = validar_planes(texto)
+        _guardar_respuesta(cache, clave, ciudad, texto, MODELO, planes)
+    except asyncio.CancelledError:
+        _vuelos.completar(clave, vuelo, error=VueloAbandonadoError())
+        raise
+    except BaseException as e:
+        _vuelos.completar(clave, vuelo, error=e)
+        raise
+
+    _vuelos.completar(clave, vuelo, resultado=(texto, planes))
+    return texto
+
+
+async def obtener_planes_varias_async(
+    ciudades: list[str],
+    max_concurrencia: int = MAX_CONCURRENCIA,
+    callback_estado=None,
+) -> dict[str, str | Exception]:
+    """
+    Genera planes para varias ciudades de forma concurrente.
+
+    Un semáforo limita cuántas consultas hay en vuelo a la vez. Los errores
+    de una ciudad no interrumpen al resto: se devuelven como valor.
+
+    Args:
+        ciudades: Lista de ciudades.
+        max_concurrencia: Número máximo de consultas simultáneas.
+        callback_estado: Función opcional para reportar estado.
+
+    Returns:
+        Diccionario ciudad → texto de los planes, o la excepción
+        (ConnectionError, ValueError, EnvironmentError...) si falló.
+    """
+    semaforo = asyncio.Semaphore(max_concurrencia)
+
+    async def _una(ciudad: str):
+        async with semaforo:
+            try:
+                return ciudad, await obtener_planes_async(ciudad, callback_estado)
+            except Exception as e:
+                return ciudad, e
+
+    resultados = await asyncio.gather(*(_una(ciudad) for ciudad in ciudades))
+    return dict(resultados)
+
+
+async def _generar_async(mensajes: list[dict], callback_estado=None) -> str:
+    """
+    Llama al modelo de forma asíncrona con reintentos. No usa cobertura
+    (HEDGING_ACTIVO): solo el modelo principal.
+
+    Args:
+        mensajes: Mensajes en formato chat.
+        callback_estado: Función opcional para reportar estado.
+
+    Returns:
+        Texto generado por el modelo.
+    """
+    # El cliente asíncrono va ligado al bucle de eventos que lo usa, así que
+    # no se comparte entre llamadas como el síncrono (src/backends.py).
+    async with backend_inferencia().cliente_async() as cliente:
+
+        async def pedir(intento: int, max_tokens: int) -> tuple[str, bool]:
+            with tramo("limitador"):
+                await limitador_tasa().adquirir_async()
+            with tramo("llamada", modelo=MODELO, intento=intento, modo="async"):
+                respuesta = await cliente.chat.completions.create(
+                    model=MODELO,
+                    messages=mensajes,
+                    max_tokens=max_tokens,
+                    temperature=TEMPERATURA,
+                    stop=PARADAS["texto"],
+                )
+            registrar_uso(MODELO, respuesta)
+
+            eleccion = respuesta.choices[0]
+            texto = (eleccion.message.content or "").strip()
 
             if not texto:
                 raise ValueError("El modelo devolvió una respuesta vacía.")
 
-            return texto
+            truncada = eleccion.finish_reason == "length"
+            informe = _anotar_salida(MODELO, "texto", texto, max_tokens, respuesta, truncada=truncada)
+            return texto, truncada and not informe.completa
+
+        async def llamada(intento: int) -> str:
+            if callback_estado:
+                callback_estado(f"Consultando al modelo (intento {intento}/{REINTENTOS})...")
 
-        except HfHubHTTPError as e:
-            if intento < REINTENTOS:
-                if callback_estado:
-                    callback_estado(
-                        f"Error en intento {intento}. Reintentando en "
-                        f"{ESPERA_ENTRE_REINTENTOS}s..."
-                    )
-                time.sleep(ESPERA_ENTRE_REINTENTOS)
-            else:
-                raise ConnectionError(
-                    f"No se pudo conectar con la API de Hugging Face "
-                    f"tras {REINTENTOS} intentos. Detalle: {e}"
-                ) from e
+            # Presupuesto aprendido; si se queda corto, se repite con el tope
+            max_tokens = _max_tokens(MODELO, "texto")
+            texto, incompleta = await pedir(intento, max_tokens)
+            if incompleta and max_tokens < MAX_TOKENS:
+                texto, _ = await pedir(intento, MAX_TOKENS)
+            return texto
 
-        except Exception as e:
-            if isinstance(e, (ValueError, EnvironmentError)):
-                raise
-            if intento < REINTENTOS:
-                if callback_estado:
-                    callback_estado(
-                        f"Error inesperado en intento {intento}. "
-                        f"Reintentando en {ESPERA_ENTRE_REINTENTOS}s..."
-                    )
-                time.sleep(ESPERA_ENTRE_REINTENTOS)
-            else:
-                raise ConnectionError(
-                    f"Error inesperado tras {REINTENTOS} intentos: "
-                    f"{type(e).__name__}: {e}"
-                ) from e
+        return await politica_reintentos().ejecutar_async(
+            llamada, _informar_reintento(callback_estado)
+        )
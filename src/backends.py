@@ -0,0 +1,393 @@
+# src/backends.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Backends de inferencia intercambiables.
+# La generación solo necesita un cliente con la interfaz de chat completions
+# (`cliente.chat.completions.create(...)`, con o sin stream). Aquí se
+# esconde de dónde sale ese cliente:
+#   - "hf":     InferenceClient de huggingface_hub (API de Hugging Face, o
+#               HF_BASE_URL), compartido por el proceso (src/cliente.py).
+#   - "openai": cualquier servidor compatible con la API de OpenAI
+#               (llama.cpp, vLLM, Ollama...), p. ej. en la misma máquina que
+#               la app: sin latencia de WAN ni cuota. Cliente propio sobre
+#               http.client, sin dependencias ni token de Hugging Face.
+# El backend se elige con INFERENCIA_BACKEND (src/config.py).
+# ─────────────────────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import http.client
+import json
+import threading
+from abc import ABC, abstractmethod
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+from src.cliente import obtener_cliente, obtener_gestor
+
+
+class ErrorHTTPInferencia(Exception):
+    """
+    Respuesta HTTP de error de un servidor compatible con OpenAI.
+
+    Como los errores de huggingface_hub, lleva `response` con `status_code`
+    y `headers`, así que la política de reintentos decide igual (429, 5xx,
+    Retry-After) con cualquiera de los dos backends.
+    """
+
+    def __init__(self, codigo: int, cabeceras, cuerpo: str):
+        self.response = SimpleNamespace(status_code=codigo, headers=cabeceras)
+        super().__init__(f"{codigo} del servidor de inferencia: {cuerpo[:300]}")
+
+
+def _objeto(valor):
+    """JSON → objetos con atributos (respuesta.choices[0].message.content)."""
+    if isinstance(valor, dict):
+        return SimpleNamespace(**{clave: _objeto(v) for clave, v in valor.items()})
+    if isinstance(valor, list):
+        return [_objeto(v) for v in valor]
+    return valor
+
+
+# ── Cliente compatible con OpenAI ────────────────────────────────────────────
+class _FlujoSSE:
+    """
+    Eventos de una respuesta en streaming (Server-Sent Events).
+
+    El flujo se queda con la conexión: si se lee hasta el final, vuelve al
+    cliente para reutilizarla; si se cierra antes, se cierra también la
+    conexión y el servidor deja de generar.
+    """
+
+    def __init__(self, respuesta: http.client.HTTPResponse, conexion: http.client.HTTPConnection,
+                 devolver):
+        self._respuesta = respuesta
+        self._conexion = conexion
+        self._devolver = devolver
+
+    def __iter__(self):
+        try:
+            while True:
+                linea = self._respuesta.readline()
+                if not linea:
+                    break
+                linea = linea.strip()
+                if not linea.startswith(b"data:"):
+                    continue  # Líneas en blanco, comentarios, "event:"...
+                datos = linea[5:].strip()
+                if datos == b"[DONE]":
+                    self._respuesta.read()  # Fin del cuerpo: la conexión queda libre
+                    break
+                yield _objeto(json.loads(datos))
+        except (OSError, http.client.HTTPException) as e:
+            raise ConnectionError(f"Se cortó el stream del servidor de inferencia: {e}") from e
+        finally:
+            self.close()
+
+    def close(self):
+        conexion, self._conexion = self._conexion, None
+        if conexion is None:
+            return
+        if self._respuesta.isclosed():
+            self._devolver(conexion)
+        else:
+            conexion.close()
+
+
+class _Completions:
+    def __init__(self, cliente: ClienteOpenAI):
+        self._cliente = cliente
+
+    def create(self, *, model: str, messages: list[dict], stream: bool = False, **parametros):
+        """
+        Llama a /chat/completions. Los parámetros a None no se envían.
+
+        Returns:
+            La respuesta como objeto, o un iterable de eventos si stream=True.
+        """
+        cuerpo = {
+            "model": self._cliente.modelo or model,
+            "messages": messages,
+            "stream": stream,
+            **{nombre: valor for nombre, valor in parametros.items() if valor is not None},
+        }
+        return self._cliente._pedir(cuerpo, stream)
+
+
+class ClienteOpenAI:
+    """
+    Cliente mínimo de chat completions para servidores compatibles con la
+    API de OpenAI, con la misma interfaz que usa el código de InferenceClient.
+
+    Cada hilo mantiene su propia conexión keep-alive (http.client no es
+    seguro entre hilos), así que una instancia se comparte por el proceso.
+    Las conexiones abiertas con precalentar quedan libres para el primer
+    hilo que consulte sin tener una propia.
+    """
+
+    def __init__(self, url: str, api_key: str | None = None, modelo: str | None = None,
+                 timeout: float = 120.0):
+        """
+        Args:
+            url: URL base, con el prefijo de la API (p. ej. http://127.0.0.1:8080/v1).
+            api_key: Clave que se envía como Bearer, si el servidor la pide.
+            modelo: Nombre del modelo en el servidor; si se indica, sustituye
+                al que pide la generación (un servidor local sirve uno solo).
+            timeout: Segundos de espera de la conexión y de cada lectura.
+        """
+        partes = urlsplit(url)
+        self._https = partes.scheme == "https"
+        self._host = partes.hostname or "127.0.0.1"
+        self._puerto = partes.port
+        self._ruta = partes.path.rstrip("/") + "/chat/completions"
+        self._cabeceras = {"Content-Type": "application/json", "Accept": "application/json"}
+        if api_key:
+            self._cabeceras["Authorization"] = f"Bearer {api_key}"
+        self.modelo = modelo
+        self.timeout = timeout
+        self._local = threading.local()
+        self._libres: list[http.client.HTTPConnection] = []
+        self._lock_libres = threading.Lock()
+        self.chat = SimpleNamespace(completions=_Completions(self))
+
+    def _nueva_conexion(self) -> http.client.HTTPConnection:
+        clase = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+        return clase(self._host, self._puerto, timeout=self.timeout)
+
+    def _conexion(self) -> http.client.HTTPConnection:
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            with self._lock_libres:
+                conexion = self._libres.pop() if self._libres else None
+            if conexion is None:
+                conexion = self._nueva_conexion()
+            self._local.conexion = conexion
+        return conexion
+
+    def _devolver(self, conexion: http.client.HTTPConnection):
+        """Deja libre para el hilo actual la conexión de un stream terminado."""
+        if getattr(self._local, "conexion", None) is None:
+            self._local.conexion = conexion
+        else:
+            conexion.close()
+
+    def _enviar(self, datos: bytes, stream: bool) -> http.client.HTTPResponse:
+        cabeceras = dict(self._cabeceras, Accept="text/event-stream") if stream else self._cabeceras
+        conexion = self._conexion()
+        reutilizada = conexion.sock is not None
+        try:
+            conexion.request("POST", self._ruta, body=datos, headers=cabeceras)
+            return conexion.getresponse()
+        except (ConnectionResetError, BrokenPipeError):
+            # El servidor cerró la conexión keep-alive mientras estaba
+            # inactiva: se repite una vez con una conexión nueva
+            conexion.close()
+            if not reutilizada:
+                raise
+        except BaseException:
+            conexion.close()
+            raise
+        try:
+            conexion.request("POST", self._ruta, body=datos, headers=cabeceras)
+            return conexion.getresponse()
+        except BaseException:
+            conexion.close()
+            raise
+
+    def _pedir(self, cuerpo: dict, stream: bool):
+        datos = json.dumps(cuerpo).encode("utf-8")
+        try:
+            respuesta = self._enviar(datos, stream)
+            if respuesta.status >= 400:
+                texto = respuesta.read().decode("utf-8", "replace")
+                raise ErrorHTTPInferencia(respuesta.status, respuesta.headers, texto)
+            if stream:
+                # El stream se lleva la conexión: el hilo abrirá otra si
+                # hace una petición antes de terminar de leerlo
+                conexion, self._local.conexion = self._local.conexion, None
+                return _FlujoSSE(respuesta, conexion, self._devolver)
+            return _objeto(json.loads(respuesta.read()))
+        except (ErrorHTTPInferencia, ConnectionError, TimeoutError):
+            raise
+        except (OSError, http.client.HTTPException) as e:
+            # DNS, respuestas malformadas...: errores de red reintentables
+            raise ConnectionError(f"Error de red con el servidor de inferencia: {e}") from e
+
+    def precalentar(self):
+        """
+        Abre una conexión (solo TCP/TLS: no genera nada) y la deja libre
+        para el primer hilo que consulte. Si el servidor la cierra mientras
+        espera, _enviar la repite con una nueva.
+        """
+        conexion = self._nueva_conexion()
+        conexion.connect()
+        with self._lock_libres:
+            self._libres.append(conexion)
+
+
+class _CompletionsAsync:
+    def __init__(self, completions: _Completions):
+        self._completions = completions
+
+    async def create(self, **parametros):
+        import asyncio  # Solo en la API asíncrona
+
+        return await asyncio.to_thread(self._completions.create, **parametros)
+
+
+class _ClienteOpenAIAsync:
+    """
+    Versión asíncrona de ClienteOpenAI: cada llamada corre en un hilo del
+    ejecutor por defecto, con la conexión keep-alive de ese hilo.
+    """
+
+    def __init__(self, cliente: ClienteOpenAI):
+        self.chat = SimpleNamespace(completions=_CompletionsAsync(cliente.chat.completions))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *excepcion):
+        return False
+
+
+# ── Backends ─────────────────────────────────────────────────────────────────
+class BackendInferencia(ABC):
+    """
+    Origen del cliente de chat completions que usa la generación.
+
+    Subclases: BackendHF y BackendOpenAI. Todas las llamadas al modelo de
+    src/asistente.py y asistente.py pasan por aquí.
+    """
+
+    nombre = ""
+    descripcion = ""  # Para la interfaz: dónde se ejecuta la inferencia
+
+    def comprobar(self):
+        """
+        Lanza EnvironmentError si falta configuración para llamar al modelo
+        (p. ej. el token de Hugging Face).
+        """
+
+    @abstractmethod
+    def cliente(self):
+        """Cliente síncrono compartido, con `chat.completions.create`."""
+
+    @abstractmethod
+    def cliente_async(self):
+        """Cliente asíncrono, para usar con `async with`."""
+
+    def precalentar(self, en_segundo_plano: bool = True):
+        """Abre de antemano la conexión con el servidor; los errores se ignoran."""
+
+
+class BackendHF(BackendInferencia):
+    """API de Hugging Face (o un servidor en HF_BASE_URL) con InferenceClient."""
+
+    nombre = "hf"
+
+    def __init__(self, obtener_token, base_url: str | None = None):
+        self._obtener_token = obtener_token
+        self.base_url = base_url
+        self.descripcion = f"servidor en {base_url}" if base_url else "Hugging Face API"
+
+    def comprobar(self):
+        self._obtener_token()
+
+    def cliente(self):
+        return obtener_cliente(self._obtener_token(), self.base_url)
+
+    def cliente_async(self):
+        # El cliente asíncrono va ligado al bucle de eventos que lo usa, así
+        # que no se comparte entre llamadas como el síncrono
+        from huggingface_hub import AsyncInferenceClient
+
+        return AsyncInferenceClient(token=self._obtener_token(), base_url=self.base_url)
+
+    def precalentar(self, en_segundo_plano: bool = True):
+        try:
+            token = self._obtener_token()
+        except EnvironmentError:
+            return  # Sin token: el error se mostrará al buscar
+        obtener_gestor().precalentar(token, en_segundo_plano, base_url=self.base_url)
+
+
+class BackendOpenAI(BackendInferencia):
+    """Servidor compatible con la API de OpenAI (llama.cpp, vLLM...)."""
+
+    nombre = "openai"
+
+    def __init__(self, url: str, api_key: str | None = None, modelo: str | None = None,
+                 timeout: float = 120.0):
+        self.url = url
+        self.descripcion = f"servidor en {url}"
+        self._cliente = ClienteOpenAI(url, api_key, modelo, timeout)
+
+    def cliente(self) -> ClienteOpenAI:
+        return self._cliente
+
+    def cliente_async(self) -> _ClienteOpenAIAsync:
+        return _ClienteOpenAIAsync(self._cliente)
+
+    def precalentar(self, en_segundo_plano: bool = True):
+        if en_segundo_plano:
+            threading.Thread(
+                target=self._precalentar, name="precalentar-cliente", daemon=True
+            ).start()
+        else:
+            self._precalentar()
+
+    def _precalentar(self):
+        try:
+            self._cliente.precalentar()
+        except OSError:
+            pass  # Sin servidor: el error se mostrará al buscar
+
+
+BACKENDS = {BackendHF.nombre: BackendHF, BackendOpenAI.nombre: BackendOpenAI}
+
+
+# ── Instancias compartidas por proceso ───────────────────────────────────────
+_backends: dict[tuple, BackendInferencia] = {}
+_lock_backends = threading.Lock()
+
+
+def obtener_backend(
+    nombre: str,
+    obtener_token,
+    base_url: str | None = None,
+    url: str | None = None,
+    api_key: str | None = None,
+    modelo: str | None = None,
+    timeout: float = 120.0,
+) -> BackendInferencia:
+    """
+    Devuelve el backend del proceso para una configuración, creándolo la
+    primera vez.
+
+    Args:
+        nombre: "hf" u "openai" (INFERENCIA_BACKEND).
+        obtener_token: Función que devuelve el token de Hugging Face (backend hf).
+        base_url: URL de un servidor para InferenceClient (backend hf).
+        url: URL base de la API compatible con OpenAI (backend openai).
+        api_key: Clave Bearer del servidor compatible con OpenAI, si la pide.
+        modelo: Nombre del modelo en ese servidor, si no es el de MODELO.
+        timeout: Segundos de espera de cada lectura (backend openai).
+
+    Raises:
+        ValueError: Si el backend no existe.
+    """
+    if nombre not in BACKENDS:
+        raise ValueError(
+            f"Backend de inferencia desconocido: {nombre!r} "
+            f"(opciones: {', '.join(BACKENDS)})."
+        )
+    clave = (nombre, obtener_token, base_url, url, api_key, modelo, timeout)
+    with _lock_backends:
+        backend = _backends.get(clave)
+        if backend is None:
+            if nombre == BackendHF.nombre:
+                backend = BackendHF(obtener_token, base_url)
+            else:
+                backend = BackendOpenAI(url, api_key, modelo, timeout)
+            _backends[clave] = backend
+        return backend
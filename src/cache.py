@@ -0,0 +1,276 @@
+# src/cache.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Caché persistente de respuestas del modelo (SQLite).
+# La comparten la versión de consola y la app de Streamlit: ambas consultan
+# aquí antes de llamar al LLM, así una ciudad generada hace unos minutos se
+# sirve desde disco en milisegundos.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import NamedTuple
+
+from src.ciudades import clave_ciudad
+
+
+class EntradaCache(NamedTuple):
+    """Respuesta almacenada en la caché."""
+
+    ciudad: str
+    texto: str
+    creado: float
+    modelo: str | None = None   # Modelo que generó la respuesta
+    planes: str | None = None   # Planes ya validados, en JSON (src/planes.py)
+
+
+def normalizar_ciudad(ciudad: str) -> str:
+    """
+    Normaliza el nombre de la ciudad para usarlo como parte de la clave.
+
+    Args:
+        ciudad: Nombre de la ciudad tal y como lo escribió el usuario.
+
+    Returns:
+        Nombre canónico plegado (sin tildes, mayúsculas, país ni alias; ver
+        src/ciudades.py), igual para "MALAGA " y "Málaga, España".
+    """
+    return clave_ciudad(ciudad)
+
+
+def clave_cache(
+    ciudad: str,
+    mensajes: list[dict],
+    modelo: str,
+    max_tokens: int,
+    temperatura: float,
+) -> str:
+    """
+    Construye la clave de caché de una consulta.
+
+    La clave combina la ciudad normalizada con un hash de los parámetros de
+    generación y del prompt, de modo que cambiar el modelo o el prompt
+    invalida automáticamente las respuestas anteriores.
+
+    Args:
+        ciudad: Nombre de la ciudad.
+        mensajes: Mensajes de construir_prompt, generados con un marcador en
+            lugar de la ciudad para que la huella dependa solo de la
+            plantilla del prompt.
+        modelo: Identificador del modelo.
+        max_tokens: Límite de tokens de la generación.
+        temperatura: Temperatura de muestreo.
+
+    Returns:
+        Clave de la forma '<ciudad normalizada>:<hash>'.
+    """
+    parametros = json.dumps(
+        [modelo, max_tokens, temperatura, mensajes],
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    huella = hashlib.sha256(parametros.encode("utf-8")).hexdigest()[:16]
+    return f"{normalizar_ciudad(ciudad)}:{huella}"
+
+
+class CacheRespuestas:
+    """
+    Caché de respuestas respaldada por SQLite con caducidad (TTL) y
+    desalojo LRU cuando se supera el número máximo de entradas.
+
+    Cada hilo usa su propia conexión y la base de datos trabaja en modo WAL,
+    por lo que varios hilos (o procesos) pueden leer y escribir a la vez.
+    Los errores de SQLite nunca se propagan: la caché es una optimización y
+    un fallo en ella solo provoca una llamada normal al modelo. Si ni
+    siquiera se puede crear (directorio sin permisos, fichero corrupto...),
+    queda desactivada: todas las búsquedas fallan y nada se guarda.
+    """
+
+    def __init__(self, ruta: str, ttl: float, max_entradas: int):
+        self.ruta = ruta
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._local = threading.local()
+        self._lock_escritura = threading.Lock()
+        self.activa = True
+
+        try:
+            self._crear_tabla()
+        except (OSError, sqlite3.Error):
+            self.activa = False
+
+    def _crear_tabla(self):
+        """Crea el directorio, la tabla y los índices, y migra cachés antiguas."""
+        directorio = os.path.dirname(self.ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+
+        with self._conexion() as conexion:
+            conexion.execute(
+                "CREATE TABLE IF NOT EXISTS respuestas ("
+                " clave TEXT PRIMARY KEY,"
+                " ciudad TEXT NOT NULL,"
+                " texto TEXT NOT NULL,"
+                " creado REAL NOT NULL,"
+                " accedido REAL NOT NULL,"
+                " modelo TEXT,"
+                " planes TEXT)"
+            )
+            # Migración de cachés creadas con versiones anteriores
+            columnas = {fila[1] for fila in conexion.execute("PRAGMA table_info(respuestas)")}
+            for columna in ("modelo", "planes"):
+                if columna not in columnas:
+                    conexion.execute(f"ALTER TABLE respuestas ADD COLUMN {columna} TEXT")
+            conexion.execute(
+                "CREATE INDEX IF NOT EXISTS idx_respuestas_accedido "
+                "ON respuestas (accedido)"
+            )
+
+    def _conexion(self) -> sqlite3.Connection:
+        """Devuelve la conexión SQLite del hilo actual (la crea si no existe)."""
+        if not self.activa:
+            # Los métodos públicos tratan esto como cualquier fallo de SQLite
+            raise sqlite3.OperationalError(f"caché desactivada: {self.ruta}")
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=10)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+        return conexion
+
+    def obtener(self, clave: str) -> EntradaCache | None:
+        """
+        Busca una respuesta en la caché.
+
+        Args:
+            clave: Clave generada con clave_cache.
+
+        Returns:
+            La entrada si existe y no ha caducado, o None.
+        """
+        ahora = time.time()
+        try:
+            conexion = self._conexion()
+            fila = conexion.execute(
+                "SELECT ciudad, texto, creado, modelo, planes FROM respuestas WHERE clave = ?",
+                (clave,),
+            ).fetchone()
+
+            if fila is None:
+                return None
+
+            entrada = EntradaCache(*fila)
+            with conexion:
+                if ahora - entrada.creado > self.ttl:
+                    conexion.execute("DELETE FROM respuestas WHERE clave = ?", (clave,))
+                    return None
+                conexion.execute(
+                    "UPDATE respuestas SET accedido = ? WHERE clave = ?",
+                    (ahora, clave),
+                )
+            return entrada
+        except sqlite3.Error:
+            return None
+
+    def guardar(
+        self,
+        clave: str,
+        ciudad: str,
+        texto: str,
+        modelo: str | None = None,
+        planes: str | None = None,
+    ):
+        """
+        Guarda (o reemplaza) una respuesta y desaloja las menos usadas si se
+        supera el tamaño máximo.
+
+        Args:
+            clave: Clave generada con clave_cache.
+            ciudad: Nombre de la ciudad tal y como se consultó.
+            texto: Respuesta del modelo.
+            modelo: Modelo que generó la respuesta (puede ser uno de
+                respaldo distinto del que forma parte de la clave).
+            planes: Planes validados serializados en JSON, para no tener
+                que volver a parsear el texto al leerlo.
+        """
+        ahora = time.time()
+        try:
+            conexion = self._conexion()
+            with self._lock_escritura, conexion:
+                conexion.execute(
+                    "INSERT OR REPLACE INTO respuestas "
+                    "(clave, ciudad, texto, creado, accedido, modelo, planes) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (clave, ciudad, texto, ahora, ahora, modelo, planes),
+                )
+                conexion.execute(
+                    "DELETE FROM respuestas WHERE clave IN ("
+                    " SELECT clave FROM respuestas"
+                    " ORDER BY accedido DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entradas,),
+                )
+        except sqlite3.Error:
+            pass
+
+    def recorrer(self) -> list[EntradaCache]:
+        """
+        Todas las entradas que no han caducado, sin marcarlas como usadas
+        (p. ej. para indexarlas en src/indice.py).
+        """
+        try:
+            filas = self._conexion().execute(
+                "SELECT ciudad, texto, creado, modelo, planes FROM respuestas WHERE creado >= ?",
+                (time.time() - self.ttl,),
+            ).fetchall()
+        except sqlite3.Error:
+            return []
+        return [EntradaCache(*fila) for fila in filas]
+
+    def limpiar(self):
+        """Elimina todas las entradas de la caché."""
+        try:
+            conexion = self._conexion()
+            with self._lock_escritura, conexion:
+                conexion.execute("DELETE FROM respuestas")
+        except sqlite3.Error:
+            pass
+
+    def __len__(self) -> int:
+        try:
+            return self._conexion().execute(
+                "SELECT COUNT(*) FROM respuestas"
+            ).fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+
+# ── Instancias compartidas por proceso ───────────────────────────────────────
+_caches: dict[str, CacheRespuestas] = {}
+_lock_caches = threading.Lock()
+
+
+def obtener_cache(ruta: str, ttl: float, max_entradas: int) -> CacheRespuestas:
+    """
+    Devuelve la caché asociada a una ruta, creándola la primera vez.
+
+    Todos los hilos del proceso (p. ej. las sesiones de Streamlit) comparten
+    la misma instancia.
+
+    Args:
+        ruta: Ruta del fichero SQLite.
+        ttl: Segundos de vida de cada entrada.
+        max_entradas: Número máximo de respuestas almacenadas.
+
+    Returns:
+        Instancia de CacheRespuestas.
+    """
+    with _lock_caches:
+        cache = _caches.get(ruta)
+        if cache is None:
+            cache = CacheRespuestas(ruta, ttl, max_entradas)
+            _caches[ruta] = cache
+        return cache
@@ -0,0 +1,163 @@
+# src/calentamiento.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Precalentamiento de la caché con las ciudades más pedidas.
+# Las sugerencias de la pantalla inicial (Madrid, Barcelona...) son justo lo
+# que escribe quien entra por primera vez, y cada una cuesta una llamada en
+# frío al modelo. Un hilo en segundo plano las genera al arrancar, con baja
+# prioridad: solo llama al modelo cuando el limitador de tasa no tiene a
+# nadie esperando y le sobran fichas, para no quitar cuota a los usuarios.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Resultado de cada ciudad → contador de las estadísticas
+_CONTADORES = {"generada": "generadas", "en_cache": "en_cache", "error": "errores"}
+
+
+class Calentamiento:
+    """
+    Genera en segundo plano las ciudades indicadas que no estén ya en la
+    caché. Si `intervalo` > 0, repite la pasada cada `intervalo` segundos
+    para que no caduquen.
+    """
+
+    def __init__(
+        self,
+        ciudades: list[str],
+        generar,
+        en_cache=None,
+        limitador=None,
+        concurrencia: int = 1,
+        fichas_minimas: float = 1.0,
+        intervalo: float = 0.0,
+        pausa: float = 0.5,
+        al_calentar=None,
+    ):
+        """
+        Args:
+            ciudades: Ciudades a precalentar, por orden de prioridad.
+            generar: Función (ciudad) que genera y guarda en la caché.
+            en_cache: Función opcional (ciudad) -> bool para saltarse las
+                que ya están guardadas sin llamar a `generar`.
+            limitador: LimitadorTasa compartido; si se indica, se espera a
+                que no haya cola y queden al menos `fichas_minimas`.
+            concurrencia: Ciudades que se generan a la vez.
+            fichas_minimas: Fichas libres que deben quedar en el limitador.
+            intervalo: Segundos entre pasadas (0 = una sola pasada).
+            pausa: Segundos entre comprobaciones del limitador.
+            al_calentar: Función opcional (ciudad, resultado) llamada tras
+                cada ciudad; resultado es "generada", "en_cache" o "error".
+        """
+        self.ciudades = list(dict.fromkeys(ciudades))
+        self._generar = generar
+        self._en_cache = en_cache
+        self._limitador = limitador
+        self._concurrencia = max(1, concurrencia)
+        self._fichas_minimas = fichas_minimas
+        self._intervalo = intervalo
+        self._pausa = pausa
+        self._al_calentar = al_calentar
+
+        self._parar = threading.Event()
+        self._terminado = threading.Event()
+        self._hilo: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._contadores = {"generadas": 0, "en_cache": 0, "errores": 0}
+        self._pasadas = 0
+
+    # ── Ciclo de vida ────────────────────────────────────────────────────────
+    def iniciar(self) -> "Calentamiento":
+        """Arranca el hilo en segundo plano (solo la primera vez)."""
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._bucle, name="calentamiento", daemon=True)
+            self._hilo.start()
+        return self
+
+    def detener(self):
+        """Pide al hilo que pare tras la ciudad en curso."""
+        self._parar.set()
+
+    def esperar(self, timeout: float | None = None) -> bool:
+        """
+        Espera a que termine la primera pasada.
+
+        Returns:
+            True si terminó antes del timeout.
+        """
+        return self._terminado.wait(timeout)
+
+    def ejecutar(self):
+        """Hace una pasada en el hilo actual (p. ej. desde la consola)."""
+        self._pasada()
+
+    # ── Trabajo ──────────────────────────────────────────────────────────────
+    def _bucle(self):
+        try:
+            self._pasada()
+        finally:
+            self._terminado.set()
+        while self._intervalo > 0 and not self._parar.wait(self._intervalo):
+            self._pasada()
+
+    def _pasada(self):
+        with ThreadPoolExecutor(self._concurrencia, thread_name_prefix="calentamiento") as grupo:
+            list(grupo.map(self._calentar, self.ciudades))
+        with self._lock:
+            self._pasadas += 1
+
+    def _calentar(self, ciudad: str):
+        if self._parar.is_set():
+            return
+        if self._en_cache and self._en_cache(ciudad):
+            self._contar(ciudad, "en_cache")
+            return
+        if not self._esperar_turno():
+            return
+        try:
+            self._generar(ciudad)
+        except Exception:
+            self._contar(ciudad, "error")  # Se reintentará en la próxima pasada
+        else:
+            self._contar(ciudad, "generada")
+
+    def _esperar_turno(self) -> bool:
+        """
+        Cede el paso a los usuarios: espera a que el limitador no tenga cola
+        y le sobren fichas.
+
+        Returns:
+            False si se pidió parar mientras se esperaba.
+        """
+        while not self._parar.is_set():
+            if self._limitador is None:
+                return True
+            estado = self._limitador.estadisticas()
+            minimas = min(self._fichas_minimas, estado["rafaga"])
+            if estado["en_cola"] == 0 and estado["fichas"] >= minimas:
+                return True
+            self._parar.wait(self._pausa)
+        return False
+
+    def _contar(self, ciudad: str, resultado: str):
+        with self._lock:
+            self._contadores[_CONTADORES[resultado]] += 1
+        if self._al_calentar:
+            self._al_calentar(ciudad, resultado)
+
+    def estadisticas(self) -> dict:
+        """
+        Returns:
+            Dict con el total de ciudades, las generadas, las que ya estaban
+            en la caché, los errores (acumulados entre pasadas), las pasadas
+            completas y si sigue activo.
+        """
+        with self._lock:
+            return {
+                "ciudades": len(self.ciudades),
+                **self._contadores,
+                "pasadas": self._pasadas,
+                "activo": self._hilo is not None and self._hilo.is_alive(),
+            }
+
@@ -0,0 +1,273 @@
+# src/ciudades.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Canonización de nombres de ciudad e índice para autocompletar.
+# "malaga", "Málaga", "Málaga, España" y "MALAGA " son la misma ciudad y
+# deben compartir una sola entrada de caché (y una sola llamada al modelo).
+# Aquí se pliegan tildes y mayúsculas, se quitan los sufijos de país o
+# región, se resuelven alias ("BCN", "Seville", "La Coruña") y se busca el
+# nombre canónico en un índice en memoria de ciudades conocidas. El mismo
+# índice (prefijos + trigramas) da las sugerencias de la caja de búsqueda.
+# Sin dependencias de Streamlit: lo usa también la versión de consola.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import bisect
+import re
+import threading
+import unicodedata
+
+# Capitales de provincia y ciudades más buscadas, con su grafía canónica
+CIUDADES_CONOCIDAS = (
+    "A Coruña", "Albacete", "Alcalá de Henares", "Algeciras", "Alicante",
+    "Almería", "Ávila", "Badajoz", "Badalona", "Barcelona", "Benidorm",
+    "Bilbao", "Burgos", "Cáceres", "Cádiz", "Cartagena", "Castellón de la Plana",
+    "Ceuta", "Ciudad Real", "Córdoba", "Cuenca", "Elche", "Gijón", "Girona",
+    "Granada", "Guadalajara", "Huelva", "Huesca", "Ibiza", "Jaén", "Jerez de la Frontera",
+    "Las Palmas de Gran Canaria", "León", "Lleida", "Logroño", "Lugo", "Madrid",
+    "Málaga", "Marbella", "Melilla", "Mérida", "Murcia", "Ourense", "Oviedo",
+    "Palencia", "Palma", "Pamplona", "Pontevedra", "Salamanca", "San Sebastián",
+    "Santa Cruz de Tenerife", "Santander", "Santiago de Compostela", "Segovia",
+    "Sevilla", "Soria", "Tarragona", "Teruel", "Toledo", "Valencia", "Valladolid",
+    "Vigo", "Vitoria", "Zamora", "Zaragoza",
+    # Destinos internacionales frecuentes, con su nombre en español
+    "Ámsterdam", "Atenas", "Berlín", "Bruselas", "Buenos Aires", "Ciudad de México",
+    "Copenhague", "Dublín", "Florencia", "Lisboa", "Londres", "Milán", "Múnich",
+    "Nueva York", "Oporto", "París", "Praga", "Roma", "Venecia", "Viena",
+)
+
+# Otras formas de escribir una ciudad (ya plegadas) → nombre canónico
+ALIAS = {
+    "bcn": "Barcelona",
+    "la coruna": "A Coruña",
+    "coruna": "A Coruña",
+    "corunna": "A Coruña",
+    "alacant": "Alicante",
+    "elx": "Elche",
+    "castello": "Castellón de la Plana",
+    "castellon": "Castellón de la Plana",
+    "gerona": "Girona",
+    "lerida": "Lleida",
+    "orense": "Ourense",
+    "palma de mallorca": "Palma",
+    "iruna": "Pamplona",
+    "pamplona iruna": "Pamplona",
+    "donostia": "San Sebastián",
+    "donostia san sebastian": "San Sebastián",
+    "vitoria gasteiz": "Vitoria",
+    "gasteiz": "Vitoria",
+    "bilbo": "Bilbao",
+    "seville": "Sevilla",
+    "saragossa": "Zaragoza",
+    "tenerife": "Santa Cruz de Tenerife",
+    "las palmas": "Las Palmas de Gran Canaria",
+    "gran canaria": "Las Palmas de Gran Canaria",
+    "santiago": "Santiago de Compostela",
+    "jerez": "Jerez de la Frontera",
+    "amsterdam": "Ámsterdam",
+    "athens": "Atenas",
+    "brussels": "Bruselas",
+    "bruxelles": "Bruselas",
+    "mexico df": "Ciudad de México",
+    "cdmx": "Ciudad de México",
+    "copenhagen": "Copenhague",
+    "florence": "Florencia",
+    "firenze": "Florencia",
+    "lisbon": "Lisboa",
+    "london": "Londres",
+    "milan": "Milán",
+    "milano": "Milán",
+    "munich": "Múnich",
+    "munchen": "Múnich",
+    "new york": "Nueva York",
+    "nyc": "Nueva York",
+    "porto": "Oporto",
+    "paris": "París",
+    "prague": "Praga",
+    "praha": "Praga",
+    "rome": "Roma",
+    "venice": "Venecia",
+    "venezia": "Venecia",
+    "vienna": "Viena",
+    "wien": "Viena",
+}
+
+# Países que se quitan también sin coma ("Málaga España")
+_PAISES = ("espana", "spain")
+
+# Partículas que no se capitalizan en los nombres desconocidos
+_PARTICULAS = {"de", "del", "la", "las", "los", "el", "y", "i", "d", "l"}
+
+# Calificadores tras una coma, entre paréntesis o tras " - " ("Málaga, España")
+_PATRON_CALIFICADOR = re.compile(r"\s*(?:,|\(|\s-\s|/).*$")
+_PATRON_NO_ALFANUMERICO = re.compile(r"[^\w]+")
+
+
+def plegar(texto: str) -> str:
+    """
+    Forma de comparación de un nombre: sin tildes ni diéresis, en
+    minúsculas, con guiones y apóstrofos como espacios y sin espacios
+    sobrantes ("  Castro-Urdiales " → "castro urdiales").
+    """
+    descompuesto = unicodedata.normalize("NFKD", texto.casefold())
+    sin_marcas = "".join(c for c in descompuesto if not unicodedata.combining(c))
+    return " ".join(_PATRON_NO_ALFANUMERICO.sub(" ", sin_marcas).split())
+
+
+def limpiar(ciudad: str) -> str:
+    """
+    Quita espacios sobrantes y los calificadores de país o región:
+    "Málaga, España", "Málaga (España)" y "Málaga España" → "Málaga".
+    """
+    ciudad = _PATRON_CALIFICADOR.sub("", " ".join(ciudad.split())).strip(" .,;-")
+    palabras = ciudad.split()
+    if len(palabras) > 1 and plegar(palabras[-1]) in _PAISES:
+        ciudad = " ".join(palabras[:-1])
+    return ciudad
+
+
+def _capitalizar(ciudad: str) -> str:
+    """Como str.title(), pero sin capitalizar las partículas ("Castro de Rei")."""
+    palabras = ciudad.lower().split()
+    return " ".join(
+        p if i and p in _PARTICULAS else p[:1].upper() + p[1:]
+        for i, p in enumerate(palabras)
+    )
+
+
+def _trigramas(plegado: str) -> set[str]:
+    relleno = f"  {plegado} "
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+class IndiceCiudades:
+    """
+    Índice en memoria de ciudades conocidas.
+
+    Guarda cada nombre plegado en una lista ordenada (búsqueda de prefijos
+    con bisect, tanto del nombre completo como de cada palabra) y en un
+    índice invertido de trigramas para las sugerencias con erratas.
+    """
+
+    def __init__(self, ciudades=()):
+        self._lock = threading.Lock()
+        self._nombres: dict[str, str] = {}         # plegado → nombre canónico
+        self._prefijos: list[tuple[str, str]] = []  # (palabra o nombre, plegado), ordenada
+        self._trigramas: dict[str, set[str]] = {}   # trigrama → plegados
+        for ciudad in ciudades:
+            self.anadir(ciudad)
+
+    def __len__(self) -> int:
+        return len(self._nombres)
+
+    def anadir(self, ciudad: str):
+        """Añade una ciudad con su grafía canónica (si no estaba ya)."""
+        plegado = plegar(ciudad)
+        if not plegado:
+            return
+        with self._lock:
+            if plegado in self._nombres:
+                return
+            self._nombres[plegado] = ciudad
+            palabras = plegado.split()
+            for entrada in {plegado, *palabras[1:]}:
+                bisect.insort(self._prefijos, (entrada, plegado))
+            for trigrama in _trigramas(plegado):
+                self._trigramas.setdefault(trigrama, set()).add(plegado)
+
+    def buscar(self, texto: str) -> str | None:
+        """Nombre canónico de una ciudad conocida (comparación exacta plegada)."""
+        return self._nombres.get(plegar(texto))
+
+    def sugerir(self, texto: str, limite: int = 6) -> list[str]:
+        """
+        Ciudades que empiezan por `texto` (el nombre o alguna de sus
+        palabras) y, si faltan, las más parecidas por trigramas.
+
+        Returns:
+            Hasta `limite` nombres canónicos, los prefijos primero.
+        """
+        plegado = plegar(texto)
+        if not plegado:
+            return []
+
+        with self._lock:
+            encontrados: list[str] = []
+            inicio = bisect.bisect_left(self._prefijos, (plegado,))
+            for entrada, nombre in self._prefijos[inicio:]:
+                if not entrada.startswith(plegado):
+                    break
+                if nombre not in encontrados:
+                    encontrados.append(nombre)
+            # Primero los nombres que empiezan así, luego por una palabra
+            encontrados.sort(key=lambda n: (not n.startswith(plegado), len(n)))
+
+            if len(encontrados) < limite and len(plegado) >= 3:
+                buscados = _trigramas(plegado)
+                comunes: dict[str, int] = {}
+                for trigrama in buscados:
+                    for nombre in self._trigramas.get(trigrama, ()):
+                        comunes[nombre] = comunes.get(nombre, 0) + 1
+                # Coeficiente de Dice entre los conjuntos de trigramas
+                parecidos = sorted(
+                    (
+                        (2 * n / (len(buscados) + len(_trigramas(nombre))), nombre)
+                        for nombre, n in comunes.items()
+                        if nombre not in encontrados
+                    ),
+                    reverse=True,
+                )
+                encontrados += [nombre for puntos, nombre in parecidos if puntos >= 0.4]
+
+            return [self._nombres[nombre] for nombre in encontrados[:limite]]
+
+
+# ── Instancia compartida por proceso ─────────────────────────────────────────
+_indice = IndiceCiudades(CIUDADES_CONOCIDAS)
+
+
+def obtener_indice() -> IndiceCiudades:
+    """Devuelve el índice de ciudades del proceso."""
+    return _indice
+
+
+def canonizar(ciudad: str) -> str | None:
+    """
+    Nombre canónico de una ciudad tal y como la escribió el usuario.
+
+    Se limpian los calificadores de país, se resuelven los alias y se busca
+    en el índice de ciudades conocidas; si no está, se devuelve el nombre
+    limpio con mayúsculas iniciales ("castro de rei" → "Castro de Rei").
+
+    Args:
+        ciudad: Texto introducido.
+
+    Returns:
+        Nombre con el que se pide al modelo y se muestra en la interfaz, o
+        None si al limpiarlo no queda nada (", España", "(Spain)").
+    """
+    limpio = limpiar(ciudad)
+    plegado = plegar(limpio)
+    if not plegado:
+        return None
+    return ALIAS.get(plegado) or _indice.buscar(plegado) or _capitalizar(limpio)
+
+
+def exigir_ciudad(ciudad: str) -> str:
+    """
+    Como canonizar, para las funciones que generan planes.
+
+    Raises:
+        ValueError: Si el texto no contiene el nombre de una ciudad.
+    """
+    canonica = canonizar(ciudad)
+    if canonica is None:
+        raise ValueError(f"'{ciudad.strip()}' no contiene el nombre de una ciudad.")
+    return canonica
+
+
+def clave_ciudad(ciudad: str) -> str:
+    """
+    Clave de una ciudad: la misma para todas sus variantes ("MALAGA ",
+    "Málaga, España"...). Es la que forma parte de la clave de caché
+    (vacía si el texto no contiene ninguna ciudad).
+    """
+    return plegar(canonizar(ciudad) or "")
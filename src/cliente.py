@@ -0,0 +1,131 @@
+# src/cliente.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Gestor del cliente de inferencia compartido por todo el proceso.
+# Construir un InferenceClient nuevo en cada consulta desaprovecha las
+# conexiones HTTP keep-alive y obliga a repetir el handshake TLS; aquí se
+# crea una única vez y se reutiliza desde todos los hilos.
+# huggingface_hub se importa al crear el cliente, no al cargar el módulo:
+# cuesta unos 300 ms y no hace falta si la respuesta sale de la caché.
+# ─────────────────────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import threading
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from huggingface_hub import InferenceClient
+
+# Hosts que intervienen en una consulta: resolución del proveedor del modelo
+# y router de inferencia. Se contactan al precalentar la conexión.
+HOSTS_INFERENCIA = (
+    "https://huggingface.co",
+    "https://router.huggingface.co",
+)
+
+
+class GestorCliente:
+    """
+    Mantiene un InferenceClient por proceso, reconstruido solo si cambia el
+    token o la URL base.
+
+    El cliente no guarda estado entre llamadas y delega las conexiones en la
+    sesión HTTP de huggingface_hub (get_session), que mantiene el pool de
+    conexiones y es segura entre hilos (desde huggingface_hub 1.0 es un
+    único cliente httpx para todo el proceso; en 0.x, una sesión por hilo).
+    Por eso una misma instancia puede atender a todas las sesiones de
+    Streamlit o a los hilos del modo por lotes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # ((token, url base), cliente) en una sola tupla para leerla de forma atómica
+        self._actual: tuple[tuple[str, str | None], InferenceClient] | None = None
+
+    def obtener(self, token: str, base_url: str | None = None) -> InferenceClient:
+        """
+        Devuelve el cliente compartido, creándolo la primera vez.
+
+        Args:
+            token: Token de la API de Hugging Face.
+            base_url: URL de un servidor compatible con chat completions
+                (p. ej. el servidor simulado de bench/), o None para usar
+                la API de Hugging Face.
+
+        Returns:
+            Instancia compartida de InferenceClient.
+        """
+        clave = (token, base_url)
+        actual = self._actual
+        if actual is not None and actual[0] == clave:
+            return actual[1]
+
+        with self._lock:
+            if self._actual is None or self._actual[0] != clave:
+                from huggingface_hub import InferenceClient
+
+                self._actual = (clave, InferenceClient(token=token, base_url=base_url))
+            return self._actual[1]
+
+    def precalentar(self, token: str, en_segundo_plano: bool = True, base_url: str | None = None):
+        """
+        Crea el cliente y abre de antemano las conexiones con la API, para
+        que la primera consulta real no pague el coste de DNS + TLS.
+
+        Los errores se ignoran: si no hay red, la consulta real lo indicará.
+
+        Args:
+            token: Token de la API de Hugging Face.
+            en_segundo_plano: Si es True, no bloquea al llamador.
+            base_url: URL base del servidor de inferencia (ver obtener).
+        """
+        if en_segundo_plano:
+            # También la creación del cliente (e importar huggingface_hub),
+            # para no retrasar el primer render de la app
+            threading.Thread(
+                target=self._precalentar,
+                args=(token, base_url),
+                name="precalentar-cliente",
+                daemon=True,
+            ).start()
+        else:
+            self._precalentar(token, base_url)
+
+    def _precalentar(self, token: str, base_url: str | None):
+        self.obtener(token, base_url)
+        self._abrir_conexiones((base_url,) if base_url else HOSTS_INFERENCIA)
+
+    @staticmethod
+    def _abrir_conexiones(hosts: tuple[str, ...]):
+        """Hace una petición ligera a cada host para dejar la conexión abierta."""
+        from huggingface_hub.utils import get_session
+
+        sesion = get_session()
+        for host in hosts:
+            try:
+                sesion.head(host, timeout=5)
+            except Exception:
+                pass
+
+
+# ── Instancia compartida por proceso ─────────────────────────────────────────
+_gestor = GestorCliente()
+
+
+def obtener_gestor() -> GestorCliente:
+    """Devuelve el gestor de cliente del proceso."""
+    return _gestor
+
+
+def obtener_cliente(token: str, base_url: str | None = None) -> InferenceClient:
+    """
+    Atajo para obtener el InferenceClient compartido.
+
+    Args:
+        token: Token de la API de Hugging Face.
+        base_url: URL base del servidor de inferencia, o None para Hugging Face.
+
+    Returns:
+        Instancia compartida de InferenceClient.
+    """
+    return _gestor.obtener(token, base_url)
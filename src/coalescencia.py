@@ -0,0 +1,136 @@
+# src/coalescencia.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Coalescencia de peticiones ("single-flight"): si varias sesiones piden a la
+# vez la misma ciudad, solo una llama al modelo y el resto espera y recibe
+# su mismo resultado (o su misma excepción).
+# ─────────────────────────────────────────────────────────────────────────────
+
+import threading
+
+
+class VueloAbandonadoError(Exception):
+    """El líder de un vuelo lo dejó sin terminar (p. ej. se cerró el stream)."""
+
+
+class Vuelo:
+    """Una generación en curso a la que pueden unirse otros llamadores."""
+
+    __slots__ = ("_evento", "resultado", "error")
+
+    def __init__(self):
+        self._evento = threading.Event()
+        self.resultado = None
+        self.error: BaseException | None = None
+
+    def esperar(self):
+        """
+        Bloquea hasta que el líder termine.
+
+        Returns:
+            El resultado del líder.
+
+        Raises:
+            La excepción del líder, si falló.
+        """
+        self._evento.wait()
+        if self.error is not None:
+            raise self.error
+        return self.resultado
+
+
+class GrupoVuelo:
+    """
+    Agrupa las llamadas concurrentes con la misma clave.
+
+    El primer llamador de una clave es el líder y ejecuta la generación; los
+    que llegan mientras tanto se unen al vuelo y reciben su resultado. Los
+    contadores permiten ver cuántas llamadas al modelo se han ahorrado.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._vuelos: dict[str, Vuelo] = {}
+        self.llamadas = 0
+        self.coalescidas = 0
+
+    def unirse(self, clave: str) -> tuple[Vuelo, bool]:
+        """
+        Se une al vuelo de una clave o lo crea si no existe.
+
+        Returns:
+            (vuelo, es_lider). El líder debe llamar después a completar.
+        """
+        with self._lock:
+            self.llamadas += 1
+            vuelo = self._vuelos.get(clave)
+            if vuelo is not None:
+                self.coalescidas += 1
+                return vuelo, False
+            vuelo = Vuelo()
+            self._vuelos[clave] = vuelo
+            return vuelo, True
+
+    def liderar(self, clave: str) -> Vuelo | None:
+        """
+        Crea el vuelo de una clave solo si no hay ninguno en curso, sin
+        contarlo como llamada (p. ej. para una regeneración en segundo plano).
+
+        Returns:
+            El vuelo nuevo (quien lo recibe debe llamar a completar), o None
+            si la clave ya se está generando.
+        """
+        with self._lock:
+            if clave in self._vuelos:
+                return None
+            vuelo = self._vuelos[clave] = Vuelo()
+            return vuelo
+
+    def completar(self, clave: str, vuelo: Vuelo, resultado=None, error: BaseException | None = None):
+        """Publica el resultado del líder y despierta a los que esperan."""
+        with self._lock:
+            if self._vuelos.get(clave) is vuelo:
+                del self._vuelos[clave]
+        vuelo.resultado = resultado
+        vuelo.error = error
+        vuelo._evento.set()
+
+    def ejecutar(self, clave: str, funcion):
+        """
+        Ejecuta `funcion()` una sola vez para todas las llamadas simultáneas
+        con la misma clave.
+
+        Args:
+            clave: Clave de la petición (ciudad normalizada + prompt).
+            funcion: Llamable sin argumentos que genera el resultado.
+
+        Returns:
+            El resultado de `funcion`, propio o del líder.
+        """
+        while True:
+            vuelo, es_lider = self.unirse(clave)
+            if not es_lider:
+                try:
+                    return vuelo.esperar()
+                except VueloAbandonadoError:
+                    continue  # El líder se fue: se intenta liderar de nuevo
+
+            try:
+                resultado = funcion()
+            except BaseException as e:
+                self.completar(clave, vuelo, error=e)
+                raise
+            self.completar(clave, vuelo, resultado=resultado)
+            return resultado
+
+    def estadisticas(self) -> dict:
+        """
+        Returns:
+            Dict con 'llamadas' totales, 'coalescidas' (las que esperaron a
+            otra en curso) y 'en_vuelo' (generaciones activas ahora mismo).
+        """
+        with self._lock:
+            return {
+                "llamadas": self.llamadas,
+                "coalescidas": self.coalescidas,
+                "en_vuelo": len(self._vuelos),
+            }
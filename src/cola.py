@@ -0,0 +1,168 @@
+# src/cola.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Cola de búsquedas en segundo plano para la app.
+# Una búsqueda puede tardar la generación entera más las esperas entre
+# reintentos; si se ejecuta en el hilo del script, la página queda
+# bloqueada todo ese tiempo. Aquí cada búsqueda es un trabajo que se envía
+# a un grupo de hilos compartido por el proceso: la interfaz consulta su
+# estado, muestra el progreso (mensajes de callback_estado y planes ya
+# recibidos) y puede cancelar los que aún no han terminado.
+# Sin dependencias de Streamlit.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import itertools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from src.metricas import METRICA_FASES, obtener_registro, tramo
+from src.parser import ParserPlanes
+from src.planes import Plan
+
+# Estados de un trabajo
+PENDIENTE = "pendiente"
+EN_CURSO = "en_curso"
+COMPLETADO = "completado"
+ERROR = "error"
+CANCELADO = "cancelado"
+
+_TERMINADOS = (COMPLETADO, ERROR, CANCELADO)
+_ids = itertools.count(1)
+
+
+class Trabajo:
+    """
+    Una búsqueda enviada a la cola.
+
+    Los campos los escribe el hilo que la ejecuta y los lee la interfaz;
+    cada uno se asigna de una vez, así que se pueden leer sin bloqueo.
+    """
+
+    def __init__(self, ciudad: str):
+        self.id = next(_ids)
+        self.ciudad = ciudad
+        self.estado = PENDIENTE
+        self.mensaje = "En cola..."       # Último mensaje de progreso
+        self.planes: list[Plan] = []      # Planes recibidos hasta ahora
+        self.resultado: list[Plan] | str | None = None
+        self.error: Exception | None = None
+        self.creado = time.time()
+        self.terminado: float | None = None
+        self._cancelar = threading.Event()
+        self._futuro: Future | None = None
+
+    @property
+    def activo(self) -> bool:
+        """Si aún no ha terminado (pendiente o en curso)."""
+        return self.estado not in _TERMINADOS
+
+    def cancelar(self) -> bool:
+        """
+        Cancela el trabajo. Si está pendiente se retira de la cola; si está
+        en curso, se deja de leer la respuesta en el siguiente fragmento
+        (una espera entre reintentos no se interrumpe).
+
+        Returns:
+            False si ya había terminado.
+        """
+        if not self.activo:
+            return False
+        self._cancelar.set()
+        if self._futuro is not None and self._futuro.cancel():
+            self._terminar(CANCELADO, "Cancelada")
+        return True
+
+    def _reportar(self, mensaje: str):
+        """callback_estado de la búsqueda."""
+        self.mensaje = mensaje
+
+    def _terminar(self, estado: str, mensaje: str):
+        self.mensaje = mensaje
+        self.terminado = time.time()
+        self.estado = estado
+
+
+class ColaBusquedas:
+    """
+    Ejecuta búsquedas en un grupo de hilos compartido.
+
+    `buscar(ciudad, callback_estado)` debe devolver un iterable de
+    fragmentos de texto con `close()` y, al agotarse, los atributos
+    `planes` y `texto` (como obtener_planes_stream).
+    """
+
+    def __init__(self, buscar, trabajadores: int = 4):
+        self._buscar = buscar
+        self._grupo = ThreadPoolExecutor(max(1, trabajadores), thread_name_prefix="busqueda")
+        self._lock = threading.Lock()
+        self._contadores = {estado: 0 for estado in _TERMINADOS}
+
+    def enviar(self, ciudad: str) -> Trabajo:
+        """Encola la búsqueda de una ciudad y devuelve su trabajo."""
+        trabajo = Trabajo(ciudad)
+        trabajo._futuro = self._grupo.submit(self._ejecutar, trabajo)
+        trabajo._futuro.add_done_callback(lambda futuro: self._contar(trabajo, futuro))
+        return trabajo
+
+    def _ejecutar(self, trabajo: Trabajo):
+        if trabajo._cancelar.is_set():
+            trabajo._terminar(CANCELADO, "Cancelada")
+            return
+
+        # Tiempo de espera en la cola, como una fase más de la consulta
+        obtener_registro().observar(METRICA_FASES, time.time() - trabajo.creado, fase="cola")
+        trabajo.estado = EN_CURSO
+        trabajo.mensaje = "Buscando planes..."
+        parser = ParserPlanes()
+        try:
+            with tramo("buscar"):
+                flujo = self._buscar(trabajo.ciudad, trabajo._reportar)
+                try:
+                    for fragmento in flujo:
+                        if trabajo._cancelar.is_set():
+                            trabajo._terminar(CANCELADO, "Cancelada")
+                            return
+                        nuevos = parser.alimentar(fragmento)
+                        if nuevos:
+                            trabajo.planes = trabajo.planes + [Plan(*fila) for fila in nuevos]
+                            trabajo.mensaje = f"{len(trabajo.planes)} planes recibidos..."
+                finally:
+                    flujo.close()
+        except Exception as e:
+            trabajo.error = e
+            trabajo._terminar(ERROR, str(e))
+            return
+
+        # Se guardan los planes ya validados; si no se reconoció ninguno,
+        # el texto plano (como en la búsqueda directa)
+        trabajo.resultado = flujo.planes or flujo.texto
+        trabajo._terminar(COMPLETADO, "Completada")
+
+    def _contar(self, trabajo: Trabajo, futuro: Future):
+        # Un futuro cancelado avisa antes de que el trabajo cambie de estado
+        estado = CANCELADO if futuro.cancelled() else trabajo.estado
+        with self._lock:
+            if estado in self._contadores:
+                self._contadores[estado] += 1
+
+    def estadisticas(self) -> dict:
+        """Trabajos terminados por estado."""
+        with self._lock:
+            return dict(self._contadores)
+
+
+# ── Instancia compartida por proceso ─────────────────────────────────────────
+_cola: ColaBusquedas | None = None
+_lock_cola = threading.Lock()
+
+
+def obtener_cola(buscar, trabajadores: int = 4) -> ColaBusquedas:
+    """
+    Devuelve la cola del proceso, creándola la primera vez (los argumentos
+    solo se usan entonces).
+    """
+    global _cola
+    with _lock_cola:
+        if _cola is None:
+            _cola = ColaBusquedas(buscar, trabajadores)
+        return _cola
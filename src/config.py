@@ -4,18 +4,139 @@
 # Compatible con Streamlit (st.secrets) y con ejecución local (.env).
 # ─────────────────────────────────────────────────────────────────────────────
 
+import functools
 import os
-import streamlit as st
+import sys
+
 from dotenv import load_dotenv
 
-load_dotenv()
+
+@functools.cache
+def cargar_entorno():
+    """
+    Carga el archivo .env una sola vez por proceso (también lo usa el
+    config.py de la consola, que no debe volver a leerlo).
+    """
+    load_dotenv()
+
+
+cargar_entorno()
 
 # ── Constantes del modelo ────────────────────────────────────────────────────
 MODELO = "meta-llama/Llama-3.2-3B-Instruct"
 MAX_TOKENS = 1024
 TEMPERATURA = 0.7
 REINTENTOS = 3
-ESPERA_ENTRE_REINTENTOS = 5
+MAX_CONCURRENCIA = 4        # Consultas simultáneas en la API asíncrona
+PRECALENTAR_CONEXION = True  # Abrir la conexión con la API al arrancar la app
+FORMATO_SALIDA = "json"      # Planes estructurados: "json" o "texto" (lista numerada)
+# Servidor compatible con chat completions en lugar de la API de Hugging Face
+# (p. ej. el servidor simulado de bench/servidor_stub.py para medir rendimiento)
+URL_BASE_INFERENCIA = os.getenv("HF_BASE_URL") or None
+
+# ── Backend de inferencia (src/backends.py) ──────────────────────────────────
+# "hf": API de Hugging Face con InferenceClient (o HF_BASE_URL); necesita
+# HF_TOKEN. "openai": cualquier servidor compatible con la API de OpenAI
+# (llama.cpp, vLLM...) en INFERENCIA_URL, p. ej. el modelo 3B en la misma
+# máquina que la app; no necesita HF_TOKEN.
+INFERENCIA_BACKEND = os.getenv("INFERENCIA_BACKEND", "hf")
+INFERENCIA_URL = os.getenv("INFERENCIA_URL", "http://127.0.0.1:8080/v1")
+INFERENCIA_API_KEY = os.getenv("INFERENCIA_API_KEY") or None  # Bearer, si el servidor la pide
+# Nombre del modelo en ese servidor si no es MODELO (vLLM --served-model-name)
+INFERENCIA_MODELO = os.getenv("INFERENCIA_MODELO") or None
+INFERENCIA_TIMEOUT = float(os.getenv("INFERENCIA_TIMEOUT", "120"))  # Segundos por lectura
+# Puerto del endpoint /metrics en formato Prometheus (src/metricas.py); 0 = desactivado
+METRICAS_PUERTO = int(os.getenv("METRICAS_PUERTO", "0"))
+
+# ── Presupuesto de tokens de salida (src/presupuesto.py) ────────────────────
+# max_tokens se aprende de las respuestas completas de 10 planes observadas
+# (percentil 95 × margen), sin pasar nunca de MAX_TOKENS. El stream se corta
+# al terminar el décimo plan aunque esto esté desactivado.
+PRESUPUESTO_ADAPTATIVO = os.getenv("PRESUPUESTO_ADAPTATIVO", "1") == "1"
+PRESUPUESTO_MARGEN = 1.25   # Holgura sobre el percentil observado
+PRESUPUESTO_MINIMO = 256    # max_tokens nunca baja de aquí
+# Fracción de streams que, tras cortarse, se siguen leyendo en segundo plano
+# para medir lo que el modelo habría escrito después (y estimar el ahorro)
+PRESUPUESTO_MUESTREO_COLA = 0.05
+# Mientras no haya ninguna medida, los primeros streams cortados de cada
+# modelo se leen siempre hasta el final (cuestan todos sus tokens)
+PRESUPUESTO_MUESTRAS_ARRANQUE = int(os.getenv("PRESUPUESTO_MUESTRAS_ARRANQUE", "3"))
+
+# ── Precalentamiento de la caché (src/calentamiento.py) ───────────────────
+# Al arrancar la app se generan en segundo plano las ciudades más pedidas
+# (las sugerencias de la pantalla inicial), solo cuando el limitador de tasa
+# no tiene a nadie esperando. También: python main.py --calentar
+CIUDADES_POPULARES = ["Madrid", "Barcelona", "Granada", "Sevilla", "Valencia"]
+CALENTAR_CACHE = os.getenv("CALENTAR_CACHE", "1") == "1"
+CALENTAMIENTO_CONCURRENCIA = 1       # Ciudades generándose a la vez
+CALENTAMIENTO_FICHAS_MINIMAS = 2.0   # Fichas del limitador que se dejan libres
+CALENTAMIENTO_INTERVALO = 6 * 3600   # Segundos entre pasadas (0 = solo al arrancar)
+
+# ── Cobertura (hedging) con modelos de respaldo (src/hedging.py) ───────────
+# Si el modelo principal tarda más que el percentil indicado de sus latencias
+# recientes, se lanza el mismo prompt contra el siguiente modelo de la lista
+# y se usa la primera respuesta. Desactivado por defecto: duplica consultas.
+HEDGING_ACTIVO = os.getenv("HEDGING_ACTIVO", "0") == "1"
+MODELOS_RESPALDO = [
+    "Qwen/Qwen2.5-7B-Instruct",
+    "meta-llama/Llama-3.1-8B-Instruct",
+]
+HEDGING_PERCENTIL = 0.95        # Percentil de latencia del principal
+HEDGING_RETRASO_INICIAL = 10.0  # Segundos de espera hasta tener muestras
+
+# ── Política de reintentos (src/reintentos.py) ───────────────────────────────
+ESPERA_BASE_REINTENTO = 1.0     # Segundos; se duplica en cada intento (+ jitter)
+ESPERA_MAXIMA_REINTENTO = 20.0  # Tope de espera; un Retry-After mayor no se reintenta
+UMBRAL_CIRCUITO = 5             # Fallos seguidos que abren el cortocircuito
+ENFRIAMIENTO_CIRCUITO = 30.0    # Segundos sin llamar a la API tras abrirse
+
+# ── Limitador de tasa (src/limitador.py) ─────────────────────────────────────
+# Compartido por todos los hilos del proceso, delante de cada llamada al modelo.
+LIMITE_PETICIONES_SEGUNDO = 1.0  # Media de peticiones por segundo
+LIMITE_RAFAGA = 4                # Peticiones seguidas permitidas sin esperar
+
+# ── Caché persistente de respuestas ──────────────────────────────────────────
+# Compartida con la versión de consola (mismo fichero por defecto).
+CACHE_RUTA = os.getenv(
+    "CACHE_RUTA",
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        ".cache",
+        "planes.sqlite3",
+    ),
+)
+CACHE_TTL = 7 * 24 * 3600   # Segundos de vida de cada respuesta (7 días)
+# Pasado este tiempo la respuesta se sigue sirviendo al momento, pero se
+# regenera en segundo plano (stale-while-revalidate); pasado CACHE_TTL, no.
+CACHE_TTL_SUAVE = int(os.getenv("CACHE_TTL_SUAVE", str(24 * 3600)))
+REVALIDACION_CONCURRENCIA = 2  # Regeneraciones en segundo plano a la vez
+CACHE_MAX_ENTRADAS = 5000   # Por encima se desalojan las menos usadas (LRU)
+
+# ── Snapshot de planes precalculados (src/snapshot.py) ──────────────────────
+# Fichero de solo lectura que exporta `python main.py --exportar-snapshot`
+# con las ciudades generadas por lotes. La app lo consulta antes que la
+# caché y, si se sustituye por uno nuevo, lo recarga sin reiniciarse.
+SNAPSHOT_RUTA = os.getenv(
+    "SNAPSHOT_RUTA",
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        ".cache",
+        "planes.snapshot",
+    ),
+)
+SNAPSHOT_INTERVALO = 5.0  # Segundos entre comprobaciones de si el fichero cambió
+
+# ── Almacén de resultados de la app (src/almacen.py) ─────────────────────────
+# Memoria máxima de los resultados que comparten las sesiones; cada sesión
+# solo guarda las claves de su historial.
+ALMACEN_MAX_BYTES = int(os.getenv("ALMACEN_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# ── Cola de búsquedas en segundo plano (src/cola.py) ─────────────────────────
+COLA_TRABAJADORES = 4        # Búsquedas simultáneas en todo el proceso
+COLA_MAX_POR_SESION = 5      # Búsquedas en curso por sesión
+COLA_INTERVALO_SONDEO = 1.0  # Segundos entre actualizaciones del progreso
+COMPARACION_MAX_CIUDADES = 3  # Ciudades del modo comparación (una por columna)
+BUSQUEDA_MAX_RESULTADOS = 12  # Planes de la búsqueda por palabras (src/indice.py)
 
 
 def obtener_token() -> str:
@@ -30,13 +151,17 @@ def obtener_token() -> str:
     Raises:
         EnvironmentError: Si no se encuentra el token en ninguna fuente.
     """
-    # 1. Intentar desde Streamlit secrets (deploy en Streamlit Cloud)
-    try:
-        token = st.secrets.get("HF_TOKEN")
-        if token:
-            return token
-    except FileNotFoundError:
-        pass
+    # 1. Intentar desde Streamlit secrets (deploy en Streamlit Cloud). Solo
+    # si Streamlit ya está cargado: importarlo desde la consola cuesta
+    # ~250 ms y allí no hay secrets.
+    st = sys.modules.get("streamlit")
+    if st is not None:
+        try:
+            token = st.secrets.get("HF_TOKEN")
+            if token:
+                return token
+        except FileNotFoundError:
+            pass
 
     # 2. Intentar desde variable de entorno
     token = os.getenv("HF_TOKEN")
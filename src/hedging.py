@@ -0,0 +1,148 @@
+# src/hedging.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Peticiones de cobertura ("hedged requests") y modelos de respaldo.
+# Si el modelo principal tarda más de lo habitual (un percentil de sus
+# latencias recientes), se lanza el mismo prompt contra un modelo de
+# respaldo y se usa la respuesta que llegue antes. Así un endpoint lento o
+# saturado deja de marcar la latencia de cola (p99) de toda la app.
+# src/asistente.py lo aplica a la respuesta completa (obtener_planes, el
+# calentamiento y la revalidación) y al primer fragmento del stream (las
+# búsquedas de la app); la API asíncrona y la consola no usan cobertura.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+
+
+class RegistroLatencias:
+    """
+    Ventana deslizante con las últimas latencias correctas de un modelo.
+
+    Con pocas muestras no se puede estimar un percentil fiable, así que se
+    usa un retraso fijo (`retraso_inicial`) hasta reunir `min_muestras`.
+    """
+
+    def __init__(self, tamano: int = 200, min_muestras: int = 20):
+        self._muestras: deque[float] = deque(maxlen=tamano)
+        self._lock = threading.Lock()
+        self.min_muestras = min_muestras
+
+    def registrar(self, segundos: float):
+        """Añade la latencia de una respuesta correcta."""
+        with self._lock:
+            self._muestras.append(segundos)
+
+    def percentil(self, p: float) -> float | None:
+        """
+        Devuelve el percentil `p` (0-1) de las latencias registradas, o None
+        si todavía no hay muestras suficientes.
+        """
+        with self._lock:
+            if len(self._muestras) < self.min_muestras:
+                return None
+            ordenadas = sorted(self._muestras)
+        indice = min(len(ordenadas) - 1, int(p * len(ordenadas)))
+        return ordenadas[indice]
+
+    def retraso_cobertura(self, p: float, retraso_inicial: float) -> float:
+        """Segundos que se espera al modelo principal antes de cubrirlo."""
+        valor = self.percentil(p)
+        return retraso_inicial if valor is None else valor
+
+
+def _en_hilo(funcion, modelo: str) -> Future:
+    """
+    Ejecuta `funcion` en un hilo propio y devuelve su Future ya en marcha.
+
+    No se usa un pool fijo: las llamadas HTTP síncronas no se pueden
+    cancelar, así que una perdedora ocupa su hilo durante todos sus
+    reintentos, y con un pool compartido el principal de otra petición
+    esperaría en cola (y esa espera dispararía coberturas innecesarias).
+    Cada petición lanza como mucho 1 + len(MODELOS_RESPALDO) hilos.
+    """
+    futuro: Future = Future()
+    empezada = threading.Event()
+
+    def ejecutar():
+        futuro.set_running_or_notify_cancel()
+        empezada.set()
+        try:
+            futuro.set_result(funcion())
+        except BaseException as e:
+            futuro.set_exception(e)
+
+    threading.Thread(target=ejecutar, name=f"hedging-{modelo}", daemon=True).start()
+    empezada.wait()
+    return futuro
+
+
+def ejecutar_con_cobertura(
+    llamadas: list[tuple[str, object]],
+    retraso: float,
+    al_cubrir=None,
+    al_descartar=None,
+):
+    """
+    Ejecuta la primera llamada y, si no ha terminado tras `retraso` segundos
+    desde que empezó a ejecutarse (o si falla), lanza la siguiente de la
+    lista. Devuelve el resultado de la primera que termine bien.
+
+    Args:
+        llamadas: Lista de (modelo, función sin argumentos), en orden de
+            preferencia. La primera es el modelo principal.
+        retraso: Segundos de espera antes de lanzar cada cobertura.
+        al_cubrir: Función opcional (modelo) llamada al lanzar una cobertura.
+        al_descartar: Función opcional (resultado) para liberar lo que
+            devuelvan las perdedoras que terminen bien (p. ej. cerrar un
+            stream abierto).
+
+    Returns:
+        (resultado, modelo) de la llamada ganadora.
+
+    Raises:
+        La excepción del modelo principal si todas las llamadas fallan.
+    """
+    pendientes: dict[Future, str] = {}
+    errores: dict[str, BaseException] = {}
+    siguiente = 0
+
+    def lanzar():
+        nonlocal siguiente
+        modelo, funcion = llamadas[siguiente]
+        siguiente += 1
+        if siguiente > 1 and al_cubrir:
+            al_cubrir(modelo)
+        pendientes[_en_hilo(funcion, modelo)] = modelo
+
+    def descartar(futuro: Future):
+        if futuro.exception() is None:
+            al_descartar(futuro.result())
+
+    # El plazo cuenta desde que la llamada está en marcha en su hilo
+    lanzar()
+    limite = time.monotonic() + retraso
+
+    while pendientes:
+        quedan = siguiente < len(llamadas)
+        espera = max(0.0, limite - time.monotonic()) if quedan else None
+        hechos, _ = wait(pendientes, timeout=espera, return_when=FIRST_COMPLETED)
+
+        for futuro in hechos:
+            modelo = pendientes.pop(futuro)
+            error = futuro.exception()
+            if error is None:
+                if al_descartar:
+                    for perdedora in pendientes:
+                        perdedora.add_done_callback(descartar)
+                return futuro.result(), modelo
+            errores[modelo] = error
+
+        # Cobertura por tiempo agotado, o respaldo inmediato si todo falló
+        if quedan and (not hechos or not pendientes):
+            lanzar()
+            limite = time.monotonic() + retraso
+
+    principal = llamadas[0][0]
+    raise errores.get(principal) or next(iter(errores.values()))
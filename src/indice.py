@@ -0,0 +1,531 @@
+# src/indice.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Índice invertido de los planes ya generados, para buscar por palabras en
+# todas las ciudades ("museos gratis", "parques con niños") sin llamar al
+# modelo. Cada plan es un documento con su título, su descripción y la
+# etiqueta de coste que detecta src/parser.py; las consultas se ordenan con
+# BM25. El índice se llena con la caché persistente y el snapshot, y se
+# actualiza ciudad a ciudad según llegan respuestas nuevas.
+# Sin dependencias de Streamlit: lo usa también la versión de consola.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import heapq
+import math
+import mmap
+import os
+import struct
+import threading
+from operator import itemgetter
+from typing import NamedTuple
+
+from src.ciudades import clave_ciudad, plegar
+from src.planes import Plan, planes_desde_json, validar_planes
+from src.snapshot import escribir_atomico
+
+# Parámetros de BM25: saturación de la frecuencia y normalización por longitud
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Las palabras del título cuentan más que las de la descripción
+PESO_TITULO = 2
+
+# Palabras vacías (ya plegadas) que no se indexan
+PALABRAS_VACIAS = frozenset(
+    "a al ante bajo con contra de del desde durante e el en entre hacia hasta "
+    "la las le les lo los mas mediante muy o para pero por que se segun sin "
+    "sobre su sus tambien tras u un una unas uno unos y ya".split()
+)
+
+# Variantes que se buscan como una sola palabra (raíces de _raiz)
+SINONIMOS = {
+    "gratis": "gratuito",
+    "gratuita": "gratuito",
+    "libre": "gratuito",
+    "nina": "nino",
+    "infantil": "nino",
+    "peque": "nino",
+    "barato": "economico",
+    "barata": "economico",
+    "economica": "economico",
+}
+
+
+class ResultadoBusqueda(NamedTuple):
+    """Un plan encontrado, con su puntuación BM25."""
+
+    puntos: float
+    ciudad: str
+    plan: Plan
+
+
+def _raiz(palabra: str) -> str:
+    """
+    Quita el plural de una palabra plegada, sin un stemmer completo:
+    "museos" → "museo", "jardines" → "jardin", "actividades" → "actividad".
+    """
+    if len(palabra) > 4 and palabra.endswith("es") and palabra[-3] in "lnrdj":
+        return palabra[:-2]
+    if len(palabra) > 3 and palabra.endswith("s") and not palabra.endswith("is"):
+        return palabra[:-1]
+    return palabra
+
+
+def tokenizar(texto: str) -> list[str]:
+    """
+    Términos de un texto: plegado (sin tildes ni mayúsculas), sin palabras
+    vacías, en singular y con los sinónimos unificados.
+    """
+    terminos = []
+    for palabra in plegar(texto).split():
+        if palabra in PALABRAS_VACIAS or len(palabra) < 2:
+            continue
+        palabra = SINONIMOS.get(palabra, palabra)
+        raiz = _raiz(palabra)
+        terminos.append(SINONIMOS.get(raiz, raiz))
+    return terminos
+
+
+def _terminos_plan(plan: Plan) -> dict[str, int]:
+    """Frecuencia de cada término en un plan (el título con PESO_TITULO)."""
+    frecuencias: dict[str, int] = {}
+    for peso, texto in ((PESO_TITULO, plan.titulo), (1, plan.descripcion), (1, plan.coste or "")):
+        for termino in tokenizar(texto):
+            frecuencias[termino] = frecuencias.get(termino, 0) + peso
+    return frecuencias
+
+
+class IndicePlanes:
+    """
+    Índice invertido en memoria: término → {documento: frecuencia}.
+
+    Cada documento es un plan de una ciudad. Volver a añadir una ciudad
+    sustituye sus planes anteriores, así que el índice se actualiza de forma
+    incremental (sin reconstruirlo) al regenerar una respuesta. Seguro entre
+    hilos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = 0
+        self._documentos: dict[int, tuple[str, Plan]] = {}        # id → (ciudad, plan)
+        self._longitudes: dict[int, int] = {}                     # id → términos (con pesos)
+        self._por_ciudad: dict[str, list[int]] = {}               # clave de ciudad → ids
+        self._terminos: dict[int, dict[str, int]] = {}            # id → frecuencias
+        self._postings: dict[str, dict[int, int]] = {}            # término → {id: frecuencia}
+        self._longitud_total = 0
+
+    def __len__(self) -> int:
+        return len(self._documentos)
+
+    def ciudades(self) -> int:
+        """Número de ciudades indexadas."""
+        return len(self._por_ciudad)
+
+    def anadir(self, ciudad: str, planes: list[Plan]):
+        """Indexa los planes de una ciudad, sustituyendo los que tuviera."""
+        clave = clave_ciudad(ciudad)
+        terminos = [_terminos_plan(plan) for plan in planes]
+        with self._lock:
+            self._quitar(clave)
+            ids = []
+            for plan, frecuencias in zip(planes, terminos):
+                self._ids += 1
+                longitud = sum(frecuencias.values())
+                self._documentos[self._ids] = (ciudad, plan)
+                self._longitudes[self._ids] = longitud
+                self._terminos[self._ids] = frecuencias
+                for termino, n in frecuencias.items():
+                    self._postings.setdefault(termino, {})[self._ids] = n
+                self._longitud_total += longitud
+                ids.append(self._ids)
+            if ids:
+                self._por_ciudad[clave] = ids
+
+    def quitar(self, ciudad: str):
+        """Elimina del índice los planes de una ciudad."""
+        with self._lock:
+            self._quitar(clave_ciudad(ciudad))
+
+    def _quitar(self, clave: str):
+        for documento in self._por_ciudad.pop(clave, ()):
+            del self._documentos[documento]
+            self._longitud_total -= self._longitudes.pop(documento)
+            for termino in self._terminos.pop(documento):
+                posting = self._postings[termino]
+                del posting[documento]
+                if not posting:
+                    del self._postings[termino]
+
+    def buscar(self, consulta: str, limite: int = 20, ciudad: str | None = None) -> list[ResultadoBusqueda]:
+        """
+        Planes que mejor responden a una consulta, en todas las ciudades.
+
+        Args:
+            consulta: Palabras a buscar ("museos gratis").
+            limite: Número máximo de resultados.
+            ciudad: Si se indica, solo se buscan los planes de esa ciudad.
+
+        Returns:
+            Resultados ordenados de más a menos relevante (BM25).
+        """
+        with self._lock:
+            return buscar_en_indices([self], consulta, limite, ciudad)
+
+    def _estadisticas_consulta(self, terminos: set[str]) -> tuple[int, int, dict[str, int]]:
+        """
+        (planes, suma de longitudes, planes que contienen cada término).
+        Sin lock: lo toma buscar (o el índice no cambia mientras se busca).
+        """
+        frecuencias = {t: len(self._postings[t]) for t in terminos if t in self._postings}
+        return len(self._documentos), self._longitud_total, frecuencias
+
+    def _puntuar(
+        self, pesos: dict[str, float], fija: float, por_longitud: float, limite: int, ciudad: str | None
+    ) -> list[ResultadoBusqueda]:
+        """Los `limite` mejores planes con los pesos BM25 ya calculados."""
+        longitudes = self._longitudes
+        filtro = set(self._por_ciudad.get(clave_ciudad(ciudad), ())) if ciudad else None
+
+        puntos: dict[int, float] = {}
+        for termino, peso in pesos.items():
+            for documento, frecuencia in self._postings.get(termino, {}).items():
+                if filtro is not None and documento not in filtro:
+                    continue
+                norma = fija + por_longitud * longitudes[documento]
+                puntos[documento] = puntos.get(documento, 0.0) + peso * frecuencia / (frecuencia + norma)
+
+        mejores = heapq.nlargest(limite, puntos.items(), key=itemgetter(1))
+        return [
+            ResultadoBusqueda(round(valor, 3), *self._documentos[documento])
+            for documento, valor in mejores
+        ]
+
+    def estadisticas(self) -> dict:
+        """Ciudades, planes y términos distintos indexados."""
+        with self._lock:
+            return {
+                "ciudades": len(self._por_ciudad),
+                "planes": len(self._documentos),
+                "terminos": len(self._postings),
+            }
+
+
+def buscar_en_indices(indices: list, consulta: str, limite: int = 20, ciudad: str | None = None) -> list[ResultadoBusqueda]:
+    """
+    BM25 sobre varios índices (p. ej. el del snapshot y el de la caché)
+    como si fueran uno: el número de planes, la longitud media y la
+    frecuencia de cada término se suman, así que las puntuaciones son
+    comparables. Cada ciudad debe estar en un solo índice.
+
+    Returns:
+        Resultados ordenados de más a menos relevante.
+    """
+    terminos = set(tokenizar(consulta))
+    if not terminos:
+        return []
+
+    n = longitud_total = 0
+    frecuencias: dict[str, int] = {}
+    for indice in indices:
+        planes, longitud, propias = indice._estadisticas_consulta(terminos)
+        n += planes
+        longitud_total += longitud
+        for termino, cuantos in propias.items():
+            frecuencias[termino] = frecuencias.get(termino, 0) + cuantos
+    if not n or not longitud_total:
+        # Sin documentos, o todos sin términos (solo palabras vacías)
+        return []
+
+    pesos = {
+        termino: math.log(1 + (n - cuantos + 0.5) / (cuantos + 0.5)) * (BM25_K1 + 1)
+        for termino, cuantos in frecuencias.items()
+    }
+    # norma = k1 · (1 − b + b · longitud / longitud media)
+    fija = BM25_K1 * (1 - BM25_B)
+    por_longitud = BM25_K1 * BM25_B * n / longitud_total
+
+    resultados = []
+    for indice in indices:
+        resultados += indice._puntuar(pesos, fija, por_longitud, limite, ciudad)
+    return heapq.nlargest(limite, resultados, key=itemgetter(0))
+
+
+def cargar_indice(indice: IndicePlanes, cache=None, snapshot=None) -> int:
+    """
+    Indexa las respuestas de la caché persistente y de un snapshot (este
+    último gana si una ciudad está en los dos).
+
+    Args:
+        indice: Índice a llenar.
+        cache: CacheRespuestas (src/cache.py), o None.
+        snapshot: Snapshot (src/snapshot.py), o None.
+
+    Returns:
+        Número de ciudades indexadas.
+    """
+    ciudades = indexar_cache(indice, cache) if cache is not None else 0
+    if snapshot is not None:
+        for ciudad, planes in snapshot.recorrer():
+            indice.anadir(ciudad, planes)
+            ciudades += 1
+    return ciudades
+
+
+def indexar_cache(indice: IndicePlanes, cache, omitir=None) -> int:
+    """
+    Indexa las respuestas de la caché persistente.
+
+    Args:
+        indice: Índice a llenar.
+        cache: CacheRespuestas (src/cache.py).
+        omitir: Snapshot cuyas ciudades no se indexan (ya están en su
+            IndiceSnapshot), o None.
+
+    Returns:
+        Número de ciudades indexadas.
+    """
+    ciudades = 0
+    for entrada in cache.recorrer():
+        if omitir is not None and omitir.posicion(entrada.ciudad) is not None:
+            continue
+        planes = _planes_de_entrada(entrada)
+        if planes:
+            indice.anadir(entrada.ciudad, planes)
+            ciudades += 1
+    return ciudades
+
+
+def cambiar_snapshot(indice: IndicePlanes, anterior=None, nuevo=None, cache=None) -> int:
+    """
+    Pasa el índice de un snapshot al que lo sustituye. Las ciudades que el
+    nuevo ya no trae se quitan, o vuelven a la versión de la caché si
+    está; las del nuevo se indexan (y sustituyen a las que hubiera).
+
+    Args:
+        indice: Índice a actualizar.
+        anterior: Snapshot indexado hasta ahora, o None.
+        nuevo: Snapshot vigente, o None si ya no hay.
+        cache: CacheRespuestas de la que recuperar las ciudades quitadas.
+
+    Returns:
+        Número de ciudades indexadas del snapshot nuevo.
+    """
+    if anterior is not None:
+        quitadas = set(anterior.claves()) - set(nuevo.claves() if nuevo is not None else ())
+        for clave in quitadas:
+            indice.quitar(clave)
+        if quitadas and cache is not None:
+            for entrada in cache.recorrer():
+                if clave_ciudad(entrada.ciudad) in quitadas:
+                    planes = _planes_de_entrada(entrada)
+                    if planes:
+                        indice.anadir(entrada.ciudad, planes)
+    return cargar_indice(indice, snapshot=nuevo)
+
+
+def _planes_de_entrada(entrada) -> list[Plan]:
+    """Planes de una entrada de caché (las antiguas no guardaban los validados)."""
+    if entrada.planes:
+        return planes_desde_json(entrada.planes)
+    return validar_planes(entrada.texto, "json")
+
+
+# ── Índice del snapshot en disco ─────────────────────────────────────────────
+# El snapshot (src/snapshot.py) no cambia hasta el siguiente export, así que
+# su índice se escribe una vez, junto a él, y se abre con mmap: una consulta
+# solo lee las listas de los términos que busca, sin cargar ni reconstruir
+# nada (lo que necesita `main.py --buscar`, que arranca en frío cada vez).
+#
+# Formato (enteros little-endian):
+#   cabecera    MAGIA (8 bytes) · versión (u16) · reservado (u16) · entradas del
+#               snapshot (u32) · planes (u32) · términos (u32) · suma de
+#               longitudes (u64) · `creado` del snapshot (f64)
+#   primeros    (entradas + 1) × u32: primer plan de cada entrada del snapshot
+#   planes      planes × (entrada u32 · posición en la entrada u16)
+#   términos    términos × (desplazamiento u64 · longitud u32 · desplazamiento de
+#               la lista u64 · planes u32), ordenados por los bytes del término
+#   datos       términos en UTF-8 y listas de (plan u32 · frecuencia u16 ·
+#               longitud del plan u16)
+
+MAGIA_INDICE = b"PLANIDX1"
+VERSION_INDICE = 1
+SUFIJO_INDICE = ".indice"
+
+_CABECERA_INDICE = struct.Struct("<8sHHIIIQd")
+_PRIMERO = struct.Struct("<I")
+_PLAN = struct.Struct("<IH")
+_TERMINO = struct.Struct("<QIQI")
+_POSTING = struct.Struct("<IHH")
+
+
+class IndiceObsoletoError(ValueError):
+    """El fichero no es un índice de planes o no corresponde al snapshot."""
+
+
+def escribir_indice_snapshot(ruta: str, snapshot) -> int:
+    """
+    Indexa un snapshot y escribe el índice de forma atómica.
+
+    Args:
+        ruta: Fichero de destino (p. ej. la ruta del snapshot + SUFIJO_INDICE).
+        snapshot: Snapshot (src/snapshot.py) abierto.
+
+    Returns:
+        Número de planes indexados.
+    """
+    primeros, planes = [], []
+    postings: dict[str, list[bytes]] = {}
+    longitud_total = 0
+    for entrada in range(len(snapshot)):
+        primeros.append(_PRIMERO.pack(len(planes)))
+        _, planes_ciudad = snapshot.leer(entrada)
+        for posicion, plan in enumerate(planes_ciudad):
+            frecuencias = _terminos_plan(plan)
+            longitud = sum(frecuencias.values())
+            for termino, frecuencia in frecuencias.items():
+                postings.setdefault(termino, []).append(
+                    _POSTING.pack(len(planes), min(frecuencia, 0xFFFF), min(longitud, 0xFFFF))
+                )
+            longitud_total += longitud
+            planes.append(_PLAN.pack(entrada, posicion))
+    primeros.append(_PRIMERO.pack(len(planes)))
+
+    terminos = sorted((termino.encode("utf-8"), termino) for termino in postings)
+    posicion = (
+        _CABECERA_INDICE.size + _PRIMERO.size * len(primeros)
+        + _PLAN.size * len(planes) + _TERMINO.size * len(terminos)
+    )
+    tabla, datos = [], []
+    for clave, termino in terminos:
+        lista = b"".join(postings[termino])
+        tabla.append(_TERMINO.pack(posicion, len(clave), posicion + len(clave), len(postings[termino])))
+        datos += [clave, lista]
+        posicion += len(clave) + len(lista)
+
+    cabecera = _CABECERA_INDICE.pack(
+        MAGIA_INDICE, VERSION_INDICE, 0, len(snapshot), len(planes), len(terminos),
+        longitud_total, snapshot.creado,
+    )
+    escribir_atomico(ruta, [cabecera, *primeros, *planes, *tabla, *datos])
+    return len(planes)
+
+
+class IndiceSnapshot:
+    """
+    Índice de un snapshot abierto con mmap. Se combina con un IndicePlanes
+    (las ciudades de la caché que no están en el snapshot) mediante
+    buscar_en_indices.
+    """
+
+    def __init__(self, ruta: str, snapshot):
+        with open(ruta, "rb") as fichero:
+            if os.fstat(fichero.fileno()).st_size < _CABECERA_INDICE.size:
+                raise IndiceObsoletoError(f"{ruta}: fichero demasiado corto")
+            self._mapa = mmap.mmap(fichero.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magia, version, _, entradas, self._n, self._terminos,
+         self._longitud_total, creado) = _CABECERA_INDICE.unpack_from(self._mapa, 0)
+        if magia != MAGIA_INDICE or version != VERSION_INDICE:
+            raise IndiceObsoletoError(f"{ruta}: no es un índice de planes (v{VERSION_INDICE})")
+        if entradas != len(snapshot) or creado != snapshot.creado:
+            raise IndiceObsoletoError(f"{ruta}: es de otro snapshot")
+        self._planes = _CABECERA_INDICE.size + _PRIMERO.size * (entradas + 1)
+        self._tabla = self._planes + _PLAN.size * self._n
+        self.ruta = ruta
+        self.snapshot = snapshot
+
+    def __len__(self) -> int:
+        return self._n
+
+    def ciudades(self) -> int:
+        """Número de ciudades indexadas (las del snapshot)."""
+        return len(self.snapshot)
+
+    def _lista(self, termino: str) -> tuple[int, int] | None:
+        """(desplazamiento, planes) de la lista de un término, por búsqueda binaria."""
+        clave = termino.encode("utf-8")
+        bajo, alto = 0, self._terminos
+        while bajo < alto:
+            medio = (bajo + alto) // 2
+            inicio, longitud, _, _ = _TERMINO.unpack_from(self._mapa, self._tabla + medio * _TERMINO.size)
+            if self._mapa[inicio:inicio + longitud] < clave:
+                bajo = medio + 1
+            else:
+                alto = medio
+        if bajo < self._terminos:
+            inicio, longitud, lista, planes = _TERMINO.unpack_from(self._mapa, self._tabla + bajo * _TERMINO.size)
+            if self._mapa[inicio:inicio + longitud] == clave:
+                return lista, planes
+        return None
+
+    def _estadisticas_consulta(self, terminos: set[str]) -> tuple[int, int, dict[str, int]]:
+        """Como en IndicePlanes."""
+        frecuencias = {}
+        for termino in terminos:
+            lista = self._lista(termino)
+            if lista is not None:
+                frecuencias[termino] = lista[1]
+        return self._n, self._longitud_total, frecuencias
+
+    def _puntuar(
+        self, pesos: dict[str, float], fija: float, por_longitud: float, limite: int, ciudad: str | None
+    ) -> list[ResultadoBusqueda]:
+        """Como en IndicePlanes; solo se leen las listas de `pesos`."""
+        desde, hasta = 0, self._n
+        if ciudad:
+            entrada = self.snapshot.posicion(ciudad)
+            if entrada is None:
+                return []
+            (desde,) = _PRIMERO.unpack_from(self._mapa, _CABECERA_INDICE.size + entrada * _PRIMERO.size)
+            (hasta,) = _PRIMERO.unpack_from(self._mapa, _CABECERA_INDICE.size + (entrada + 1) * _PRIMERO.size)
+
+        puntos: dict[int, float] = {}
+        for termino, peso in pesos.items():
+            lista = self._lista(termino)
+            if lista is None:
+                continue
+            inicio, planes = lista
+            for plan, frecuencia, longitud in _POSTING.iter_unpack(
+                self._mapa[inicio:inicio + planes * _POSTING.size]
+            ):
+                if desde <= plan < hasta:
+                    norma = fija + por_longitud * longitud
+                    puntos[plan] = puntos.get(plan, 0.0) + peso * frecuencia / (frecuencia + norma)
+
+        resultados, leidas = [], {}
+        for plan, valor in heapq.nlargest(limite, puntos.items(), key=itemgetter(1)):
+            entrada, posicion = _PLAN.unpack_from(self._mapa, self._planes + plan * _PLAN.size)
+            if entrada not in leidas:
+                leidas[entrada] = self.snapshot.leer(entrada)
+            nombre, planes_ciudad = leidas[entrada]
+            resultados.append(ResultadoBusqueda(round(valor, 3), nombre, planes_ciudad[posicion]))
+        return resultados
+
+    def buscar(self, consulta: str, limite: int = 20, ciudad: str | None = None) -> list[ResultadoBusqueda]:
+        """Como IndicePlanes.buscar, sobre los planes del snapshot."""
+        return buscar_en_indices([self], consulta, limite, ciudad)
+
+
+def abrir_indice_snapshot(snapshot) -> tuple[IndiceSnapshot, bool]:
+    """
+    Abre el índice guardado junto a un snapshot; si no existe o es de otro
+    snapshot, lo construye y lo guarda para la próxima vez.
+
+    Returns:
+        (índice, si hubo que construirlo).
+    """
+    ruta = snapshot.ruta + SUFIJO_INDICE
+    try:
+        return IndiceSnapshot(ruta, snapshot), False
+    except (OSError, ValueError):
+        escribir_indice_snapshot(ruta, snapshot)
+        return IndiceSnapshot(ruta, snapshot), True
+
+
+# ── Instancia compartida por proceso ─────────────────────────────────────────
+_indice = IndicePlanes()
+
+
+def obtener_indice_planes() -> IndicePlanes:
+    """Devuelve el índice de planes del proceso."""
+    return _indice
@@ -0,0 +1,156 @@
+# src/limitador.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Limitador de tasa (token bucket) compartido por todo el proceso.
+# Se coloca delante de cada llamada al modelo para no superar la cuota de
+# Hugging Face y evitar tormentas de errores 429, en lugar de reaccionar a
+# ellos con reintentos.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import threading
+import time
+
+
+class LimitadorTasa:
+    """
+    Token bucket con reservas en orden de llegada.
+
+    El cubo se rellena a `tasa` fichas por segundo hasta un máximo de
+    `rafaga`. Cada llamada reserva una ficha; si no quedan, la reserva deja
+    el saldo en negativo y el llamador duerme justo lo necesario hasta que
+    le toque. Como las reservas se hacen bajo un lock en orden de llegada,
+    la cola es justa (FIFO) sin necesidad de una lista de espera explícita.
+    """
+
+    def __init__(self, tasa: float, rafaga: int):
+        if tasa <= 0 or rafaga < 1:
+            raise ValueError("La tasa debe ser positiva y la ráfaga al menos 1.")
+        self.tasa = tasa
+        self.rafaga = rafaga
+        self._lock = threading.Lock()
+        self._fichas = float(rafaga)
+        self._ultimo = time.monotonic()
+
+        # Estadísticas para ajustar tasa y ráfaga
+        self._en_cola = 0
+        self._adquisiciones = 0
+        self._esperas = 0
+        self._espera_total = 0.0
+        self._espera_maxima = 0.0
+
+    def _reservar(self) -> float:
+        """Reserva una ficha y devuelve los segundos que hay que esperar."""
+        with self._lock:
+            ahora = time.monotonic()
+            self._fichas = min(
+                float(self.rafaga),
+                self._fichas + (ahora - self._ultimo) * self.tasa,
+            )
+            self._ultimo = ahora
+            self._fichas -= 1
+
+            espera = -self._fichas / self.tasa if self._fichas < 0 else 0.0
+
+            self._adquisiciones += 1
+            if espera > 0:
+                self._en_cola += 1
+                self._esperas += 1
+                self._espera_total += espera
+                self._espera_maxima = max(self._espera_maxima, espera)
+            return espera
+
+    def _salir_de_cola(self):
+        with self._lock:
+            self._en_cola -= 1
+
+    def _devolver(self):
+        """
+        Devuelve la ficha de una reserva que no se va a usar. Los que ya
+        esperan mantienen su turno; la ficha adelanta a los siguientes.
+        """
+        with self._lock:
+            self._fichas = min(float(self.rafaga), self._fichas + 1)
+
+    def adquirir(self) -> float:
+        """
+        Bloquea hasta que haya cuota para una llamada.
+
+        Returns:
+            Segundos que se ha esperado.
+        """
+        espera = self._reservar()
+        if espera > 0:
+            try:
+                time.sleep(espera)
+            finally:
+                self._salir_de_cola()
+        return espera
+
+    async def adquirir_async(self) -> float:
+        """
+        Igual que adquirir, pero esperando con asyncio.sleep. Si la tarea
+        se cancela mientras espera, la ficha reservada se devuelve.
+        """
+        import asyncio  # Solo en la API asíncrona; la consola no lo carga
+
+        espera = self._reservar()
+        if espera > 0:
+            try:
+                await asyncio.sleep(espera)
+            except asyncio.CancelledError:
+                self._devolver()
+                raise
+            finally:
+                self._salir_de_cola()
+        return espera
+
+    def estadisticas(self) -> dict:
+        """
+        Returns:
+            Dict con la configuración ('tasa', 'rafaga'), las fichas
+            disponibles, la profundidad de la cola ('en_cola') y los tiempos
+            de espera acumulados ('adquisiciones', 'esperas',
+            'espera_media', 'espera_maxima', en segundos).
+        """
+        with self._lock:
+            # Fichas a día de hoy, contando las rellenadas desde la última reserva
+            fichas = min(
+                float(self.rafaga),
+                self._fichas + (time.monotonic() - self._ultimo) * self.tasa,
+            )
+            return {
+                "tasa": self.tasa,
+                "rafaga": self.rafaga,
+                "fichas": max(fichas, 0.0),
+                "en_cola": self._en_cola,
+                "adquisiciones": self._adquisiciones,
+                "esperas": self._esperas,
+                "espera_media": self._espera_total / self._esperas if self._esperas else 0.0,
+                "espera_maxima": self._espera_maxima,
+            }
+
+
+# ── Instancia compartida por proceso ─────────────────────────────────────────
+_limitador: LimitadorTasa | None = None
+_lock_limitador = threading.Lock()
+
+
+def obtener_limitador(tasa: float, rafaga: int) -> LimitadorTasa:
+    """
+    Devuelve el limitador del proceso, creándolo la primera vez.
+
+    Todos los hilos (sesiones de Streamlit, hilos del modo por lotes) deben
+    compartirlo para que el límite sea global; los argumentos solo se usan
+    en la primera llamada.
+
+    Args:
+        tasa: Peticiones por segundo permitidas de media.
+        rafaga: Peticiones que se pueden lanzar seguidas sin esperar.
+
+    Returns:
+        Instancia compartida de LimitadorTasa.
+    """
+    global _limitador
+    with _lock_limitador:
+        if _limitador is None:
+            _limitador = LimitadorTasa(tasa, rafaga)
+        return _limitador
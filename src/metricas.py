@@ -0,0 +1,285 @@
+# src/metricas.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Medición de latencia por fases y exportación de métricas.
+# Cada fase de una consulta (token, cliente, caché, limitador, llamada al
+# modelo, primer fragmento, validación, render...) se mide con un tramo
+# (`with tramo("fase", modelo=...)`) y se acumula en histogramas por
+# etiquetas. Se exportan en formato de texto de Prometheus (servidor HTTP
+# opcional) y como líneas JSON para la consola.
+# Sin dependencias de Streamlit: lo usa también la versión de consola.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import json
+import threading
+import time
+
+# Límites superiores (segundos) de los cubos de los histogramas de latencia
+CUBOS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Cubos para cantidades de tokens por petición
+CUBOS_TOKENS = (0, 10, 25, 50, 100, 200, 400, 800, 1600)
+
+METRICA_FASES = "planes_fase_segundos"
+METRICA_TOKENS = "planes_tokens_total"
+METRICA_AHORRO = "planes_tokens_ahorrados"
+
+_AYUDA = {
+    METRICA_FASES: "Duración de cada fase de una consulta, en segundos.",
+    METRICA_TOKENS: "Tokens consumidos según la respuesta de la API.",
+    METRICA_AHORRO: "Tokens de salida ahorrados por petición al cortar tras el décimo plan.",
+}
+
+
+class Histograma:
+    """Histograma acumulativo con cubos fijos, como los de Prometheus."""
+
+    __slots__ = ("limites", "cubos", "suma", "cuenta")
+
+    def __init__(self, limites: tuple[float, ...] = CUBOS_SEGUNDOS):
+        self.limites = limites
+        self.cubos = [0] * len(limites)
+        self.suma = 0.0
+        self.cuenta = 0
+
+    def observar(self, valor: float):
+        self.suma += valor
+        self.cuenta += 1
+        for i, limite in enumerate(self.limites):
+            if valor <= limite:
+                self.cubos[i] += 1
+                break
+
+    def acumulados(self) -> list[int]:
+        """Cuenta acumulada de cada cubo (le=limite)."""
+        total, resultado = 0, []
+        for n in self.cubos:
+            total += n
+            resultado.append(total)
+        return resultado
+
+
+def _clave_etiquetas(etiquetas: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in etiquetas.items() if v is not None))
+
+
+def _escapar(valor: str) -> str:
+    """Escapa un valor de etiqueta según el formato de texto de Prometheus."""
+    return valor.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _formatear_etiquetas(etiquetas: tuple, le: str | None = None) -> str:
+    partes = [f'{k}="{_escapar(v)}"' for k, v in etiquetas]
+    if le is not None:
+        partes.append(f'le="{le}"')
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+class RegistroMetricas:
+    """
+    Histogramas y contadores por nombre y etiquetas, seguros entre hilos.
+
+    Además de acumular, reenvía cada observación de fase a los suscriptores
+    (p. ej. la consola, que las escribe como líneas JSON).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histogramas: dict[str, dict[tuple, Histograma]] = {}
+        self._contadores: dict[str, dict[tuple, float]] = {}
+        self._suscriptores: list = []
+
+    def observar(self, nombre: str, valor: float, limites: tuple[float, ...] = CUBOS_SEGUNDOS, **etiquetas):
+        """
+        Añade una observación al histograma `nombre` con esas etiquetas.
+
+        `limites` son los cubos del histograma; solo cuentan al crearlo.
+        """
+        clave = _clave_etiquetas(etiquetas)
+        with self._lock:
+            serie = self._histogramas.setdefault(nombre, {})
+            histograma = serie.get(clave)
+            if histograma is None:
+                histograma = serie[clave] = Histograma(limites)
+            histograma.observar(valor)
+            suscriptores = list(self._suscriptores)
+
+        if suscriptores:
+            evento = {"metrica": nombre, "valor": round(valor, 6), "ts": time.time(), **dict(clave)}
+            for suscriptor in suscriptores:
+                suscriptor(evento)
+
+    def incrementar(self, nombre: str, valor: float = 1, **etiquetas):
+        """Suma `valor` al contador `nombre` con esas etiquetas."""
+        clave = _clave_etiquetas(etiquetas)
+        with self._lock:
+            serie = self._contadores.setdefault(nombre, {})
+            serie[clave] = serie.get(clave, 0) + valor
+
+    def suscribir(self, funcion):
+        """Llama a `funcion(evento: dict)` por cada observación de histograma."""
+        with self._lock:
+            self._suscriptores.append(funcion)
+
+    def cancelar_suscripcion(self, funcion):
+        with self._lock:
+            if funcion in self._suscriptores:
+                self._suscriptores.remove(funcion)
+
+    def instantanea(self) -> dict:
+        """
+        Returns:
+            Dict serializable en JSON con los histogramas (cuenta, suma y
+            media por etiquetas) y los contadores.
+        """
+        with self._lock:
+            return {
+                "histogramas": {
+                    nombre: [
+                        {
+                            "etiquetas": dict(clave),
+                            "cuenta": h.cuenta,
+                            "suma": h.suma,
+                            "media": h.suma / h.cuenta if h.cuenta else 0.0,
+                        }
+                        for clave, h in serie.items()
+                    ]
+                    for nombre, serie in self._histogramas.items()
+                },
+                "contadores": {
+                    nombre: [{"etiquetas": dict(clave), "valor": v} for clave, v in serie.items()]
+                    for nombre, serie in self._contadores.items()
+                },
+            }
+
+    def exportar_prometheus(self) -> str:
+        """Devuelve todas las métricas en el formato de texto de Prometheus."""
+        lineas = []
+        with self._lock:
+            for nombre, serie in sorted(self._histogramas.items()):
+                lineas.append(f"# HELP {nombre} {_AYUDA.get(nombre, nombre)}")
+                lineas.append(f"# TYPE {nombre} histogram")
+                for clave, h in sorted(serie.items()):
+                    for limite, acumulado in zip(h.limites, h.acumulados()):
+                        lineas.append(f"{nombre}_bucket{_formatear_etiquetas(clave, f'{limite:g}')} {acumulado}")
+                    lineas.append(f"{nombre}_bucket{_formatear_etiquetas(clave, '+Inf')} {h.cuenta}")
+                    lineas.append(f"{nombre}_sum{_formatear_etiquetas(clave)} {h.suma:.6f}")
+                    lineas.append(f"{nombre}_count{_formatear_etiquetas(clave)} {h.cuenta}")
+
+            for nombre, serie in sorted(self._contadores.items()):
+                lineas.append(f"# HELP {nombre} {_AYUDA.get(nombre, nombre)}")
+                lineas.append(f"# TYPE {nombre} counter")
+                for clave, valor in sorted(serie.items()):
+                    lineas.append(f"{nombre}{_formatear_etiquetas(clave)} {valor:g}")
+
+        return "\n".join(lineas) + "\n"
+
+
+# ── Instancia compartida por proceso ─────────────────────────────────────────
+_registro = RegistroMetricas()
+
+
+def obtener_registro() -> RegistroMetricas:
+    """Devuelve el registro de métricas del proceso."""
+    return _registro
+
+
+class Tramo:
+    """
+    Mide la duración de una fase y la registra al salir del bloque.
+
+    Las etiquetas se pueden completar dentro del bloque, cuando se conocen
+    (p. ej. `t.etiquetas["cache"] = "acierto"`). Si el bloque termina con
+    una excepción, se añade estado="error"; si no, estado="ok".
+    """
+
+    __slots__ = ("fase", "etiquetas", "_inicio", "segundos")
+
+    def __init__(self, fase: str, **etiquetas):
+        self.fase = fase
+        self.etiquetas = etiquetas
+        self._inicio = 0.0
+        self.segundos = 0.0
+
+    def __enter__(self):
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, error, traza):
+        self.segundos = time.perf_counter() - self._inicio
+        self.etiquetas.setdefault("estado", "ok" if tipo is None else "error")
+        _registro.observar(METRICA_FASES, self.segundos, fase=self.fase, **self.etiquetas)
+        return False
+
+
+def tramo(fase: str, **etiquetas) -> Tramo:
+    """Atajo: `with tramo("llamada", modelo=m, intento=1): ...`."""
+    return Tramo(fase, **etiquetas)
+
+
+def registrar_uso(modelo: str, respuesta):
+    """
+    Suma los tokens del campo `usage` de una respuesta de chat (si lo trae).
+
+    Args:
+        modelo: Modelo que generó la respuesta.
+        respuesta: Salida de chat.completions.create.
+    """
+    uso = getattr(respuesta, "usage", None)
+    if uso is None:
+        return
+    for tipo in ("prompt_tokens", "completion_tokens"):
+        valor = getattr(uso, tipo, None)
+        if valor:
+            _registro.incrementar(METRICA_TOKENS, valor, modelo=modelo, tipo=tipo.split("_")[0])
+
+
+# ── Exportación ──────────────────────────────────────────────────────────────
+
+def servir_prometheus(puerto: int, host: str = "127.0.0.1"):
+    """
+    Arranca en segundo plano un servidor HTTP que expone /metrics.
+
+    http.server se importa aquí (unos 20 ms): solo lo necesita quien
+    configura METRICAS_PUERTO.
+
+    Args:
+        puerto: Puerto de escucha.
+        host: Interfaz de escucha (por defecto solo local).
+
+    Returns:
+        El ThreadingHTTPServer (llamar a shutdown() para pararlo).
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _ManejadorMetricas(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            datos = _registro.exportar_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(datos)))
+            self.end_headers()
+            self.wfile.write(datos)
+
+    servidor = ThreadingHTTPServer((host, puerto), _ManejadorMetricas)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="metricas", daemon=True).start()
+    return servidor
+
+
+class EscritorJSONL:
+    """Suscriptor que escribe cada observación como una línea JSON."""
+
+    def __init__(self, fichero):
+        self._fichero = fichero
+        self._lock = threading.Lock()
+
+    def __call__(self, evento: dict):
+        linea = json.dumps(evento, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._fichero.write(linea)
+            self._fichero.flush()
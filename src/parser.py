@@ -0,0 +1,193 @@
+# src/parser.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Parser de la lista numerada que devuelve el modelo.
+# Recorre el texto una sola vez, línea a línea, y en el mismo recorrido
+# separa título y descripción y detecta la etiqueta de coste de cada plan.
+# Admite las variantes que producen los modelos en la práctica:
+#   1. / 1) / 1.-  · título con o sin **negrita** · separador ':' o ' - '
+#   · descripciones partidas en varias líneas · viñetas bajo cada plan.
+# Sin dependencias: lo usan src/planes.py y la interfaz para el streaming.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import re
+from functools import lru_cache
+
+# Inicio de un plan: número de 1-2 cifras con '.', ')' o '.-', opcionalmente
+# precedido de una viñeta o de la apertura de la negrita ('**1. Título**').
+_PATRON_ITEM = re.compile(r"\s*(?:[-*•]\s+)?(\*\*)?(\d{1,2})(?:\.-|[.)])(\*\*)?\s+(.*)")
+
+# Separador entre título y descripción: ':' o un guion rodeado de espacios
+# (así no se corta 'Castro-Urdiales').
+_PATRON_SEPARADOR = re.compile(r":\s*|\s+[-–—]\s+")
+
+# Resto de un separador tras cerrar la negrita ('**Título**: ...').
+_PATRON_SEPARADOR_INICIAL = re.compile(r"\s*(?::|[-–—])?\s*")
+
+# Viñeta al principio de una línea de continuación.
+_PATRON_VINETA = re.compile(r"\s*[-*•]\s+")
+
+# Precio explícito: "1€", "2,50 €", "3 euros"...
+_PATRON_PRECIO = re.compile(r"\d+[.,]?\d*\s*(?:€|euros?)")
+
+
+def detectar_coste(texto: str) -> str | None:
+    """
+    Detecta la indicación de coste de una descripción.
+
+    'Gratuito' tiene prioridad sobre 'Bajo coste', y este sobre el primer
+    precio explícito. Las palabras clave se buscan con `in` (búsqueda de
+    subcadenas en C), que resulta más rápido que una única expresión
+    regular con alternativas; solo el precio necesita regex.
+
+    Returns:
+        Texto de coste formateado o None.
+    """
+    texto = texto.lower()
+    if "gratuit" in texto or "gratis" in texto or "libre" in texto:
+        return "Gratuito"
+    if "bajo coste" in texto or "económic" in texto:
+        return "Bajo coste"
+
+    precio = _PATRON_PRECIO.search(texto)
+    return f"~{precio.group(0).strip()}" if precio else None
+
+
+def _separar_titulo(resto: str, negrita_abierta: bool) -> tuple[str, str]:
+    """Divide el texto tras el número en (título, descripción)."""
+    if negrita_abierta or resto.startswith("**"):
+        inicio = 0 if negrita_abierta else 2
+        cierre = resto.find("**", inicio)
+        if cierre >= 0:
+            titulo = resto[inicio:cierre]
+            descripcion = resto[cierre + 2:]
+            descripcion = descripcion[_PATRON_SEPARADOR_INICIAL.match(descripcion).end():]
+            # '**Título:** descripción' o '**Título: descripción**'
+            if not descripcion:
+                match = _PATRON_SEPARADOR.search(titulo)
+                if match:
+                    return titulo[:match.start()], titulo[match.end():]
+            return titulo.rstrip(":"), descripcion
+
+    match = _PATRON_SEPARADOR.search(resto)
+    if match:
+        return resto[:match.start()], resto[match.end():]
+    return resto, ""
+
+
+class ParserPlanes:
+    """
+    Parser incremental: recibe el texto por trozos (p. ej. los fragmentos
+    de un stream) y devuelve cada plan en cuanto se sabe que está completo,
+    es decir, al empezar el siguiente o al terminar el texto.
+
+    Cada plan es una tupla (num, titulo, descripcion, coste).
+    """
+
+    def __init__(self):
+        self._pendiente = ""  # Línea aún sin terminar
+        self._actual: list | None = None  # [num, titulo, partes de la descripción]
+        self._hueco = False  # Hubo una línea en blanco dentro del plan actual
+
+    def alimentar(self, fragmento: str) -> list[tuple]:
+        """
+        Procesa un trozo de texto.
+
+        Returns:
+            Planes que han quedado completos con este trozo.
+        """
+        completos = []
+        lineas = (self._pendiente + fragmento).split("\n")
+        self._pendiente = lineas.pop()
+        for linea in lineas:
+            self._linea(linea, completos)
+        return completos
+
+    def terminar(self) -> list[tuple]:
+        """
+        Procesa la última línea y cierra el plan en curso.
+
+        Returns:
+            Planes que quedaban por devolver.
+        """
+        completos = []
+        if self._pendiente:
+            self._linea(self._pendiente, completos)
+            self._pendiente = ""
+        self._cerrar(completos)
+        return completos
+
+    def en_curso(self) -> tuple[int, bool] | None:
+        """
+        Plan aún sin cerrar, según las líneas ya terminadas.
+
+        Returns:
+            (num, si ya tiene descripción), o None si no hay ninguno.
+        """
+        if self._actual is None:
+            return None
+        return self._actual[0], bool(self._actual[2])
+
+    def cerrado_por(self, inicio: str) -> bool:
+        """
+        Si una línea que empiece por `inicio` cerrará el plan en curso sea
+        cual sea su resto: tras una línea en blanco, cualquier texto cierra
+        un plan que ya tiene descripción.
+        """
+        return (
+            self._actual is not None and self._hueco and bool(self._actual[2])
+            and bool(inicio.strip())
+        )
+
+    def _linea(self, linea: str, completos: list):
+        item = _PATRON_ITEM.match(linea)
+        if item:
+            self._cerrar(completos)
+            negrita_abierta = bool(item.group(1)) and not item.group(3)
+            titulo, descripcion = _separar_titulo(item.group(4).strip(), negrita_abierta)
+            self._actual = [int(item.group(2)), titulo, [descripcion] if descripcion else []]
+            self._hueco = False
+            return
+
+        if self._actual is None:
+            return  # Texto introductorio
+
+        linea = linea.strip()
+        if not linea:
+            self._hueco = True
+            return
+
+        # Tras una línea en blanco solo se sigue si aún falta la descripción;
+        # si no, es una conclusión o un texto ajeno a la lista.
+        if self._hueco and self._actual[2]:
+            self._cerrar(completos)
+            return
+
+        vineta = _PATRON_VINETA.match(linea)
+        if vineta:
+            linea = linea[vineta.end():]
+        self._actual[2].append(linea)
+
+    def _cerrar(self, completos: list):
+        if self._actual is None:
+            return
+        num, titulo, partes = self._actual
+        self._actual = None
+        titulo = titulo.strip().strip("*").strip()
+        descripcion = " ".join(partes).strip()
+        if titulo and descripcion:
+            completos.append((num, titulo, descripcion, detectar_coste(descripcion)))
+
+
+@lru_cache(maxsize=256)
+def extraer_planes(texto: str) -> tuple[tuple, ...]:
+    """
+    Extrae los planes de un texto completo.
+
+    El resultado se memoriza por texto, de modo que la misma respuesta (p. ej.
+    la de la caché, pedida por varias sesiones) no se parsea dos veces.
+
+    Returns:
+        Tupla de planes (num, titulo, descripcion, coste).
+    """
+    parser = ParserPlanes()
+    return tuple(parser.alimentar(texto) + parser.terminar())
@@ -0,0 +1,210 @@
+# src/planes.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Modelo tipado de un plan y conversión de la respuesta del modelo a planes.
+# La respuesta se valida una sola vez al generarla (en src/asistente.py) y a
+# partir de ahí la UI, la consola y la caché trabajan con objetos Plan, sin
+# volver a parsear el texto en cada rerun de Streamlit. También está aquí el
+# prompt que pide los planes, único para la app y la consola: la clave de la
+# caché compartida se calcula a partir de él.
+# Sin dependencias de Streamlit: lo usa también la versión de consola.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import json
+
+from src.parser import detectar_coste, extraer_planes
+
+# Instrucciones de formato para el modo de salida estructurada (JSON)
+INSTRUCCIONES_JSON = (
+    'Responde únicamente con un objeto JSON válido con la forma '
+    '{"planes": [{"titulo": "...", "descripcion": "...", "coste": "..."}]}, '
+    "con exactamente 10 elementos en \"planes\". \"titulo\" es el nombre "
+    "del plan, \"descripcion\" una descripción breve de 1-2 oraciones y "
+    "\"coste\" una etiqueta corta como \"Gratuito\", \"Bajo coste\" o el "
+    "precio aproximado (p. ej. \"~5 €\"). No añadas texto fuera del JSON "
+    "ni bloques de código."
+)
+
+
+def construir_prompt(ciudad: str, formato: str = "texto") -> list[dict]:
+    """
+    Construye el prompt con sistema + usuario para el chat del modelo.
+
+    Args:
+        ciudad: Nombre de la ciudad objetivo.
+        formato: "texto" para la lista numerada (la que se muestra en
+            streaming) o "json" para la salida estructurada.
+
+    Returns:
+        Lista de mensajes en formato chat.
+    """
+    mensaje_sistema = (
+        "Eres un asistente de viajes familiar experto en turismo sostenible y "
+        "de bajo coste. Respondes siempre en español, de forma clara, amigable "
+        "y bien estructurada. Cada plan que sugieres debe ser apto para niños, "
+        "adecuado para toda la familia y gratuito o de muy bajo coste."
+    )
+
+    peticion = (
+        f"Dame exactamente 10 planes recomendados para hacer en {ciudad} "
+        f"con niños y en familia, que sean gratuitos o de muy bajo coste.\n\n"
+    )
+
+    if formato == "json":
+        mensaje_usuario = peticion + INSTRUCCIONES_JSON
+    else:
+        mensaje_usuario = peticion + (
+            "Formato de respuesta obligatorio:\n"
+            "1. **[Nombre del plan]**: [Descripción breve de 1-2 oraciones. "
+            "Indica si es gratuito o el coste aproximado.]\n"
+            "2. ...\n"
+            "...\n"
+            "10. ...\n\n"
+            "No añadas texto introductorio ni conclusión, solo la lista numerada "
+            "del 1 al 10."
+        )
+
+    return [
+        {"role": "system", "content": mensaje_sistema},
+        {"role": "user", "content": mensaje_usuario},
+    ]
+
+
+class Plan:
+    """Un plan recomendado. Usa __slots__ para ocupar lo mínimo en memoria."""
+
+    __slots__ = ("num", "titulo", "descripcion", "coste")
+
+    def __init__(self, num: int, titulo: str, descripcion: str, coste: str | None = None):
+        self.num = num
+        self.titulo = titulo
+        self.descripcion = descripcion
+        self.coste = coste
+
+    def __repr__(self) -> str:
+        return f"Plan({self.num}, {self.titulo!r}, coste={self.coste!r})"
+
+    def __eq__(self, otro) -> bool:
+        if not isinstance(otro, Plan):
+            return NotImplemented
+        return self.a_tupla() == otro.a_tupla()
+
+    def a_tupla(self) -> tuple:
+        return (self.num, self.titulo, self.descripcion, self.coste)
+
+    def a_dict(self) -> dict:
+        """Representación serializable (JSON) del plan."""
+        return {
+            "num": self.num,
+            "titulo": self.titulo,
+            "descripcion": self.descripcion,
+            "coste": self.coste,
+        }
+
+
+def planes_a_json(planes: list[Plan]) -> str:
+    """Serializa una lista de planes (para la caché o el modo por lotes)."""
+    return json.dumps([plan.a_tupla() for plan in planes], ensure_ascii=False)
+
+
+def planes_desde_json(texto: str) -> list[Plan]:
+    """Reconstruye los planes serializados con planes_a_json."""
+    return [Plan(*fila) for fila in json.loads(texto)]
+
+
+def _texto(valor) -> str:
+    return valor.strip() if isinstance(valor, str) else ""
+
+
+def validar_planes_json(texto: str) -> list[Plan]:
+    """
+    Valida una respuesta en modo JSON y la convierte en planes.
+
+    Acepta tanto {"planes": [...]} como una lista directa, y tolera texto o
+    bloques de código alrededor del JSON.
+
+    Args:
+        texto: Respuesta del modelo.
+
+    Returns:
+        Lista de planes, numerados del 1 en adelante.
+
+    Raises:
+        ValueError: Si no hay JSON válido o ningún plan tiene título y
+            descripción.
+    """
+    inicio = min((i for i in (texto.find("{"), texto.find("[")) if i >= 0), default=-1)
+    fin = max(texto.rfind("}"), texto.rfind("]"))
+    if inicio < 0 or fin <= inicio:
+        raise ValueError("La respuesta no contiene JSON.")
+
+    datos = json.loads(texto[inicio:fin + 1])  # JSONDecodeError es un ValueError
+    if isinstance(datos, dict):
+        datos = datos.get("planes")
+    if not isinstance(datos, list):
+        raise ValueError("El JSON no contiene una lista de planes.")
+
+    planes = []
+    for elemento in datos:
+        if not isinstance(elemento, dict):
+            continue
+        titulo = _texto(elemento.get("titulo"))
+        descripcion = _texto(elemento.get("descripcion"))
+        if not titulo or not descripcion:
+            continue
+        coste = _texto(elemento.get("coste")) or detectar_coste(descripcion)
+        planes.append(Plan(len(planes) + 1, titulo, descripcion, coste))
+
+    if not planes:
+        raise ValueError("El JSON no contiene planes válidos.")
+    return planes
+
+
+def validar_planes(texto: str, formato: str = "texto") -> list[Plan]:
+    """
+    Convierte la respuesta del modelo en planes tipados.
+
+    Se llama una sola vez, al recibir la respuesta: la UI, la consola y la
+    caché trabajan ya con la lista de Plan. Si una respuesta en modo JSON no
+    es válida, se intenta leer como lista numerada antes de darla por
+    perdida.
+
+    Args:
+        texto: Respuesta del modelo.
+        formato: Formato pedido en el prompt ("json" o "texto").
+
+    Returns:
+        Lista de planes (vacía si la respuesta no sigue ningún formato).
+    """
+    if formato == "json":
+        try:
+            return validar_planes_json(texto)
+        except ValueError:
+            pass
+    return parsear_planes_texto(texto)
+
+
+# ── Parser de texto libre ────────────────────────────────────────────────────
+
+def parsear_planes_texto(texto: str) -> list[Plan]:
+    """
+    Parsea el texto libre del modelo y extrae cada plan (ver src/parser.py
+    para los formatos admitidos).
+
+    Returns:
+        Lista de planes (vacía si el texto no sigue ningún formato).
+    """
+    return [Plan(*fila) for fila in extraer_planes(texto)]
+
+
+def formatear_planes(planes: list[Plan]) -> str:
+    """
+    Formatea los planes como lista numerada para mostrarlos en la consola.
+
+    Returns:
+        Texto con un plan por línea.
+    """
+    lineas = []
+    for plan in planes:
+        coste = f" [{plan.coste}]" if plan.coste else ""
+        lineas.append(f"{plan.num}. {plan.titulo}: {plan.descripcion}{coste}")
+    return "\n".join(lineas)
@@ -0,0 +1,306 @@
+# src/presupuesto.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Presupuesto de tokens de salida y corte temprano tras el décimo plan.
+# El tiempo de generación crece con cada token de salida, y el modelo suele
+# seguir escribiendo (conclusiones, despedidas) después del plan 10 aunque
+# el prompt lo prohíbe. Aquí se aprende, por modelo y formato, cuántos
+# tokens ocupa una respuesta completa de 10 planes para fijar max_tokens a
+# partir de lo observado, se definen secuencias de parada y se detecta el
+# final del décimo plan para cortar el stream en ese momento.
+# Coste de arranque: lo que el modelo escribe tras el décimo plan solo se
+# mide en respuestas sin cortar, así que los primeros streams cortados de
+# cada (modelo, formato), `muestras_arranque` (3 por defecto), se siguen
+# leyendo hasta el final en segundo plano. El usuario no lo espera, pero
+# esos streams consumen todos sus tokens. Las respuestas sin stream, que
+# no se cortan, ya cuentan como medida y terminan el arranque.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import math
+import random
+import threading
+from collections import deque
+from typing import NamedTuple
+
+from src.metricas import CUBOS_TOKENS, METRICA_AHORRO, obtener_registro
+from src.parser import ParserPlanes
+from src.planes import validar_planes
+
+NUM_PLANES = 10
+
+# Secuencias de parada por formato: en la lista numerada, el modelo se
+# detiene si empieza un undécimo plan. En JSON no hay una secuencia segura.
+PARADAS = {
+    "texto": ["\n11.", "\n**11."],
+    "json": [],
+}
+
+# Caracteres por token de partida, hasta calibrarlo con el campo `usage`
+_CARACTERES_POR_TOKEN = 4.0
+
+
+class CorteDecimoPlan:
+    """
+    Detecta, sobre el texto que va llegando, el final del décimo plan: lo
+    que venga después es texto que el prompt prohíbe y se puede dejar de
+    generar.
+
+    El plan 10 termina cuando empieza un undécimo o cuando, tras una línea
+    en blanco, llega texto que no es parte de su descripción (lo mismo que
+    decide ParserPlanes), así que no se pierden sus líneas de continuación
+    ni sus viñetas. Mientras dura el plan 10 cada línea se retiene hasta
+    saber si pertenece a él; si el stream acaba antes, `terminar` devuelve
+    lo retenido. Si el modelo no escribe nada tras el plan 10, la
+    respuesta termina sola (o con las secuencias de PARADAS).
+    """
+
+    def __init__(self, objetivo: int = NUM_PLANES):
+        self._parser = ParserPlanes()
+        self._objetivo = objetivo
+        self._linea = ""     # Línea aún sin terminar
+        self._entregado = 0  # Parte de esa línea ya entregada
+        self.cortado = False
+        self.resto = ""      # Texto recibido y no entregado al cortar
+
+    def _en_ultimo_plan(self) -> bool:
+        en_curso = self._parser.en_curso()
+        return en_curso is not None and en_curso[0] >= self._objetivo
+
+    def alimentar(self, fragmento: str) -> tuple[str, bool]:
+        """
+        Procesa un fragmento.
+
+        Returns:
+            (texto que hay que entregar, si la respuesta ya está completa y
+            hay que cortar).
+        """
+        if self.cortado:
+            self.resto += fragmento
+            return "", True
+
+        salida = []
+        while True:
+            fin = fragmento.find("\n")
+            if fin < 0:
+                self._linea += fragmento
+                if not self._en_ultimo_plan():
+                    salida.append(self._linea[self._entregado:])
+                    self._entregado = len(self._linea)
+                elif self._parser.cerrado_por(self._linea):
+                    # Texto tras una línea en blanco: no hace falta esperar
+                    # a que termine la línea para saber que el plan acabó
+                    self.cortado = True
+                    self.resto = self._linea[self._entregado:]
+                    self._linea, self._entregado = "", 0
+                    return "".join(salida), True
+                return "".join(salida), False
+
+            linea = self._linea + fragmento[:fin + 1]
+            fragmento = fragmento[fin + 1:]
+            completos = self._parser.alimentar(linea)
+            if any(plan[0] >= self._objetivo for plan in completos):
+                # El plan terminó antes de esta línea: ni ella ni lo que
+                # sigue se entregan
+                self.cortado = True
+                self.resto = linea[self._entregado:] + fragmento
+                self._linea, self._entregado = "", 0
+                return "".join(salida), True
+            salida.append(linea[self._entregado:])
+            self._linea, self._entregado = "", 0
+
+    def terminar(self) -> str:
+        """Texto retenido que queda por entregar al acabar el stream."""
+        if self.cortado:
+            return ""
+        pendiente = self._linea[self._entregado:]
+        self._linea, self._entregado = "", 0
+        return pendiente
+
+
+def fin_decimo_plan(texto: str) -> int:
+    """Posición donde termina el décimo plan (o el final del texto)."""
+    corte = CorteDecimoPlan()
+    parte, cortar = corte.alimentar(texto)
+    return len(parte.rstrip()) if cortar else len(texto)
+
+
+class Informe(NamedTuple):
+    """Resultado de una petición respecto al presupuesto."""
+
+    max_tokens: int        # Presupuesto con el que se pidió
+    tokens_salida: int     # Tokens generados (reales o estimados)
+    tokens_ahorrados: int  # Estimación de los que se evitaron al cortar
+    completa: bool         # Si trae los 10 planes
+
+
+class PresupuestoSalida:
+    """
+    Ventanas deslizantes, por (modelo, formato), con los tokens que hicieron
+    falta para llegar al final del décimo plan, y con los que el modelo
+    siguió generando después cuando no se le cortó.
+
+    max_tokens es el percentil `percentil` de la ventana por `margen`,
+    entre `minimo` y `tope`. Hasta reunir `min_muestras` se usa el tope.
+    Lo que sigue al décimo plan solo se ve en las respuestas sin cortar;
+    `muestreo` es la fracción de cortes que se dejan terminar para medirlo,
+    salvo las `muestras_arranque` primeras, que se miden siempre mientras
+    no haya ninguna medida.
+    """
+
+    def __init__(
+        self,
+        tope: int,
+        margen: float = 1.25,
+        minimo: int = 256,
+        muestreo: float = 0.05,
+        min_muestras: int = 5,
+        percentil: float = 0.95,
+        tamano: int = 100,
+        muestras_arranque: int = 3,
+    ):
+        self.tope = tope
+        self.margen = margen
+        self.minimo = min(minimo, tope)
+        self.muestreo = muestreo
+        self.min_muestras = min_muestras
+        self.percentil = percentil
+        self.muestras_arranque = muestras_arranque
+        self._tamano = tamano
+        self._arranque: dict[tuple, int] = {}  # Colas pedidas sin ninguna medida
+        self._necesarios: dict[tuple, deque[int]] = {}
+        self._colas: dict[tuple, deque[int]] = {}
+        self._caracteres_por_token = _CARACTERES_POR_TOKEN
+        self._lock = threading.Lock()
+
+    def max_tokens(self, modelo: str, formato: str) -> int:
+        """Presupuesto para la próxima petición a `modelo` en `formato`."""
+        with self._lock:
+            muestras = self._necesarios.get((modelo, formato))
+            if not muestras or len(muestras) < self.min_muestras:
+                return self.tope
+            ordenadas = sorted(muestras)
+        valor = ordenadas[min(len(ordenadas) - 1, int(self.percentil * len(ordenadas)))]
+        return max(self.minimo, min(self.tope, math.ceil(valor * self.margen)))
+
+    def estadisticas(self, modelo: str, formato: str) -> dict:
+        """Presupuesto actual, respuestas observadas y cola media (en tokens)."""
+        max_tokens = self.max_tokens(modelo, formato)
+        with self._lock:
+            necesarios = self._necesarios.get((modelo, formato)) or ()
+            colas = self._colas.get((modelo, formato)) or ()
+            return {
+                "max_tokens": max_tokens,
+                "tope": self.tope,
+                "muestras": len(necesarios),
+                "cola_media": sum(colas) / len(colas) if colas else 0.0,
+            }
+
+    def muestrear_cola(self, modelo: str, formato: str) -> bool:
+        """
+        Si una respuesta ya cortada se debe leer hasta el final para medir
+        su cola: las `muestras_arranque` primeras mientras no haya ninguna
+        medida (cada una puede tardar o fallar), y luego al azar.
+        """
+        clave = (modelo, formato)
+        with self._lock:
+            if not self._colas.get(clave):
+                pedidas = self._arranque.get(clave, 0)
+                if pedidas < self.muestras_arranque:
+                    self._arranque[clave] = pedidas + 1
+                    return True
+        return random.random() < self.muestreo
+
+    def tokens(self, texto: str) -> int:
+        """Tokens estimados de un texto, con la proporción calibrada."""
+        return math.ceil(len(texto) / self._caracteres_por_token)
+
+    def registrar(
+        self,
+        modelo: str,
+        formato: str,
+        texto: str,
+        max_tokens: int,
+        tokens_salida: int | None = None,
+        cortada: bool = False,
+        truncada: bool = False,
+    ) -> Informe:
+        """
+        Anota una respuesta y publica los tokens ahorrados en las métricas.
+
+        Args:
+            modelo: Modelo que generó la respuesta.
+            formato: "texto" o "json".
+            texto: Texto completo recibido.
+            max_tokens: Presupuesto con el que se pidió.
+            tokens_salida: completion_tokens de la API, si lo trae (los
+                streams no lo traen); sirve para calibrar la estimación.
+            cortada: Si se dejó de leer tras el décimo plan.
+            truncada: Si el modelo se quedó sin presupuesto.
+
+        Returns:
+            Informe de la petición. Los tokens ahorrados se estiman con la
+            media de lo que el modelo escribió tras el décimo plan en las
+            respuestas que no se cortaron.
+        """
+        completa = len(validar_planes(texto, formato)) >= NUM_PLANES
+        fin = fin_decimo_plan(texto) if formato == "texto" else len(texto)
+        clave = (modelo, formato)
+
+        with self._lock:
+            if tokens_salida and texto:
+                # Media móvil: la proporción cambia poco entre respuestas
+                self._caracteres_por_token += 0.2 * (len(texto) / tokens_salida - self._caracteres_por_token)
+            if tokens_salida is None:
+                tokens_salida = self.tokens(texto)
+
+            necesarios = self._necesarios.setdefault(clave, deque(maxlen=self._tamano))
+            colas = self._colas.setdefault(clave, deque(maxlen=self._tamano))
+            if completa:
+                necesarios.append(self.tokens(texto[:fin]))
+                if not cortada:
+                    colas.append(self.tokens(texto[fin:].strip()))
+            elif truncada:
+                # Presupuesto corto: una muestra en el tope lo hace subir
+                necesarios.append(self.tope)
+
+            ahorrados = round(sum(colas) / len(colas)) if cortada and colas else 0
+
+        obtener_registro().observar(
+            METRICA_AHORRO, ahorrados, limites=CUBOS_TOKENS, modelo=modelo, formato=formato
+        )
+        return Informe(max_tokens, tokens_salida, ahorrados, completa)
+
+
+# ── Instancia compartida por proceso ─────────────────────────────────────────
+_presupuesto: PresupuestoSalida | None = None
+_lock_presupuesto = threading.Lock()
+
+
+def obtener_presupuesto(
+    tope: int,
+    margen: float = 1.25,
+    minimo: int = 256,
+    muestreo: float = 0.05,
+    muestras_arranque: int = 3,
+) -> PresupuestoSalida:
+    """
+    Devuelve el presupuesto del proceso, creándolo la primera vez (los
+    argumentos solo se usan entonces).
+
+    Args:
+        tope: max_tokens máximo (el fijo de la configuración).
+        margen: Factor sobre el percentil observado.
+        minimo: max_tokens mínimo.
+        muestreo: Fracción de cortes que se dejan terminar para medir la cola.
+        muestras_arranque: Cortes que se dejan terminar mientras no haya
+            ninguna medida de la cola (0 para no hacerlo).
+
+    Returns:
+        Instancia compartida de PresupuestoSalida.
+    """
+    global _presupuesto
+    with _lock_presupuesto:
+        if _presupuesto is None:
+            _presupuesto = PresupuestoSalida(
+                tope, margen, minimo, muestreo, muestras_arranque=muestras_arranque
+            )
+        return _presupuesto
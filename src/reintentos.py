@@ -0,0 +1,376 @@
+# src/reintentos.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Política de reintentos para las llamadas al modelo:
+#   - Espera exponencial con jitter (en lugar de 5 s fijos).
+#   - Respeta la cabecera Retry-After de la API (p. ej. en un 429).
+#   - No reintenta errores que no se arreglan solos (401, 404, bugs...).
+#   - Cortocircuito: tras varios fallos seguidos deja de llamar a la API
+#     durante un tiempo y falla al instante.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import random
+import sys
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# Códigos HTTP que indican un problema transitorio
+CODIGOS_REINTENTABLES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+class CircuitoAbiertoError(ConnectionError):
+    """La API se considera caída y no se intenta la llamada."""
+
+    def __init__(self, reabre_en: float):
+        self.reabre_en = reabre_en
+        super().__init__(
+            "La API de inferencia no responde; se ha pausado el envío de "
+            f"consultas. Se volverá a intentar en {reabre_en:.0f}s."
+        )
+
+
+class ReintentosAgotadosError(ConnectionError):
+    """La llamada falló en todos los intentos permitidos."""
+
+    def __init__(self, intentos: int, causa: Exception):
+        self.intentos = intentos
+        self.causa = causa
+        if es_error_http(causa):
+            mensaje = (
+                f"No se pudo conectar con la API de inferencia "
+                f"tras {intentos} intentos. Detalle: {causa}"
+            )
+        else:
+            mensaje = (
+                f"Error inesperado tras {intentos} intentos: "
+                f"{type(causa).__name__}: {causa}"
+            )
+        super().__init__(mensaje)
+
+
+def es_error_http(error: Exception) -> bool:
+    """
+    Indica si `error` es un error HTTP de huggingface_hub o del backend
+    compatible con OpenAI (src/backends.py).
+
+    No importa las librerías (huggingface_hub cuesta ~100 ms): si aún no
+    están cargadas, ninguna llamada ha podido lanzar uno de sus errores.
+    """
+    for modulo, clase in (("huggingface_hub.errors", "HfHubHTTPError"),
+                          ("src.backends", "ErrorHTTPInferencia")):
+        errores = sys.modules.get(modulo)
+        if errores is not None and isinstance(error, getattr(errores, clase)):
+            return True
+    return False
+
+
+def errores_red() -> tuple[type, ...]:
+    """
+    Excepciones de red de las librerías HTTP que puede usar huggingface_hub.
+
+    Solo se miran las librerías ya cargadas, por el mismo motivo que en
+    es_error_http.
+    """
+    tipos: list[type] = [ConnectionError, TimeoutError]
+    requests = sys.modules.get("requests")
+    if requests is not None and hasattr(requests, "Timeout"):
+        tipos += [requests.ConnectionError, requests.Timeout]
+    # huggingface_hub 1.x usa httpx; las versiones más recientes, httpx2
+    for nombre in ("httpx", "httpx2"):
+        modulo = sys.modules.get(nombre)
+        if modulo is not None and hasattr(modulo, "TransportError"):
+            tipos.append(modulo.TransportError)
+    return tuple(tipos)
+
+
+def codigo_estado(error: Exception) -> int | None:
+    """Devuelve el código HTTP asociado a un error, si lo tiene."""
+    respuesta = getattr(error, "response", None)
+    return getattr(respuesta, "status_code", None)
+
+
+def es_reintentable(error: Exception) -> bool:
+    """
+    Indica si merece la pena repetir una llamada que ha fallado con `error`.
+
+    Se reintentan los errores HTTP transitorios (429, 5xx...) y los de red
+    (timeouts, conexión rechazada). Todo lo demás, incluidos los errores de
+    programación, falla a la primera.
+    """
+    if isinstance(error, CircuitoAbiertoError):
+        return False
+    if es_error_http(error):
+        codigo = codigo_estado(error)
+        return codigo is None or codigo in CODIGOS_REINTENTABLES
+    return isinstance(error, errores_red())
+
+
+def leer_retry_after(error: Exception) -> float | None:
+    """
+    Lee la cabecera Retry-After de la respuesta HTTP de un error.
+
+    Returns:
+        Segundos a esperar, o None si la cabecera no existe o no es válida.
+    """
+    respuesta = getattr(error, "response", None)
+    cabeceras = getattr(respuesta, "headers", None)
+    if not cabeceras:
+        return None
+
+    valor = cabeceras.get("Retry-After")
+    if not valor:
+        return None
+
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(valor).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class Circuito:
+    """
+    Cortocircuito (circuit breaker) compartido por todo el proceso.
+
+    - cerrado: las llamadas pasan con normalidad.
+    - abierto: tras `umbral_fallos` fallos seguidos, las llamadas fallan al
+      instante con CircuitoAbiertoError durante `enfriamiento` segundos.
+    - semiabierto: pasado el enfriamiento, se deja pasar una única llamada
+      de prueba; si va bien se cierra, si falla se vuelve a abrir.
+    """
+
+    def __init__(self, umbral_fallos: int, enfriamiento: float):
+        self.umbral_fallos = umbral_fallos
+        self.enfriamiento = enfriamiento
+        self._lock = threading.Lock()
+        self._fallos = 0
+        self._abierto_desde: float | None = None
+        self._prueba_en_curso = False
+
+    def permitir(self):
+        """
+        Comprueba si se puede llamar a la API.
+
+        Raises:
+            CircuitoAbiertoError: Si el circuito está abierto.
+        """
+        with self._lock:
+            if self._abierto_desde is None:
+                return
+
+            restante = self._abierto_desde + self.enfriamiento - time.monotonic()
+            if restante > 0 or self._prueba_en_curso:
+                raise CircuitoAbiertoError(max(restante, 0.0))
+
+            self._prueba_en_curso = True
+
+    def registrar_exito(self):
+        """Cierra el circuito tras una llamada correcta."""
+        with self._lock:
+            self._fallos = 0
+            self._abierto_desde = None
+            self._prueba_en_curso = False
+
+    def registrar_fallo(self):
+        """Cuenta un fallo transitorio y abre el circuito si procede."""
+        with self._lock:
+            self._fallos += 1
+            if self._prueba_en_curso or self._fallos >= self.umbral_fallos:
+                self._abierto_desde = time.monotonic()
+            self._prueba_en_curso = False
+
+    def liberar(self):
+        """Libera la llamada de prueba si terminó sin éxito ni fallo transitorio."""
+        with self._lock:
+            self._prueba_en_curso = False
+
+    def estado(self) -> dict:
+        """
+        Devuelve el estado actual para mostrarlo en la interfaz.
+
+        Returns:
+            Dict con 'estado' ('cerrado', 'abierto' o 'semiabierto'),
+            'fallos_consecutivos' y 'reabre_en' (segundos, o 0).
+        """
+        with self._lock:
+            if self._abierto_desde is None:
+                estado, reabre_en = "cerrado", 0.0
+            else:
+                reabre_en = max(
+                    0.0, self._abierto_desde + self.enfriamiento - time.monotonic()
+                )
+                estado = "abierto" if reabre_en > 0 else "semiabierto"
+            return {
+                "estado": estado,
+                "fallos_consecutivos": self._fallos,
+                "reabre_en": reabre_en,
+            }
+
+
+class PoliticaReintentos:
+    """
+    Decide cuántas veces y cuánto esperar antes de repetir una llamada.
+
+    La espera es exponencial con jitter completo: un valor aleatorio entre 0
+    y espera_base · 2^(intento-1), con tope en espera_maxima. Si la API
+    indica Retry-After, se respeta; si pide esperar más que espera_maxima,
+    no se reintenta.
+    """
+
+    def __init__(
+        self,
+        max_intentos: int,
+        espera_base: float,
+        espera_maxima: float,
+        circuito: Circuito,
+    ):
+        self.max_intentos = max_intentos
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self.circuito = circuito
+
+    def siguiente_espera(self, intento: int, error: Exception) -> float | None:
+        """
+        Calcula la espera antes del siguiente intento.
+
+        Args:
+            intento: Número del intento que acaba de fallar (desde 1).
+            error: Excepción producida.
+
+        Returns:
+            Segundos a esperar, o None si no se debe reintentar.
+        """
+        if intento >= self.max_intentos or not es_reintentable(error):
+            return None
+
+        retry_after = leer_retry_after(error)
+        if retry_after is not None:
+            return retry_after if retry_after <= self.espera_maxima else None
+
+        tope = min(self.espera_maxima, self.espera_base * 2 ** (intento - 1))
+        return random.uniform(0, tope)
+
+    def _antes(self):
+        self.circuito.permitir()
+
+    def _despues_de_error(self, intento: int, error: Exception) -> float:
+        """Registra el fallo y devuelve la espera, o lanza el error final."""
+        if es_reintentable(error):
+            self.circuito.registrar_fallo()
+        else:
+            self.circuito.liberar()
+
+        espera = self.siguiente_espera(intento, error)
+        if espera is not None:
+            return espera
+
+        # Token ausente o respuesta vacía: se propagan tal cual. Los errores
+        # HTTP y de red también heredan de OSError en algunas versiones de
+        # huggingface_hub/requests, así que se excluyen explícitamente.
+        if isinstance(error, (ValueError, EnvironmentError)) and not (
+            es_error_http(error) or isinstance(error, errores_red())
+        ):
+            raise error
+        raise ReintentosAgotadosError(intento, error) from error
+
+    def ejecutar(self, funcion, al_reintentar=None):
+        """
+        Ejecuta `funcion(intento)` aplicando la política.
+
+        Args:
+            funcion: Llamable que recibe el número de intento (desde 1).
+            al_reintentar: Función opcional (intento, error, espera) que se
+                llama antes de cada espera, para informar al usuario.
+
+        Returns:
+            Lo que devuelva `funcion`.
+
+        Raises:
+            CircuitoAbiertoError: Si el circuito está abierto.
+            ReintentosAgotadosError: Si se agotan los intentos o el error no
+                es reintentable (ambos son ConnectionError).
+            ValueError, EnvironmentError: Se propagan sin reintentar.
+        """
+        for intento in range(1, self.max_intentos + 1):
+            self._antes()
+            try:
+                resultado = funcion(intento)
+            except Exception as e:
+                espera = self._despues_de_error(intento, e)
+                if al_reintentar:
+                    al_reintentar(intento, e, espera)
+                time.sleep(espera)
+            except BaseException:
+                # Cancelación o interrupción: no dice nada de la API, pero
+                # si era la llamada de prueba hay que dejar paso a otra
+                self.circuito.liberar()
+                raise
+            else:
+                self.circuito.registrar_exito()
+                return resultado
+
+    async def ejecutar_async(self, funcion, al_reintentar=None):
+        """
+        Igual que ejecutar, pero `funcion(intento)` es una corrutina y las
+        esperas usan asyncio.sleep.
+        """
+        import asyncio  # Solo en la API asíncrona; la consola no lo carga
+
+        for intento in range(1, self.max_intentos + 1):
+            self._antes()
+            try:
+                resultado = await funcion(intento)
+            except Exception as e:
+                espera = self._despues_de_error(intento, e)
+                if al_reintentar:
+                    al_reintentar(intento, e, espera)
+                await asyncio.sleep(espera)
+            except BaseException:
+                # Cancelación o interrupción: no dice nada de la API, pero
+                # si era la llamada de prueba hay que dejar paso a otra
+                self.circuito.liberar()
+                raise
+            else:
+                self.circuito.registrar_exito()
+                return resultado
+
+    def estado(self) -> dict:
+        """Estado del cortocircuito (ver Circuito.estado)."""
+        return self.circuito.estado()
+
+
+# ── Instancia compartida por proceso ─────────────────────────────────────────
+_politica: PoliticaReintentos | None = None
+_lock_politica = threading.Lock()
+
+
+def obtener_politica(
+    max_intentos: int,
+    espera_base: float,
+    espera_maxima: float,
+    umbral_fallos: int,
+    enfriamiento: float,
+) -> PoliticaReintentos:
+    """
+    Devuelve la política de reintentos del proceso, creándola la primera vez.
+
+    El cortocircuito debe ser único para que todos los hilos vean el mismo
+    estado de la API; los argumentos solo se usan en la primera llamada.
+
+    Returns:
+        Instancia compartida de PoliticaReintentos.
+    """
+    global _politica
+    with _lock_politica:
+        if _politica is None:
+            _politica = PoliticaReintentos(
+                max_intentos,
+                espera_base,
+                espera_maxima,
+                Circuito(umbral_fallos, enfriamiento),
+            )
+        return _politica
@@ -0,0 +1,274 @@
+# src/snapshot.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Snapshot de planes precalculados, de solo lectura y mapeado en memoria.
+# Las ciudades más buscadas se generan por lotes (main.py --batch) y se
+# empaquetan en un fichero (main.py --exportar-snapshot) que la app abre
+# con mmap: cada búsqueda es una búsqueda binaria sobre el índice ordenado
+# de claves, sin llamar al modelo, sin SQLite y sin cargar el fichero entero
+# en cada proceso (las páginas se comparten a través de la caché del SO).
+#
+# Formato (enteros little-endian):
+#   cabecera  MAGIA (8 bytes) · versión (u16) · reservado (u16) · n (u32) · creado (f64)
+#   índice    n × (desplazamiento clave u64 · longitud u32 · desplazamiento valor u64 · longitud u32),
+#             ordenado por los bytes UTF-8 de la clave
+#   datos     claves (clave_ciudad) y valores (JSON con ciudad y planes)
+#
+# El fichero se escribe en uno temporal y se sustituye con os.replace, así
+# que un lector nunca ve uno a medias; SnapshotVigilado detecta el cambio
+# (inodo, tamaño, mtime) y pasa al nuevo sin reiniciar la app.
+# Sin dependencias de Streamlit.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from src.ciudades import clave_ciudad
+from src.planes import Plan
+
+MAGIA = b"PLANSNAP"
+VERSION = 1
+
+_CABECERA = struct.Struct("<8sHHId")
+_ENTRADA = struct.Struct("<QIQI")
+
+
+class SnapshotInvalidoError(ValueError):
+    """El fichero no es un snapshot de planes o tiene otra versión."""
+
+
+def escribir_snapshot(ruta: str, resultados) -> int:
+    """
+    Escribe un snapshot de forma atómica.
+
+    Args:
+        ruta: Fichero de destino (se reemplaza si existe).
+        resultados: Iterable de (ciudad, planes). Si una ciudad aparece
+            varias veces (o con variantes del nombre), gana la última.
+
+    Returns:
+        Número de ciudades escritas.
+    """
+    valores: dict[bytes, bytes] = {}
+    for ciudad, planes in resultados:
+        clave = clave_ciudad(ciudad).encode("utf-8")
+        if not clave or not planes:
+            continue
+        valores[clave] = json.dumps(
+            {"ciudad": ciudad, "planes": [plan.a_tupla() for plan in planes]},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+
+    claves = sorted(valores)
+    posicion = _CABECERA.size + _ENTRADA.size * len(claves)
+    indice, datos = [], []
+    for clave in claves:
+        valor = valores[clave]
+        indice.append(_ENTRADA.pack(posicion, len(clave), posicion + len(clave), len(valor)))
+        datos += [clave, valor]
+        posicion += len(clave) + len(valor)
+
+    cabecera = _CABECERA.pack(MAGIA, VERSION, 0, len(claves), time.time())
+    escribir_atomico(ruta, [cabecera, *indice, *datos])
+    return len(claves)
+
+
+def escribir_atomico(ruta: str, bloques):
+    """
+    Escribe los bloques de bytes en un temporal del mismo directorio y lo
+    pone en `ruta` con os.replace: un lector ve el fichero anterior o el
+    nuevo completo, nunca uno a medias.
+    """
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    os.makedirs(directorio, exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=directorio, prefix=".snapshot-")
+    try:
+        with os.fdopen(descriptor, "wb") as fichero:
+            fichero.writelines(bloques)
+            fichero.flush()
+            os.fsync(fichero.fileno())
+        os.chmod(temporal, 0o644)
+        os.replace(temporal, ruta)
+    except BaseException:
+        os.unlink(temporal)
+        raise
+
+
+class Snapshot:
+    """
+    Snapshot abierto con mmap. Las búsquedas leen solo las entradas del
+    índice que visita la búsqueda binaria y el valor encontrado.
+
+    El mapa se cierra al liberar el objeto (no con un close explícito), para
+    que un hilo que aún lo esté leyendo tras un cambio de snapshot termine
+    sin errores.
+    """
+
+    def __init__(self, ruta: str):
+        with open(ruta, "rb") as fichero:
+            self.firma = _firma(os.fstat(fichero.fileno()))
+            if self.firma[1] < _CABECERA.size:
+                raise SnapshotInvalidoError(f"{ruta}: fichero demasiado corto")
+            self._mapa = mmap.mmap(fichero.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magia, version, _, self._n, self.creado = _CABECERA.unpack_from(self._mapa, 0)
+        if magia != MAGIA or version != VERSION:
+            raise SnapshotInvalidoError(f"{ruta}: no es un snapshot de planes (v{VERSION})")
+        if _CABECERA.size + self._n * _ENTRADA.size > len(self._mapa):
+            raise SnapshotInvalidoError(f"{ruta}: índice truncado")
+        self.ruta = ruta
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __contains__(self, ciudad: str) -> bool:
+        return self._posicion(clave_ciudad(ciudad).encode("utf-8")) is not None
+
+    def _entrada(self, i: int) -> tuple[int, int, int, int]:
+        return _ENTRADA.unpack_from(self._mapa, _CABECERA.size + i * _ENTRADA.size)
+
+    def _clave(self, i: int) -> bytes:
+        inicio, longitud, _, _ = self._entrada(i)
+        return self._mapa[inicio:inicio + longitud]
+
+    def _posicion(self, clave: bytes) -> int | None:
+        """Búsqueda binaria de una clave en el índice."""
+        bajo, alto = 0, self._n
+        while bajo < alto:
+            medio = (bajo + alto) // 2
+            if self._clave(medio) < clave:
+                bajo = medio + 1
+            else:
+                alto = medio
+        if bajo < self._n and self._clave(bajo) == clave:
+            return bajo
+        return None
+
+    def posicion(self, ciudad: str) -> int | None:
+        """Posición de una ciudad en el índice ordenado, o None si no está."""
+        return self._posicion(clave_ciudad(ciudad).encode("utf-8"))
+
+    def leer(self, i: int) -> tuple[str, list[Plan]]:
+        """Ciudad y planes de la entrada `i` del índice ordenado."""
+        _, _, inicio, longitud = self._entrada(i)
+        valor = json.loads(self._mapa[inicio:inicio + longitud])
+        return valor["ciudad"], [Plan(*fila) for fila in valor["planes"]]
+
+    def buscar(self, ciudad: str) -> tuple[str, list[Plan]] | None:
+        """
+        Planes de una ciudad (cualquier variante de su nombre).
+
+        Returns:
+            (nombre de la ciudad, planes), o None si no está en el snapshot.
+        """
+        i = self.posicion(ciudad)
+        return self.leer(i) if i is not None else None
+
+    def recorrer(self):
+        """
+        Todas las ciudades con sus planes, en el orden de sus claves.
+
+        Yields:
+            tuple[str, list[Plan]]: Nombre de la ciudad y sus planes.
+        """
+        for i in range(self._n):
+            yield self.leer(i)
+
+    def ciudades(self) -> list[str]:
+        """Nombres de todas las ciudades, en el orden de sus claves."""
+        return [ciudad for ciudad, _ in self.recorrer()]
+
+    def claves(self) -> list[str]:
+        """Claves (clave_ciudad) de todas las ciudades, sin leer sus planes."""
+        return [self._clave(i).decode("utf-8") for i in range(self._n)]
+
+
+def _firma(estado: os.stat_result) -> tuple[int, int, int]:
+    """Lo que cambia al sustituir el fichero: inodo, tamaño y mtime."""
+    return estado.st_ino, estado.st_size, estado.st_mtime_ns
+
+
+class SnapshotVigilado:
+    """
+    Snapshot de una ruta que se recarga solo cuando el fichero cambia.
+
+    Como mucho cada `intervalo` segundos se hace un stat de la ruta; si el
+    fichero es otro (os.replace de un export nuevo), se abre y se cambia la
+    referencia de forma atómica. Las búsquedas en curso terminan con el
+    snapshot anterior. Si la ruta no existe o el fichero no es válido, no
+    hay snapshot (y se vuelve a mirar en la siguiente comprobación).
+    """
+
+    def __init__(self, ruta: str, intervalo: float = 5.0):
+        self.ruta = ruta
+        self.intervalo = intervalo
+        self._actual: Snapshot | None = None
+        self._firma: tuple[int, int, int] | None = None
+        self._comprobado = float("-inf")
+        self._lock = threading.Lock()
+        self._recargas = 0
+
+    def actual(self) -> Snapshot | None:
+        """Snapshot vigente, comprobando antes si el fichero ha cambiado."""
+        if time.monotonic() - self._comprobado >= self.intervalo:
+            self.comprobar()
+        return self._actual
+
+    def comprobar(self):
+        """Mira ahora si el fichero ha cambiado y, si es así, lo recarga."""
+        # Un solo hilo comprueba; los demás siguen con el snapshot actual
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._comprobado = time.monotonic()
+            try:
+                firma = _firma(os.stat(self.ruta))
+            except OSError:
+                self._actual, self._firma = None, None
+                return
+            if firma == self._firma:
+                return
+            try:
+                nuevo = Snapshot(self.ruta)
+            except (OSError, ValueError):
+                nuevo = None
+            self._actual, self._firma = nuevo, firma
+            self._recargas += nuevo is not None
+        finally:
+            self._lock.release()
+
+    def buscar(self, ciudad: str) -> tuple[str, list[Plan]] | None:
+        """Como Snapshot.buscar, o None si no hay snapshot."""
+        snapshot = self.actual()
+        return snapshot.buscar(ciudad) if snapshot is not None else None
+
+    def estadisticas(self) -> dict:
+        """Ruta, ciudades del snapshot vigente, su fecha y recargas hechas."""
+        snapshot = self._actual
+        return {
+            "ruta": self.ruta,
+            "ciudades": len(snapshot) if snapshot else 0,
+            "creado": snapshot.creado if snapshot else None,
+            "recargas": self._recargas,
+        }
+
+
+# ── Instancias compartidas por proceso ───────────────────────────────────────
+_snapshots: dict[str, SnapshotVigilado] = {}
+_lock_snapshots = threading.Lock()
+
+
+def obtener_snapshot(ruta: str, intervalo: float = 5.0) -> SnapshotVigilado:
+    """
+    Devuelve el snapshot vigilado de una ruta, creándolo la primera vez
+    (intervalo solo se usa entonces).
+    """
+    with _lock_snapshots:
+        if ruta not in _snapshots:
+            _snapshots[ruta] = SnapshotVigilado(ruta, intervalo)
+        return _snapshots[ruta]
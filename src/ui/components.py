@@ -3,9 +3,21 @@
 # Componentes reutilizables de la interfaz Streamlit.
 # ─────────────────────────────────────────────────────────────────────────────
 
-import re
+import html
+import threading
+from collections import OrderedDict
+from typing import Iterable
+
 import streamlit as st
 
+from src.almacen import AlmacenResultados
+from src.cola import Trabajo
+from src.indice import ResultadoBusqueda
+from src.config import CIUDADES_POPULARES
+from src.metricas import tramo
+from src.parser import ParserPlanes
+from src.planes import Plan, parsear_planes_texto
+
 
 def render_header():
     """Renderiza el encabezado principal de la aplicación."""
@@ -23,188 +35,409 @@ def render_header():
     )
 
 
-def render_sidebar():
+def render_sidebar(
+    estado_api: dict | None = None,
+    almacen: AlmacenResultados | None = None,
+    inferencia: str = "Hugging Face API",
+):
     """
     Renderiza el sidebar con información y el historial de búsquedas.
 
+    Se llama dentro de `with st.sidebar:`, para que la app pueda envolverla
+    en un st.fragment (los fragmentos no pueden abrir st.sidebar).
+
+    El historial de la sesión (st.session_state.historial) solo tiene las
+    claves de los resultados, que se leen del almacén compartido.
+
+    Args:
+        estado_api: Estado del cortocircuito de la API (ver
+            src/reintentos.Circuito.estado), o None para no mostrarlo.
+        almacen: Almacén de resultados compartido; las ciudades cuyo
+            resultado ya se desalojó se indican (se recargan de la caché).
+        inferencia: Dónde se ejecuta el modelo (descripción del backend).
+
     Returns:
         str | None: Ciudad seleccionada del historial, o None.
     """
     ciudad_historial = None
 
-    with st.sidebar:
-        # Modelo info
-        st.caption("MODELO")
-        st.markdown("**Llama 3.2 3B Instruct**")
-        st.caption("Inferencia vía Hugging Face API")
+    # Modelo info
+    st.caption("MODELO")
+    st.markdown("**Llama 3.2 3B Instruct**")
+    st.caption(f"Inferencia vía {inferencia}")
+
+    if estado_api and estado_api["estado"] != "cerrado":
+        if estado_api["estado"] == "abierto":
+            st.warning(
+                "La API no responde. Nuevo intento en "
+                f"{estado_api['reabre_en']:.0f}s.",
+                icon="⏸️",
+            )
+        else:
+            st.info("Comprobando si la API vuelve a responder...", icon="🔄")
 
-        st.divider()
+    st.divider()
 
-        # Acerca de
-        st.caption("ACERCA DE")
-        st.markdown(
-            "Asistente de IA que recomienda **10 planes familiares** "
-            "aptos para niños y de bajo coste para cualquier ciudad del mundo.",
-        )
+    # Acerca de
+    st.caption("ACERCA DE")
+    st.markdown(
+        "Asistente de IA que recomienda **10 planes familiares** "
+        "aptos para niños y de bajo coste para cualquier ciudad del mundo.",
+    )
 
-        st.divider()
-
-        # Historial de búsquedas
-        if "historial" in st.session_state and st.session_state.historial:
-            st.caption("HISTORIAL")
-            for entrada in reversed(st.session_state.historial):
-                ciudad = entrada["ciudad"]
-                if st.button(
-                    f"📍 {ciudad}",
-                    key=f"hist_{ciudad}",
-                    use_container_width=True,
-                ):
-                    ciudad_historial = ciudad
-
-        st.markdown(
-            """
-            <div class="sidebar-footer">
-                Hecho con ❤️ usando Streamlit<br>
-                <a href="https://huggingface.co" target="_blank">
-                    Powered by Hugging Face
-                </a>
-            </div>
-            """,
-            unsafe_allow_html=True,
-        )
+    st.divider()
+
+    # Historial de búsquedas
+    if "historial" in st.session_state and st.session_state.historial:
+        st.caption("HISTORIAL")
+        for ciudad, clave in reversed(st.session_state.historial.items()):
+            disponible = almacen is None or clave in almacen
+            if st.button(
+                f"📍 {ciudad}",
+                key=f"hist_{ciudad}",
+                help=None if disponible else "Se volverá a cargar de la caché",
+                use_container_width=True,
+            ):
+                ciudad_historial = ciudad
+
+    st.markdown(
+        """
+        <div class="sidebar-footer">
+            Hecho con ❤️ usando Streamlit<br>
+            <a href="https://huggingface.co" target="_blank">
+                Powered by Hugging Face
+            </a>
+        </div>
+        """,
+        unsafe_allow_html=True,
+    )
 
     return ciudad_historial
 
 
-# ── Parser de planes ─────────────────────────────────────────────────────────
+# ── Planes ───────────────────────────────────────────────────────────────────
+# El HTML de los resultados se construye una vez por (ciudad, clave del
+# almacén) y se emite en un solo elemento: en cada rerun solo se envía.
+_MEMORIA_HTML: OrderedDict[tuple[str, str], str] = OrderedDict()
+_MEMORIA_HTML_MAX = 256
+_lock_html = threading.Lock()
 
-def _parsear_planes(texto: str) -> list[dict]:
-    """
-    Parsea el texto del modelo y extrae cada plan como un dict con
-    número, título y descripción.
 
-    Soporta formatos:
-      - '1. **Título**: Descripción'
-      - '1. Título: Descripción'
-      - '1. Título - Descripción'
+def _html_cabecera(ciudad: str) -> str:
+    return (
+        '<div class="results-header">'
+        f'<span class="badge">📍 {html.escape(ciudad.upper())}</span>'
+        '<span class="count">10 planes familiares recomendados</span>'
+        "</div>"
+    )
 
-    Returns:
-        Lista de dicts con keys: num, titulo, descripcion.
-    """
-    planes = []
 
-    # Patrón: número seguido de punto, espacio, contenido
-    patron = re.compile(
-        r"^(\d{1,2})\.\s+"  # Número + punto
-        r"(?:\*\*)?(.+?)(?:\*\*)?"  # Título (con o sin **)
-        r"(?::\s*|\s*[-–—]\s*)"  # Separador (: o -)
-        r"(.+)$",  # Descripción
-        re.MULTILINE,
+def _html_tarjeta(plan: Plan) -> str:
+    """HTML de un plan como tarjeta, en una sola línea (sin sangrías que
+    Markdown tomaría por bloques de código)."""
+    coste = f'<span class="plan-cost">{html.escape(plan.coste)}</span>' if plan.coste else ""
+    return (
+        '<div class="plan-card">'
+        f'<div class="plan-number">{plan.num}</div>'
+        '<div class="plan-content">'
+        f'<p class="plan-title">{html.escape(plan.titulo)}</p>'
+        f'<p class="plan-desc">{html.escape(plan.descripcion)}</p>'
+        f"{coste}</div></div>"
     )
 
-    for match in patron.finditer(texto):
-        num = match.group(1)
-        titulo = match.group(2).strip().rstrip("*").lstrip("*").strip()
-        descripcion = match.group(3).strip()
-        planes.append({
-            "num": num,
-            "titulo": titulo,
-            "descripcion": descripcion,
-        })
 
-    return planes
+def html_resultado(ciudad: str, planes: list[Plan], clave: str | None = None) -> str:
+    """
+    HTML completo de un resultado: cabecera y todas las tarjetas.
 
+    Args:
+        ciudad: Nombre de la ciudad consultada.
+        planes: Planes validados.
+        clave: Clave del resultado en el almacén (hash del contenido); si
+            se indica, el HTML se memoriza con ella.
 
-def _detectar_coste(texto: str) -> str | None:
+    Returns:
+        HTML listo para un único st.markdown.
+    """
+    if clave is not None:
+        with _lock_html:
+            memorizado = _MEMORIA_HTML.get((ciudad, clave))
+            if memorizado is not None:
+                _MEMORIA_HTML.move_to_end((ciudad, clave))
+                return memorizado
+
+    resultado = _html_cabecera(ciudad) + "".join(_html_tarjeta(plan) for plan in planes)
+
+    if clave is not None:
+        with _lock_html:
+            _MEMORIA_HTML[(ciudad, clave)] = resultado
+            if len(_MEMORIA_HTML) > _MEMORIA_HTML_MAX:
+                _MEMORIA_HTML.popitem(last=False)
+    return resultado
+
+
+def render_resultado(
+    ciudad: str,
+    planes: list[Plan] | str | Iterable[str],
+    clave: str | None = None,
+) -> str | None:
     """
-    Intenta detectar indicaciones de coste en la descripción.
+    Muestra los resultados: cabecera y una tarjeta por plan, todo en un
+    único elemento.
+
+    Los planes llegan normalmente ya validados (lista de Plan), así que en
+    cada rerun solo se envía su HTML, memorizado por `clave`. Si se recibe
+    el texto del modelo, se parsea y, si no sigue el formato esperado, se
+    muestra como texto plano.
+
+    Si recibe un iterable de fragmentos (p. ej. obtener_planes_stream), cada
+    tarjeta se dibuja en cuanto su línea está completa, sin esperar al final
+    de la generación.
+
+    Args:
+        ciudad: Nombre de la ciudad consultada.
+        planes: Lista de planes, texto generado por el modelo o iterable de
+            fragmentos de texto.
+        clave: Clave del resultado en el almacén, para memorizar el HTML.
 
     Returns:
-        Texto de coste formateado o None.
+        Texto completo recibido si se ha dibujado un stream; None en otro caso.
     """
-    texto_lower = texto.lower()
-    if "gratuit" in texto_lower or "gratis" in texto_lower or "libre" in texto_lower:
-        return "Gratuito"
-    if "bajo coste" in texto_lower or "económic" in texto_lower:
-        return "Bajo coste"
+    if isinstance(planes, list):
+        modo = "planes"
+    elif isinstance(planes, str):
+        modo = "texto"
+    else:
+        modo = "stream"
+
+    with tramo("render", modo=modo):
+        return _render_resultado(ciudad, planes, clave)
+
+
+def _render_resultado(
+    ciudad: str,
+    planes: list[Plan] | str | Iterable[str],
+    clave: str | None,
+) -> str | None:
+    """Cuerpo de render_resultado (medido como la fase 'render')."""
+    if isinstance(planes, list):
+        st.markdown(html_resultado(ciudad, planes, clave), unsafe_allow_html=True)
+        return None
+
+    if not isinstance(planes, str):
+        return _render_resultado_stream(ciudad, planes)
 
-    # Buscar precios explícitos tipo "1€", "2 euros", etc.
-    precio_match = re.search(r"(\d+[\.,]?\d*)\s*€|(\d+[\.,]?\d*)\s*euros?", texto_lower)
-    if precio_match:
-        return f"~{precio_match.group(0).strip()}"
+    planes_parseados = parsear_planes_texto(planes)
+
+    if planes_parseados:
+        st.markdown(html_resultado(ciudad, planes_parseados, clave), unsafe_allow_html=True)
+    else:
+        # Fallback: si no se puede parsear, mostrar como markdown
+        st.markdown(_html_cabecera(ciudad), unsafe_allow_html=True)
+        st.markdown(planes)
 
     return None
 
 
-def render_resultado(ciudad: str, planes_texto: str):
+def _render_resultado_stream(ciudad: str, fragmentos: Iterable[str]) -> str:
     """
-    Muestra los resultados: parsea los planes del modelo y los renderiza
-    como tarjetas individuales. Si el parseo falla, muestra el texto plano.
+    Dibuja las tarjetas a medida que llegan los fragmentos del modelo.
+
+    El parser incremental recorre cada línea una sola vez y entrega cada
+    plan en cuanto empieza el siguiente (su descripción puede ocupar varias
+    líneas); el último se dibuja al terminar el stream. Todas las tarjetas
+    van en el mismo elemento, que se reemplaza con cada plan nuevo.
 
     Args:
         ciudad: Nombre de la ciudad consultada.
-        planes_texto: Texto con los planes generados por el modelo.
-    """
-    # Header de resultados
-    st.markdown(
-        f"""
-        <div class="results-header">
-            <span class="badge">📍 {ciudad.upper()}</span>
-            <span class="count">10 planes familiares recomendados</span>
-        </div>
-        """,
-        unsafe_allow_html=True,
-    )
+        fragmentos: Iterable de fragmentos de texto.
 
-    # Intentar parsear los planes en tarjetas
-    planes = _parsear_planes(planes_texto)
+    Returns:
+        Texto completo recibido.
+    """
+    tarjetas = st.empty()
+    indicador = st.empty()
+    tarjetas.markdown(_html_cabecera(ciudad), unsafe_allow_html=True)
+    indicador.caption("Generando planes...")
+
+    parser = ParserPlanes()
+    partes = []
+    html_partes = [_html_cabecera(ciudad)]
+
+    def dibujar(filas: list[tuple]):
+        if not filas:
+            return
+        html_partes.extend(_html_tarjeta(Plan(*fila)) for fila in filas)
+        tarjetas.markdown("".join(html_partes), unsafe_allow_html=True)
+
+    for fragmento in fragmentos:
+        partes.append(fragmento)
+        dibujar(parser.alimentar(fragmento))
+    dibujar(parser.terminar())
+
+    indicador.empty()
+
+    texto = "".join(partes)
+    if len(html_partes) == 1:
+        # Fallback: si no se puede parsear, mostrar como markdown
+        with tarjetas.container():
+            st.markdown(html_partes[0], unsafe_allow_html=True)
+            st.markdown(texto)
 
-    if planes:
-        for plan in planes:
-            coste = _detectar_coste(plan["descripcion"])
-            coste_html = (
-                f'<span class="plan-cost">{coste}</span>' if coste else ""
-            )
+    return texto.strip()
 
-            st.markdown(
-                f"""
-                <div class="plan-card">
-                    <div class="plan-number">{plan["num"]}</div>
-                    <div class="plan-content">
-                        <p class="plan-title">{plan["titulo"]}</p>
-                        <p class="plan-desc">{plan["descripcion"]}</p>
-                        {coste_html}
-                    </div>
-                </div>
-                """,
-                unsafe_allow_html=True,
-            )
-    else:
-        # Fallback: si no se puede parsear, mostrar como markdown
-        st.markdown(planes_texto)
 
+def render_empty_state(sugerencias: list[str] | None = None):
+    """
+    Muestra un estado vacío indicando al usuario cómo empezar.
 
-def render_empty_state():
-    """Muestra un estado vacío indicando al usuario cómo empezar."""
+    Args:
+        sugerencias: Ciudades de ejemplo; por defecto CIUDADES_POPULARES,
+            las mismas que se precalientan en la caché.
+    """
+    chips = "".join(
+        f'<span class="suggestion-chip">{html.escape(ciudad)}</span>'
+        for ciudad in (sugerencias or CIUDADES_POPULARES)
+    )
     st.markdown(
-        """
+        f"""
         <div class="empty-state">
             <span class="icon">🏙️</span>
             <h3>¿Qué ciudad quieres explorar?</h3>
             <p>Escribe el nombre de una ciudad y descubre planes en familia</p>
-            <div class="suggestions">
-                <span class="suggestion-chip">Madrid</span>
-                <span class="suggestion-chip">Barcelona</span>
-                <span class="suggestion-chip">Granada</span>
-                <span class="suggestion-chip">Sevilla</span>
-                <span class="suggestion-chip">Valencia</span>
-            </div>
+            <div class="suggestions">{chips}</div>
         </div>
         """,
         unsafe_allow_html=True,
     )
 
 
+def render_sugerencias(sugerencias: list[str]) -> str | None:
+    """
+    Muestra las ciudades conocidas que se parecen a lo escrito, como
+    botones bajo la caja de búsqueda.
+
+    Args:
+        sugerencias: Nombres canónicos (ver src/ciudades.IndiceCiudades.sugerir).
+
+    Returns:
+        str | None: Ciudad pulsada, o None.
+    """
+    if not sugerencias:
+        return None
+
+    st.caption("¿QUISISTE DECIR?")
+    elegida = None
+    for columna, ciudad in zip(st.columns(len(sugerencias)), sugerencias):
+        with columna:
+            if st.button(ciudad, key=f"sug_{ciudad}", use_container_width=True):
+                elegida = ciudad
+    return elegida
+
+
+def _html_coincidencia(resultado: ResultadoBusqueda) -> str:
+    """Tarjeta de un plan encontrado, con su ciudad delante del título."""
+    plan = resultado.plan
+    coste = f'<span class="plan-cost">{html.escape(plan.coste)}</span>' if plan.coste else ""
+    return (
+        '<div class="plan-card">'
+        f'<div class="plan-number">{plan.num}</div>'
+        '<div class="plan-content">'
+        f'<p class="plan-title">📍 {html.escape(resultado.ciudad)} · {html.escape(plan.titulo)}</p>'
+        f'<p class="plan-desc">{html.escape(plan.descripcion)}</p>'
+        f"{coste}</div></div>"
+    )
+
+
+def render_busqueda_planes(consulta: str, resultados: list[ResultadoBusqueda]) -> str | None:
+    """
+    Muestra los planes encontrados por palabras en todas las ciudades y un
+    botón por ciudad para ver todos sus planes.
+
+    Args:
+        consulta: Palabras buscadas.
+        resultados: Planes ordenados por relevancia (src/indice.py).
+
+    Returns:
+        str | None: Ciudad pulsada, o None.
+    """
+    if not resultados:
+        st.caption(f"Ningún plan generado contiene «{consulta}».")
+        return None
+
+    ciudades = list(dict.fromkeys(resultado.ciudad for resultado in resultados))
+    st.caption(f"{len(resultados)} PLANES EN {len(ciudades)} CIUDADES")
+    st.markdown("".join(_html_coincidencia(r) for r in resultados), unsafe_allow_html=True)
+
+    elegida = None
+    columnas = st.columns(min(len(ciudades), 4))
+    for n, ciudad in enumerate(ciudades):
+        with columnas[n % len(columnas)]:
+            if st.button(f"Ver {ciudad}", key=f"ver_{ciudad}", use_container_width=True):
+                elegida = ciudad
+    return elegida
+
+
+def render_trabajo(trabajo: Trabajo, error: tuple[str, str] | None = None) -> bool:
+    """
+    Muestra una búsqueda en cola: barra de progreso (planes recibidos) con
+    el último mensaje de estado, o el error si falló.
+
+    Args:
+        trabajo: Trabajo de src/cola.py.
+        error: (mensaje, tipo) si el trabajo falló.
+
+    Returns:
+        bool: True si se pulsó "Cancelar" (o "Quitar", si falló).
+    """
+    col_estado, col_boton = st.columns([5, 1])
+
+    with col_estado:
+        if error:
+            mensaje, tipo = error
+            render_error(f"**{trabajo.ciudad}:** {mensaje}", tipo=tipo)
+        else:
+            st.progress(
+                min(len(trabajo.planes), 10) / 10,
+                text=f"📍 {trabajo.ciudad} · {trabajo.mensaje}",
+            )
+
+    with col_boton:
+        return st.button(
+            "Quitar" if error else "Cancelar",
+            key=f"trabajo_{trabajo.id}",
+            use_container_width=True,
+        )
+
+
+def render_columna(
+    ciudad: str,
+    resultado: list[Plan] | str | None = None,
+    clave: str | None = None,
+    trabajo: Trabajo | None = None,
+    error: tuple[str, str] | None = None,
+):
+    """
+    Una ciudad del modo comparación, en la columna actual: su resultado,
+    el progreso y los planes recibidos mientras se genera, o el error.
+
+    Args:
+        ciudad: Nombre canónico de la ciudad.
+        resultado: Planes (o texto) ya terminados.
+        clave: Clave del resultado en el almacén, para memorizar el HTML.
+        trabajo: Búsqueda en curso, si aún no hay resultado.
+        error: (mensaje, tipo) si la búsqueda falló.
+    """
+    if error:
+        st.markdown(_html_cabecera(ciudad), unsafe_allow_html=True)
+        render_error(error[0], tipo=error[1])
+    elif resultado is not None:
+        render_resultado(ciudad, resultado, clave)
+    elif trabajo is not None:
+        st.progress(min(len(trabajo.planes), 10) / 10, text=trabajo.mensaje)
+        st.markdown(html_resultado(ciudad, trabajo.planes), unsafe_allow_html=True)
+
+
 def render_error(mensaje: str, tipo: str = "error"):
     """
     Muestra un mensaje de error formateado.
@@ -4,6 +4,8 @@
 # Diseño profesional, limpio y moderno.
 # ─────────────────────────────────────────────────────────────────────────────
 
+import re
+
 CUSTOM_CSS = """
 <style>
     /* ── Reset y tipografía ──────────────────────────────────────────────── */
@@ -310,3 +312,23 @@ CUSTOM_CSS = """
     }
 </style>
 """
+
+
+# ── Versión minificada ───────────────────────────────────────────────────────
+# Se inyecta en cada rerun completo: sin comentarios ni espacios sobrantes
+# pesa bastante menos. Los espacios antes de ':' se conservan (en un
+# selector, "a :hover" no es lo mismo que "a:hover").
+_PATRON_COMENTARIO = re.compile(r"/\*.*?\*/", re.DOTALL)
+_PATRON_ESPACIOS = re.compile(r"\s+")
+_PATRON_ALREDEDOR = re.compile(r"\s*([{};,>])\s*")
+
+
+def minificar_css(css: str) -> str:
+    """Quita comentarios y espacios sobrantes de un bloque <style>."""
+    css = _PATRON_COMENTARIO.sub("", css)
+    css = _PATRON_ESPACIOS.sub(" ", css)
+    css = _PATRON_ALREDEDOR.sub(r"\1", css)
+    return css.replace(";}", "}").replace(": ", ":").strip()
+
+
+CSS_MINIFICADO = minificar_css(CUSTOM_CSS)